@@ -0,0 +1,111 @@
+import argparse
+import json
+
+from app.metricas import configurar_logging
+from app.services import cargar_normativa, compactar_vectores, procesar_en_lotes, reconciliar
+
+
+def comando_normativa(args):
+    """Carga normativa (Ley 80, Ley 1150, Decreto 1082, ...) desde archivos locales."""
+    resultado = cargar_normativa(args.rutas, tamano_lote=args.lote)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+
+def comando_lotes(args):
+    """Re-procesa los pliegos existentes por lotes (reindex, resumen o checklist)."""
+    resultado = procesar_en_lotes(
+        args.comando,
+        tamano_lote=args.lote,
+        procesos=args.procesos,
+        por_minuto=args.por_minuto,
+        checkpoint=args.checkpoint,
+        reiniciar=args.reiniciar,
+        sombra=getattr(args, "sombra", False),
+        eliminar_anterior=getattr(args, "eliminar_anterior", False),
+        solo_pendientes=getattr(args, "pendientes", False),
+        modelo=getattr(args, "modelo", None)
+    )
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+
+def comando_reconciliar(args):
+    """Cruza filas, archivos y vectores; sin --aplicar solo reporta."""
+    resultado = reconciliar(
+        aplicar=args.aplicar,
+        tamano_lote=args.lote,
+        por_segundo=args.por_segundo,
+        antiguedad_min=args.antiguedad_min,
+        purgar_errores=args.purgar_errores
+    )
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+
+def comando_compactar(args):
+    """Reconstruye la colección de pliegos y compara tamaño y latencia antes y después."""
+    resultado = compactar_vectores(consultas=args.consultas, tamano_lote=args.lote)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+
+def main():
+    configurar_logging()
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Tareas por lotes de PliegoRAG")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    normativa = subparsers.add_parser("normativa", help="Cargar normativa a ChromaDB")
+    normativa.add_argument("rutas", nargs="+", help="Archivos o directorios (.txt, .md, .pdf)")
+    normativa.add_argument("--lote", type=int, default=64, help="Artículos por lote de embeddings")
+    normativa.set_defaults(func=comando_normativa)
+
+    # Opciones comunes a los re-procesamientos de pliegos existentes
+    lotes = argparse.ArgumentParser(add_help=False)
+    lotes.add_argument("--lote", type=int, default=50, help="Pliegos por lote (y por commit)")
+    lotes.add_argument("--procesos", type=int, default=2, help="Procesos del pool (0 = en este proceso)")
+    lotes.add_argument("--por-minuto", type=float, default=0, help="Tope de pliegos por minuto (0 = sin límite)")
+    lotes.add_argument("--checkpoint", help="Archivo de progreso (por defecto .checkpoint_<comando>.json)")
+    lotes.add_argument("--reiniciar", action="store_true", help="Ignorar el checkpoint y empezar de cero")
+
+    reindex = subparsers.add_parser(
+        "reindex", parents=[lotes],
+        help="Re-extraer texto y recalcular chunks y embeddings (tras cambiar modelo o chunking)"
+    )
+    reindex.add_argument(
+        "--sombra", action="store_true",
+        help="Construir una colección nueva y activarla al terminar (obligatorio si cambia el modelo)"
+    )
+    reindex.add_argument("--eliminar-anterior", action="store_true", help="Con --sombra, borrar la colección reemplazada")
+    reindex.add_argument(
+        "--modelo",
+        help="Modelo de embeddings de la colección nueva (por defecto EMBEDDING_MODELO; con otro, requiere --sombra)"
+    )
+    reindex.set_defaults(func=comando_lotes)
+
+    for comando, ayuda in (("resumen", "Regenerar fichas resumen"), ("checklist", "Regenerar checklists")):
+        subparser = subparsers.add_parser(comando, parents=[lotes], help=ayuda)
+        subparser.add_argument("--pendientes", action="store_true", help="Solo pliegos sin resultado o con él obsoleto")
+        subparser.set_defaults(func=comando_lotes)
+
+    reconciliacion = subparsers.add_parser(
+        "reconciliar", help="Detectar (y con --aplicar eliminar) archivos y vectores huérfanos"
+    )
+    reconciliacion.add_argument("--aplicar", action="store_true", help="Eliminar los huérfanos (sin él solo se reporta)")
+    reconciliacion.add_argument("--lote", type=int, default=500, help="Filas y chunks leídos por consulta")
+    reconciliacion.add_argument("--por-segundo", type=float, default=10, help="Tope de eliminaciones por segundo (0 = sin límite)")
+    reconciliacion.add_argument(
+        "--antiguedad-min", type=int, default=60,
+        help="Minutos mínimos de un archivo o fila para tocarlo (protege subidas en curso)"
+    )
+    reconciliacion.add_argument("--purgar-errores", action="store_true", help="Con --aplicar, eliminar los pliegos en error")
+    reconciliacion.set_defaults(func=comando_reconciliar)
+
+    compactacion = subparsers.add_parser("compactar", help="Compactar la colección de pliegos en ChromaDB")
+    compactacion.add_argument("--consultas", type=int, default=20, help="Consultas de muestra para medir latencia")
+    compactacion.add_argument("--lote", type=int, default=500, help="Chunks copiados por operación")
+    compactacion.set_defaults(func=comando_compactar)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,102 @@ class Settings(BaseSettings):
     DB_NAME: str = "pliegorag"
     DB_USER: str = "root"
     DB_PASSWORD: str = ""
+    # URL completa de SQLAlchemy; si se define reemplaza a DB_* (los benchmarks usan sqlite://)
+    DATABASE_URL: str = ""
 
     # Ollama
     OLLAMA_HOST: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3.1:latest"
+    OLLAMA_MODEL_SIMPLE: str = "llama3.2:latest"
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_PRECALENTAR: bool = True
+
+    # Contexto y tokens de salida por tipo de llamada. Un num_ctx distinto en el
+    # mismo modelo obliga a Ollama a recargarlo: mantenerlo igual entre tipos.
+    OLLAMA_CTX_PREGUNTA: int = 8192
+    OLLAMA_CTX_RESUMEN: int = 8192
+    OLLAMA_CTX_DOCUMENTOS: int = 8192
+    OLLAMA_PREDICT_PREGUNTA: int = 512
+    OLLAMA_PREDICT_RESUMEN: int = 768
+    OLLAMA_PREDICT_DOCUMENTOS: int = 1024
+
+    # Sesiones de chat: turnos recientes que se envían literales, y cuántos
+    # se acumulan antes de condensar los más antiguos en la memoria resumida
+    SESION_TURNOS_RECIENTES: int = 3
+    SESION_TURNOS_MAX: int = 6
+    SESION_PREDICT_MEMORIA: int = 256
+    # Similitud coseno mínima con la pregunta que recuperó el contexto para reutilizarlo
+    SESION_UMBRAL_TEMA: float = 0.55
+
+    # Similitud mínima con algún centroide de intención; por debajo la pregunta se trata como analítica
+    INTENCION_UMBRAL: float = 0.35
+
+    # Reintentos cortos cuando la salida JSON del LLM (resumen, documentos) llega incompleta
+    LLM_REINTENTOS_JSON: int = 1
+
+    # Métricas: umbrales para reportar en el log peticiones y etapas lentas.
+    # Las etapas sin umbral propio usan UMBRAL_ETAPA_LENTA_MS
+    UMBRAL_PETICION_LENTA_MS: int = 30000
+    UMBRAL_ETAPA_LENTA_MS: int = 2000
+    UMBRALES_ETAPA_LENTA_MS: dict = {
+        "pdf_extraccion": 60000,
+        "pdf_pagina_ocr": 20000,
+        "llm_primer_token": 15000,
+        "llm_generacion": 60000,
+    }
+
+    # Búsqueda en todo el corpus: candidatos por resultado pedido y tope de candidatos
+    BUSQUEDA_SOBREMUESTREO: int = 3
+    BUSQUEDA_MAX_CANDIDATOS: int = 1000
+
+    # Archivos subidos
+    UPLOAD_DIR: str = "/app/uploads"
+    MAX_UPLOAD_MB: int = 200
+    MAX_PAGINAS_PDF: int = 3000
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+
+    # Embeddings: "sentence_transformers" (fp32), "int8" (cuantizado) u "onnx"
+    EMBEDDING_MODELO: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "sentence_transformers"
+    EMBEDDING_ONNX_PATH: str = ""
+    EMBEDDING_ONNX_ARCHIVO: str = "onnx/model.onnx"
+    EMBEDDING_MAX_TOKENS: int = 256
+    EMBEDDING_THREADS: int = 0
+    EMBEDDING_BATCH_SIZE: int = 32
+
+    # Worker de embeddings compartido: "http://embeddings:8001" o "unix:///ruta/socket".
+    # Vacío = cada proceso carga su propio modelo y ChromaDB.
+    EMBEDDING_WORKER_URL: str = ""
+    EMBEDDING_WORKER_TIMEOUT_S: int = 120
+
+    # Coalescedor de embeddings: espera máxima para juntar llamadas concurrentes (0 = desactivado)
+    EMBEDDING_COALESCER_ESPERA_MS: float = 5.0
+    EMBEDDING_COALESCER_MAX_LOTE: int = 64
+
+    # Normativa
+    NORMATIVA_CACHE_MAX: int = 256
+    # La carga (python -m app.cli normativa) corre en otro proceso: las consultas
+    # cacheadas en la API expiran a los NORMATIVA_CACHE_TTL_S segundos
+    NORMATIVA_CACHE_TTL_S: int = 300
+    NORMATIVA_CONTEO_TTL_S: int = 300
+
+    # Extracción
+    EXTRAER_TABLAS: bool = True
+
+    # Chunking: "estructura" (tokens + oraciones/numerales) o "palabras" (ventanas fijas)
+    CHUNK_ESTRATEGIA: str = "estructura"
+    CHUNK_MAX_TOKENS: int = 240
+    CHUNK_SOLAPAMIENTO_TOKENS: int = 32
+    CHUNK_PALABRAS: int = 500
+    CHUNK_SOLAPAMIENTO_PALABRAS: int = 50
+
+    # OCR (páginas escaneadas)
+    OCR_HABILITADO: bool = True
+    OCR_WORKERS: int = 2
+    OCR_IDIOMA: str = "spa"
+    OCR_RESOLUCION: int = 300
+    OCR_TIMEOUT_S: int = 120
+    OCR_CACHE_DIR: str = "/app/ocr_cache"
 
     class Config:
         env_file = ".env"
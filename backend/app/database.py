@@ -1,15 +1,25 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 from app.config import settings
+from app.metricas import instrumentar_sesiones
 
-DATABASE_URL = (
+DATABASE_URL = settings.DATABASE_URL or (
     f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
 
-engine = create_engine(DATABASE_URL, echo=True)
+if DATABASE_URL.startswith("sqlite"):
+    opciones = {"connect_args": {"check_same_thread": False}}
+    if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+        # Una BD en memoria solo existe dentro de su conexión: compartir una sola
+        opciones["poolclass"] = StaticPool
+    engine = create_engine(DATABASE_URL, **opciones)
+else:
+    engine = create_engine(DATABASE_URL, echo=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrumentar_sesiones(SessionLocal)
 
 Base = declarative_base()
 
@@ -0,0 +1,191 @@
+# Worker de embeddings: único proceso que carga el modelo y abre ChromaDB.
+#
+# Los workers de uvicorn de la API le envían textos a codificar y
+# operaciones sobre las colecciones por HTTP (ver services/embedding_cliente.py).
+# Así el modelo ocupa memoria una sola vez y ChromaDB tiene un solo escritor.
+#
+#   uvicorn app.embedding_worker:app --host 0.0.0.0 --port 8001 --workers 1
+
+import threading
+from typing import List, Optional
+
+import numpy as np
+from chromadb.errors import InvalidDimensionException
+from fastapi import Body, FastAPI, HTTPException
+from pydantic import BaseModel
+
+from app.metricas import configurar_logging, middleware_peticiones, respuesta_metricas
+from app.services import embedding_service
+from app.services.embedding_backend import obtener_backend
+from app.services.mantenimiento_service import compactar_vectores
+
+OPERACIONES_LECTURA = {"get", "query", "count"}
+OPERACIONES_ESCRITURA = {"add", "upsert", "update", "delete"}
+
+configurar_logging()
+
+app = FastAPI(title="PliegoRAG Embeddings", version="1.0.0")
+# Respeta el X-Request-ID que envía la API, así los logs de ambos procesos se pueden cruzar
+app.middleware("http")(middleware_peticiones)
+
+_escritura_lock = threading.Lock()
+
+
+class EncodeRequest(BaseModel):
+    textos: List[str]
+    modelo: Optional[str] = None
+
+
+class ColeccionActivaRequest(BaseModel):
+    nombre: Optional[str] = None
+    modelo: Optional[str] = None
+    actualizados: Optional[List[int]] = None
+    vigentes: Optional[List[int]] = None
+
+
+class SincronizarRequest(BaseModel):
+    actualizados: List[int]
+    vigentes: List[int]
+
+
+class ColeccionRequest(BaseModel):
+    modelo: str
+
+
+class CompactarRequest(BaseModel):
+    consultas: int = 20
+    tamano_lote: int = 500
+
+
+def _coleccion(nombre: str):
+    embedding_service.inicializar_servicios()
+    if nombre == "pliegos":
+        # Nombre lógico: la colección activa según el alias (puede ser una sombra ya activada)
+        return embedding_service.coleccion_pliegos
+    if nombre == "normativa":
+        return embedding_service.coleccion_normativa
+    return embedding_service.obtener_coleccion_pliegos(nombre)
+
+
+def _a_json(valor):
+    """Convierte arrays de numpy (embeddings, distancias) a listas serializables."""
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, dict):
+        return {k: _a_json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_a_json(v) for v in valor]
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+@app.on_event("startup")
+def iniciar():
+    if embedding_service.usa_worker_remoto():
+        raise RuntimeError("El worker de embeddings no puede tener EMBEDDING_WORKER_URL configurado")
+
+    # Cargar modelo y colecciones antes de recibir tráfico
+    obtener_backend()
+    embedding_service.inicializar_servicios()
+
+
+@app.post("/encode")
+def encode(request: EncodeRequest):
+    # Las peticiones concurrentes de todos los workers de la API se agrupan en el coalescedor
+    return {"embeddings": embedding_service.codificar(request.textos, request.modelo)}
+
+
+@app.post("/coleccion_activa")
+def coleccion_activa(request: ColeccionActivaRequest):
+    """Consulta la colección de pliegos activa o, con nombre, hace el swap a esa colección."""
+    try:
+        if request.nombre:
+            # Con vigentes, la última sincronización y el swap corren sin escrituras en medio
+            with _escritura_lock:
+                anterior = embedding_service.activar_coleccion_pliegos(
+                    request.nombre, request.modelo, request.actualizados, request.vigentes
+                )
+        else:
+            anterior = embedding_service.nombre_coleccion_activa()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "activa": embedding_service.nombre_coleccion_activa(),
+        "anterior": anterior,
+        "modelo": embedding_service.modelo_pliegos()
+    }
+
+
+@app.post("/colecciones")
+def crear_coleccion(request: ColeccionRequest):
+    """Crea una colección sombra para el modelo pedido (se carga aquí si no es el configurado)."""
+    with _escritura_lock:
+        return {"nombre": embedding_service.crear_coleccion_sombra(request.modelo)}
+
+
+@app.post("/compactar")
+def compactar(request: CompactarRequest):
+    # La copia corre sin bloquear; el lock solo se toma para la sincronización final y el swap
+    return _a_json(compactar_vectores(request.consultas, request.tamano_lote, bloqueo=_escritura_lock))
+
+
+@app.post("/colecciones/{nombre}/sincronizar")
+def sincronizar_coleccion(nombre: str, request: SincronizarRequest):
+    # Sin lock: nadie más escribe en una sombra; lo que cambie mientras tanto lo toma el swap
+    try:
+        return embedding_service.sincronizar_coleccion_pliegos(nombre, request.actualizados, request.vigentes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/colecciones/{nombre}/eliminar")
+def eliminar_coleccion(nombre: str):
+    try:
+        with _escritura_lock:
+            embedding_service.eliminar_coleccion_pliegos(nombre)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"eliminada": nombre}
+
+
+@app.post("/colecciones/{nombre}/{operacion}")
+def operar_coleccion(nombre: str, operacion: str, kwargs: dict = Body(default={})):
+    if nombre not in ("pliegos", "normativa") and not embedding_service.NOMBRE_SOMBRA.match(nombre):
+        raise HTTPException(status_code=404, detail="Colección no encontrada")
+    if operacion not in OPERACIONES_LECTURA | OPERACIONES_ESCRITURA:
+        raise HTTPException(status_code=400, detail="Operación no soportada")
+
+    kwargs = kwargs or {}
+    try:
+        coleccion = _coleccion(nombre)
+        metodo = getattr(coleccion, operacion)
+
+        # La API manda el texto de la pregunta: aquí se codifica con el modelo de la colección si no es el suyo
+        texto_consulta = kwargs.pop("texto_consulta", None)
+        if operacion == "query" and texto_consulta is not None:
+            previo = (kwargs.get("query_embeddings") or [None])[0]
+            kwargs["query_embeddings"] = [embedding_service.embedding_consulta(coleccion, texto_consulta, previo)]
+
+        if operacion in OPERACIONES_ESCRITURA:
+            with _escritura_lock:
+                return _a_json(metodo(**kwargs))
+        return _a_json(metodo(**kwargs))
+    except (ValueError, TypeError, InvalidDimensionException) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/health")
+def health_check():
+    backend = obtener_backend()
+    return {"status": "ok", "backend": backend.nombre}
+
+
+@app.get("/metricas")
+def metricas():
+    return {"coalescedor": embedding_service.metricas_coalescedor()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return respuesta_metricas()
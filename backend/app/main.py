@@ -1,8 +1,15 @@
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.config import settings
 from app.database import engine, Base
-from app.routers import pliegos_router, chat_router
+from app.metricas import configurar_logging, middleware_peticiones, respuesta_metricas
+from app.routers import pliegos_router, chat_router, busqueda_router
+from app.services import precalentar_modelos, LimiteSubidaMiddleware
+
+configurar_logging()
 
 # Crear tablas en la base de datos
 Base.metadata.create_all(bind=engine)
@@ -22,9 +29,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rechaza subidas que superan MAX_UPLOAD_MB antes de que se escriban a disco
+app.add_middleware(LimiteSubidaMiddleware)
+
+# ID de petición, duración por ruta y log de peticiones lentas
+app.middleware("http")(middleware_peticiones)
+
 # Registrar routers
 app.include_router(pliegos_router)
 app.include_router(chat_router)
+app.include_router(busqueda_router)
+
+
+@app.on_event("startup")
+def precargar_ollama():
+    # En segundo plano: la API arranca aunque Ollama tarde en cargar los modelos
+    if settings.OLLAMA_PRECALENTAR:
+        threading.Thread(target=precalentar_modelos, daemon=True).start()
 
 
 @app.get("/")
@@ -34,4 +55,9 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return respuesta_metricas()
\ No newline at end of file
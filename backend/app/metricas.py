@@ -0,0 +1,161 @@
+# Métricas de Prometheus, tiempos por etapa e ID de petición.
+#
+# Con varios workers de uvicorn, PROMETHEUS_MULTIPROC_DIR debe apuntar a un
+# directorio vacío al arrancar (en docker-compose es un tmpfs): cada proceso
+# escribe ahí sus valores y /metrics los agrega.
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CABECERA_ID_PETICION = "X-Request-ID"
+
+# ID de la petición en curso; los hilos del threadpool y las tareas en segundo plano heredan el contexto
+id_peticion: ContextVar[str] = ContextVar("id_peticion", default="-")
+
+BUCKETS_ETAPA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+ETAPA_SEGUNDOS = Histogram(
+    "pliegorag_etapa_segundos",
+    "Duración de cada etapa del procesamiento",
+    ["etapa"],
+    buckets=BUCKETS_ETAPA
+)
+PETICION_SEGUNDOS = Histogram(
+    "pliegorag_peticion_segundos",
+    "Duración de las peticiones HTTP",
+    ["metodo", "ruta"],
+    buckets=BUCKETS_ETAPA
+)
+PETICIONES_TOTAL = Counter(
+    "pliegorag_peticiones_total",
+    "Peticiones HTTP por ruta y código de estado",
+    ["metodo", "ruta", "estado"]
+)
+LLM_TOKENS_TOTAL = Counter(
+    "pliegorag_llm_tokens_total",
+    "Tokens evaluados (prompt) y generados (respuesta) por tipo de llamada",
+    ["tipo", "direccion"]
+)
+LLM_REINTENTOS_TOTAL = Counter(
+    "pliegorag_llm_reintentos_total",
+    "Reintentos de salidas JSON incompletas o inválidas",
+    ["tipo"]
+)
+PETICIONES_LENTAS_TOTAL = Counter(
+    "pliegorag_peticiones_lentas_total",
+    "Peticiones que superaron UMBRAL_PETICION_LENTA_MS",
+    ["metodo", "ruta"]
+)
+
+
+def observar(etapa: str, segundos: float):
+    """Registra la duración de una etapa y la reporta en el log si supera su umbral."""
+    ETAPA_SEGUNDOS.labels(etapa).observe(segundos)
+    umbral_ms = settings.UMBRALES_ETAPA_LENTA_MS.get(etapa, settings.UMBRAL_ETAPA_LENTA_MS)
+    if segundos * 1000 >= umbral_ms:
+        logger.warning("Etapa lenta: etapa=%s tiempo_ms=%d", etapa, int(segundos * 1000))
+
+
+@contextmanager
+def medir(etapa: str):
+    """Mide el bloque como una etapa (se registra también si el bloque lanza excepción)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - inicio)
+
+
+class _FiltroIdPeticion(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = id_peticion.get()
+        return True
+
+
+def configurar_logging():
+    """Logging de los módulos de app con el ID de petición en cada línea."""
+    handler = logging.StreamHandler()
+    handler.addFilter(_FiltroIdPeticion())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    # Solo el logger "app": uvicorn y SQLAlchemy (echo) ya tienen sus propios handlers
+    logger_app = logging.getLogger("app")
+    if any(isinstance(f, _FiltroIdPeticion) for h in logger_app.handlers for f in h.filters):
+        return
+    logger_app.addHandler(handler)
+    logger_app.setLevel(logging.INFO)
+    logger_app.propagate = False
+
+
+def _ruta_plantilla(request: Request) -> str:
+    # La plantilla (/api/pliegos/{pliego_id}) y no la URL, para no crear una serie por ID
+    ruta = request.scope.get("route")
+    return getattr(ruta, "path", "sin_ruta")
+
+
+async def middleware_peticiones(request: Request, call_next):
+    """Asigna el ID de petición (o respeta el recibido), mide la petición y reporta las lentas."""
+    token = id_peticion.set(request.headers.get(CABECERA_ID_PETICION) or uuid.uuid4().hex[:16])
+    inicio = time.perf_counter()
+    estado = 500
+    try:
+        response = await call_next(request)
+        estado = response.status_code
+        response.headers[CABECERA_ID_PETICION] = id_peticion.get()
+        return response
+    finally:
+        segundos = time.perf_counter() - inicio
+        ruta = _ruta_plantilla(request)
+        PETICION_SEGUNDOS.labels(request.method, ruta).observe(segundos)
+        PETICIONES_TOTAL.labels(request.method, ruta, str(estado)).inc()
+        if segundos * 1000 >= settings.UMBRAL_PETICION_LENTA_MS:
+            PETICIONES_LENTAS_TOTAL.labels(request.method, ruta).inc()
+            logger.warning(
+                "Petición lenta: %s %s estado=%d tiempo_ms=%d",
+                request.method, request.url.path, estado, int(segundos * 1000)
+            )
+        id_peticion.reset(token)
+
+
+def respuesta_metricas() -> Response:
+    """Respuesta de /metrics; en modo multiproceso agrega los valores de todos los workers."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return Response(generate_latest(registro), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrumentar_sesiones(fabrica_sesiones):
+    """Mide cada commit de las sesiones creadas por la fábrica como etapa "db_commit"."""
+
+    @event.listens_for(fabrica_sesiones, "before_commit")
+    def _antes(session):
+        session.info["inicio_commit"] = time.perf_counter()
+
+    @event.listens_for(fabrica_sesiones, "after_commit")
+    def _despues(session):
+        inicio = session.info.pop("inicio_commit", None)
+        if inicio is not None:
+            observar("db_commit", time.perf_counter() - inicio)
+
+    @event.listens_for(fabrica_sesiones, "after_rollback")
+    def _rollback(session):
+        session.info.pop("inicio_commit", None)
@@ -1 +1 @@
-from app.models.pliego import Pliego, Conversacion
\ No newline at end of file
+from app.models.pliego import Pliego, Conversacion, SesionChat
\ No newline at end of file
@@ -14,11 +14,17 @@ class Pliego(Base):
     nombre_archivo = Column(String(255), nullable=False)
     ruta_archivo = Column(String(500), nullable=False)
     tamano_bytes = Column(Integer)
+    hash_contenido = Column(String(64), index=True)
+    pliego_origen_id = Column(Integer, ForeignKey("pliegos.id", ondelete="SET NULL"), index=True)
+    num_referencias = Column(Integer, default=1)
     num_paginas = Column(Integer)
     texto_completo = Column(Text)
     texto_tokens = Column(Integer)
     datos_extraidos = Column(JSON)
     checklist_documentos = Column(JSON)
+    version = Column(Integer, default=1)
+    hashes_paginas = Column(JSON)
+    derivados_obsoletos = Column(JSON)
     estado = Column(
         Enum("procesando", "listo", "error", name="estado_pliego"),
         default="procesando"
@@ -28,6 +34,20 @@ class Pliego(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     conversaciones = relationship("Conversacion", back_populates="pliego", cascade="all, delete-orphan")
+    sesiones = relationship("SesionChat", back_populates="pliego", cascade="all, delete-orphan")
+    origen = relationship("Pliego", remote_side=[id])
+
+    @property
+    def pliego_indice_id(self) -> int:
+        """ID bajo el que están indexados los chunks (el original si es duplicado)."""
+        return self.pliego_origen_id or self.id
+
+    @property
+    def fuente(self) -> "Pliego":
+        """Fila que guarda texto, ficha y derivados (el original si es duplicado)."""
+        if self.pliego_origen_id and self.origen is not None:
+            return self.origen
+        return self
 
 
 class Conversacion(Base):
@@ -41,7 +61,26 @@ class Conversacion(Base):
     tokens_prompt = Column(Integer)
     tokens_respuesta = Column(Integer)
     tiempo_respuesta_ms = Column(Integer)
+    tiempo_carga_ms = Column(Integer)
+    sesion_id = Column(Integer, ForeignKey("sesiones_chat.id", ondelete="CASCADE"), index=True)
     fue_util = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
 
-    pliego = relationship("Pliego", back_populates="conversaciones")
\ No newline at end of file
+    pliego = relationship("Pliego", back_populates="conversaciones")
+    sesion = relationship("SesionChat", back_populates="conversaciones")
+
+
+class SesionChat(Base):
+    __tablename__ = "sesiones_chat"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pliego_id = Column(Integer, ForeignKey("pliegos.id", ondelete="CASCADE"), nullable=False, index=True)
+    memoria = Column(Text)
+    turnos_resumidos = Column(Integer, default=0)
+    contexto = Column(JSON)
+    embedding_tema = Column(JSON)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    pliego = relationship("Pliego", back_populates="sesiones")
+    conversaciones = relationship("Conversacion", back_populates="sesion", order_by="Conversacion.id")
\ No newline at end of file
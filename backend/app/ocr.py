@@ -0,0 +1,81 @@
+# OCR de páginas escaneadas.
+# Se ejecuta dentro de los procesos del pool de OCR, por eso no importa nada
+# de app.services (evita cargar el modelo de embeddings y ChromaDB en cada proceso).
+import hashlib
+import logging
+import os
+import time
+
+import pdfplumber
+
+try:
+    import pytesseract
+except ImportError:  # OCR opcional: sin pytesseract las páginas escaneadas quedan sin texto
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+# Resultado de comprobar el binario de tesseract (una vez por proceso)
+_tesseract_disponible = None
+
+
+def ocr_disponible() -> bool:
+    """True si pytesseract está instalado y el binario de tesseract responde."""
+    global _tesseract_disponible
+    if _tesseract_disponible is None:
+        if pytesseract is None:
+            _tesseract_disponible = False
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _tesseract_disponible = True
+            except Exception as e:
+                logger.warning("OCR deshabilitado: tesseract no está disponible (%s)", e)
+                _tesseract_disponible = False
+    return _tesseract_disponible
+
+
+def ocr_pagina(ruta_archivo: str, numero: int, resolucion: int, idioma: str, dir_cache: str) -> dict:
+    """
+    Renderiza una página y le aplica OCR con Tesseract.
+
+    El resultado se cachea en disco por hash de la imagen renderizada, así que
+    la misma página escaneada (por ejemplo en una adenda) no se vuelve a procesar.
+
+    Args:
+        ruta_archivo: Ruta del PDF
+        numero: Número de página (1-indexed)
+        resolucion: DPI para renderizar la página
+        idioma: Idioma(s) de Tesseract, por ejemplo "spa"
+        dir_cache: Directorio de la caché de OCR
+
+    Returns:
+        Dict con numero, texto, metodo, en_cache y tiempo_ms
+    """
+    inicio = time.time()
+
+    with pdfplumber.open(ruta_archivo, pages=[numero]) as pdf:
+        imagen = pdf.pages[0].to_image(resolution=resolucion).original
+
+    clave = hashlib.sha256(imagen.tobytes() + idioma.encode("utf-8")).hexdigest()
+    ruta_cache = os.path.join(dir_cache, f"{clave}.txt")
+
+    en_cache = os.path.exists(ruta_cache)
+    if en_cache:
+        with open(ruta_cache, encoding="utf-8") as f:
+            texto = f.read()
+    else:
+        texto = pytesseract.image_to_string(imagen, lang=idioma)
+        os.makedirs(dir_cache, exist_ok=True)
+        ruta_temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        with open(ruta_temporal, "w", encoding="utf-8") as f:
+            f.write(texto)
+        os.replace(ruta_temporal, ruta_cache)
+
+    return {
+        "numero": numero,
+        "texto": texto.strip(),
+        "metodo": "ocr",
+        "en_cache": en_cache,
+        "tiempo_ms": int((time.time() - inicio) * 1000)
+    }
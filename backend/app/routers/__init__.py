@@ -1,2 +1,3 @@
 from app.routers.pliegos import router as pliegos_router
-from app.routers.chat import router as chat_router
\ No newline at end of file
+from app.routers.chat import router as chat_router
+from app.routers.busqueda import router as busqueda_router
\ No newline at end of file
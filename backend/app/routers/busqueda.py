@@ -0,0 +1,48 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.schemas import BusquedaResponse
+from app.services import buscar_en_corpus
+
+router = APIRouter(prefix="/api/busqueda", tags=["busqueda"])
+
+
+@router.get("", response_model=BusquedaResponse)
+def buscar(
+    q: Optional[str] = Query(None, description="Consulta en lenguaje natural"),
+    contiene: Optional[str] = Query(None, description="Texto literal que debe aparecer (ej. ISO 9001, código UNSPSC)"),
+    entidad: Optional[str] = None,
+    estado: str = "listo",
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    section: Optional[str] = None,
+    tipo: Optional[str] = Query(None, pattern="^(texto|tabla)$"),
+    por_pliego: int = Query(3, ge=1, le=10),
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Busca en todos los pliegos y agrupa los fragmentos más relevantes por pliego."""
+    if not q and not contiene:
+        raise HTTPException(status_code=400, detail="Indica q o contiene")
+
+    resultado = buscar_en_corpus(
+        db,
+        q or contiene,
+        entidad=entidad,
+        estado=estado,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        section=section,
+        tipo=tipo,
+        contiene=contiene,
+        por_pliego=por_pliego,
+        pagina=pagina,
+        por_pagina=por_pagina
+    )
+    if resultado.get("error"):
+        raise HTTPException(status_code=400, detail=resultado["error"])
+    return resultado
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -11,7 +11,15 @@ from app.schemas import (
     ResumenRequest,
     ResumenResponse,
 )
-from app.services import preguntar_ollama, generar_resumen
+from app.services import (
+    obtener_sesion,
+    responder_en_sesion,
+    memoria_pendiente,
+    condensar_memoria,
+    generar_resumen,
+    extraer_campos_texto,
+    marcar_derivado_vigente
+)
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -19,9 +27,15 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 @router.post("/preguntar", response_model=RespuestaChat)
 def hacer_pregunta(
     datos: PreguntaRequest,
+    tareas: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    """Hace una pregunta sobre un pliego usando chunks relevantes."""
+    """
+    Hace una pregunta sobre un pliego dentro de una sesión de chat.
+
+    Sin sesion_id se abre una sesión nueva; la respuesta trae su ID para
+    enviar los seguimientos.
+    """
 
     pliego = db.query(Pliego).filter(Pliego.id == datos.pliego_id).first()
     if not pliego:
@@ -30,35 +44,45 @@ def hacer_pregunta(
     if pliego.estado != "listo":
         raise HTTPException(status_code=400, detail="El pliego aún no está procesado")
 
-    # Preguntar a Ollama (ahora usa chunks)
-    resultado = preguntar_ollama(
-        pliego_id=pliego.id,
-        pregunta=datos.pregunta,
-        texto_completo=pliego.texto_completo
-    )
+    sesion = obtener_sesion(db, pliego, datos.sesion_id)
+    if not sesion:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+    resultado = responder_en_sesion(sesion, pliego, datos.pregunta)
 
     if resultado["error"]:
+        db.rollback()
         raise HTTPException(status_code=500, detail=resultado["error"])
 
     # Guardar conversación
     conversacion = Conversacion(
         pliego_id=pliego.id,
+        sesion_id=sesion.id,
         pregunta=datos.pregunta,
         respuesta=resultado["respuesta"],
         modelo_usado=resultado.get("modelo_usado", "qwen2.5:32b"),
         tokens_prompt=resultado["tokens_prompt"],
         tokens_respuesta=resultado["tokens_respuesta"],
-        tiempo_respuesta_ms=resultado["tiempo_ms"]
+        tiempo_respuesta_ms=resultado["tiempo_ms"],
+        tiempo_carga_ms=resultado["tiempo_carga_ms"]
     )
     db.add(conversacion)
     db.commit()
 
+    if memoria_pendiente(sesion):
+        tareas.add_task(condensar_memoria, sesion.id)
+
     return RespuestaChat(
         respuesta=resultado["respuesta"],
         tokens_prompt=resultado["tokens_prompt"],
         tokens_respuesta=resultado["tokens_respuesta"],
         tiempo_ms=resultado["tiempo_ms"],
-        fuentes=resultado.get("fuentes", [])
+        tiempo_carga_ms=resultado["tiempo_carga_ms"],
+        fuentes=resultado.get("fuentes", []),
+        sesion_id=sesion.id,
+        contexto_reutilizado=resultado["contexto_reutilizado"],
+        modelo_usado=resultado["modelo_usado"],
+        intencion=resultado["intencion"]
     )
 
 
@@ -94,16 +118,26 @@ def crear_resumen(
     if pliego.estado != "listo":
         raise HTTPException(status_code=400, detail="El pliego aún no está procesado")
 
-    if not pliego.texto_completo:
+    # Texto y ficha de un duplicado viven en el original
+    fuente = pliego.fuente
+    if not fuente.texto_completo:
         raise HTTPException(status_code=400, detail="El pliego no tiene texto extraído")
 
-    resultado = generar_resumen(pliego.texto_completo)
+    # Los campos con patrón fijo salen del texto; el LLM solo completa los demás
+    resultado = generar_resumen(fuente.texto_completo, extraer_campos_texto(fuente.texto_completo))
 
     if resultado["error"]:
         raise HTTPException(status_code=500, detail=resultado["error"])
 
     # Guardar datos extraídos en el pliego
-    pliego.datos_extraidos = resultado["ficha"]
+    fuente.datos_extraidos = resultado["ficha"]
+    marcar_derivado_vigente(fuente, "resumen")
     db.commit()
 
-    return ResumenResponse(ficha=resultado["ficha"])
+    return ResumenResponse(
+        ficha=resultado["ficha"],
+        campos_llm=resultado["campos_llm"],
+        tokens_prompt=resultado["tokens_prompt"],
+        tokens_respuesta=resultado["tokens_respuesta"],
+        reintentos=resultado["reintentos"]
+    )
@@ -1,17 +1,42 @@
 import os
 import uuid
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 
+from app.config import settings
 from app.database import get_db
 from app.models import Pliego
-from app.schemas import PliegoResponse, PliegoDetalle, ChecklistRequest, ChecklistResponse
-from app.services import extraer_texto_pdf, dividir_en_chunks, guardar_chunks, eliminar_chunks_pliego, generar_checklist_completo
+from app.schemas import (
+    PliegoResponse,
+    PliegoDetalle,
+    VersionPliegoResponse,
+    ChecklistRequest,
+    ChecklistResponse,
+)
+from app.services import (
+    guardar_pdf_subido,
+    procesar_pliego,
+    buscar_pliego_original,
+    registrar_duplicado,
+    liberar_pliego,
+    procesar_nueva_version,
+    marcar_derivado_vigente,
+    generar_checklist_completo,
+)
 
 router = APIRouter(prefix="/api/pliegos", tags=["pliegos"])
 
-UPLOAD_DIR = "/app/uploads"
+
+def _detalle(pliego: Pliego) -> PliegoDetalle:
+    # Un duplicado no guarda texto ni ficha: se muestran los del original
+    fuente = pliego.fuente
+    return PliegoDetalle.model_validate(pliego).model_copy(update={
+        "texto_completo": fuente.texto_completo,
+        "datos_extraidos": fuente.datos_extraidos,
+        "derivados_obsoletos": fuente.derivados_obsoletos
+    })
 
 
 @router.post("/upload", response_model=PliegoResponse)
@@ -21,57 +46,110 @@ async def subir_pliego(
 ):
     """Sube un PDF, extrae texto y genera chunks."""
     
-    if not archivo.filename.endswith(".pdf"):
+    if not archivo.filename or not archivo.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
 
     # Crear nombre único
-    nombre_unico = f"{uuid.uuid4()}_{archivo.filename}"
-    ruta_completa = os.path.join(UPLOAD_DIR, nombre_unico)
-
-    # Guardar archivo
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    contenido = await archivo.read()
-    with open(ruta_completa, "wb") as f:
-        f.write(contenido)
+    nombre_archivo = os.path.basename(archivo.filename)
+    nombre_unico = f"{uuid.uuid4()}_{nombre_archivo}"
+    ruta_completa = os.path.join(settings.UPLOAD_DIR, nombre_unico)
+
+    # Guardar archivo por bloques, validando firma, tamaño y páginas
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    guardado = await guardar_pdf_subido(archivo, ruta_completa)
+    if guardado["error"]:
+        raise HTTPException(status_code=guardado["codigo"], detail=guardado["error"])
+
+    # Si el mismo contenido ya fue procesado, reutilizarlo sin guardar otra copia
+    original = buscar_pliego_original(db, guardado["hash_contenido"])
+    if original:
+        os.remove(ruta_completa)
+        return registrar_duplicado(db, original, nombre_archivo)
 
     # Crear registro en BD
     pliego = Pliego(
-        nombre_archivo=archivo.filename,
+        nombre_archivo=nombre_archivo,
         ruta_archivo=ruta_completa,
-        tamano_bytes=len(contenido),
+        tamano_bytes=guardado["tamano_bytes"],
+        hash_contenido=guardado["hash_contenido"],
+        num_paginas=guardado["num_paginas"],
         estado="procesando"
     )
     db.add(pliego)
     db.commit()
     db.refresh(pliego)
 
-    # Extraer texto
-    resultado = extraer_texto_pdf(ruta_completa)
+    # La extracción es bloqueante: sacarla del event loop
+    await run_in_threadpool(procesar_pliego, db, pliego)
+
+    return pliego
+
+
+@router.post("/{pliego_id}/version", response_model=VersionPliegoResponse)
+async def subir_nueva_version(
+    pliego_id: int,
+    archivo: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """Sube una nueva versión (adenda) y re-procesa solo lo que cambió."""
+    pliego = db.query(Pliego).filter(Pliego.id == pliego_id).first()
+    if not pliego:
+        raise HTTPException(status_code=404, detail="Pliego no encontrado")
+
+    if pliego.estado == "procesando":
+        raise HTTPException(status_code=409, detail="El pliego aún se está procesando")
+
+    if not archivo.filename or not archivo.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+
+    nombre_archivo = os.path.basename(archivo.filename)
+    ruta_completa = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4()}_{nombre_archivo}")
+
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    guardado = await guardar_pdf_subido(archivo, ruta_completa)
+    if guardado["error"]:
+        raise HTTPException(status_code=guardado["codigo"], detail=guardado["error"])
+
+    # Mismo contenido: no hay nada que re-procesar
+    if guardado["hash_contenido"] == pliego.hash_contenido:
+        os.remove(ruta_completa)
+        return VersionPliegoResponse(
+            pliego=_detalle(pliego),
+            version=pliego.version or 1,
+            chunks_nuevos=0,
+            chunks_eliminados=0,
+            chunks_conservados=0,
+            paginas_modificadas=[],
+            derivados_obsoletos=pliego.fuente.derivados_obsoletos or []
+        )
+
+    resultado = await run_in_threadpool(
+        procesar_nueva_version,
+        db,
+        pliego,
+        ruta_completa,
+        guardado["hash_contenido"],
+        guardado["tamano_bytes"]
+    )
 
     if resultado["error"]:
-        pliego.estado = "error"
-        pliego.error_mensaje = resultado["error"]
-    else:
-        pliego.texto_completo = resultado["texto_completo"]
-        pliego.num_paginas = resultado["num_paginas"]
-
-        # Generar chunks y guardar en ChromaDB
-        try:
-            chunks = dividir_en_chunks(
-                texto=resultado["texto_completo"],
-                paginas=resultado.get("paginas", [])
-            )
-            guardar_chunks(pliego.id, chunks)
-            pliego.texto_tokens = len(resultado["texto_completo"].split())
-            pliego.estado = "listo"
-        except Exception as e:
-            pliego.estado = "error"
-            pliego.error_mensaje = f"Error al generar chunks: {str(e)}"
+        if os.path.exists(ruta_completa):
+            os.remove(ruta_completa)
+        raise HTTPException(status_code=500, detail=resultado["error"])
 
+    pliego.nombre_archivo = nombre_archivo
     db.commit()
     db.refresh(pliego)
 
-    return pliego
+    return VersionPliegoResponse(
+        pliego=pliego,
+        version=pliego.version,
+        chunks_nuevos=resultado["chunks_nuevos"],
+        chunks_eliminados=resultado["chunks_eliminados"],
+        chunks_conservados=resultado["chunks_conservados"],
+        paginas_modificadas=resultado["paginas_modificadas"],
+        derivados_obsoletos=resultado["derivados_obsoletos"]
+    )
 
 
 @router.get("", response_model=List[PliegoResponse])
@@ -86,29 +164,18 @@ def obtener_pliego(pliego_id: int, db: Session = Depends(get_db)):
     pliego = db.query(Pliego).filter(Pliego.id == pliego_id).first()
     if not pliego:
         raise HTTPException(status_code=404, detail="Pliego no encontrado")
-    return pliego
+    return _detalle(pliego)
 
 
 @router.delete("/{pliego_id}")
 def eliminar_pliego(pliego_id: int, db: Session = Depends(get_db)):
-    """Elimina un pliego, su archivo y sus chunks."""
+    """Elimina un pliego; archivo y chunks solo si nadie más los referencia."""
     pliego = db.query(Pliego).filter(Pliego.id == pliego_id).first()
     if not pliego:
         raise HTTPException(status_code=404, detail="Pliego no encontrado")
 
-    # Eliminar archivo físico
-    if os.path.exists(pliego.ruta_archivo):
-        os.remove(pliego.ruta_archivo)
-
-    # Eliminar chunks de ChromaDB
-    try:
-        eliminar_chunks_pliego(pliego_id)
-    except:
-        pass
-
-    # Eliminar de BD
-    db.delete(pliego)
-    db.commit()
+    # Si el contenido es compartido, solo se libera esta referencia
+    liberar_pliego(db, pliego)
 
     return {"mensaje": "Pliego eliminado"}
 
@@ -127,11 +194,13 @@ def generar_checklist_documentos(
     if pliego.estado != "listo":
         raise HTTPException(status_code=400, detail="El pliego aún no está procesado")
 
-    if not pliego.texto_completo:
+    # Texto y checklist de un duplicado viven en el original
+    fuente = pliego.fuente
+    if not fuente.texto_completo:
         raise HTTPException(status_code=400, detail="El pliego no tiene texto extraído")
 
     # Generar checklist
-    resultado = generar_checklist_completo(pliego.id, pliego.texto_completo)
+    resultado = generar_checklist_completo(pliego.pliego_indice_id, fuente.texto_completo)
 
     if resultado.get("error"):
         # Aunque haya error, retornar lo que se pudo generar
@@ -139,11 +208,15 @@ def generar_checklist_documentos(
 
     # Guardar checklist en el pliego
     import json
-    pliego.checklist_documentos = json.dumps(resultado, ensure_ascii=False)
+    fuente.checklist_documentos = json.dumps(resultado, ensure_ascii=False)
+    marcar_derivado_vigente(fuente, "checklist")
     db.commit()
 
     return ChecklistResponse(
         documentos_base=resultado["documentos_base"],
         documentos_especificos=resultado["documentos_especificos"],
-        total_documentos=resultado["total_documentos"]
+        total_documentos=resultado["total_documentos"],
+        tokens_prompt=resultado["tokens_prompt"],
+        tokens_respuesta=resultado["tokens_respuesta"],
+        reintentos=resultado["reintentos"]
     )
@@ -2,13 +2,18 @@ from app.schemas.pliego import (
     PliegoCreate,
     PliegoResponse,
     PliegoDetalle,
+    VersionPliegoResponse,
     PreguntaRequest,
     RespuestaChat,
     ConversacionResponse,
+    BusquedaResponse,
     ResumenRequest,
     ResumenResponse,
     ChecklistRequest,
     ChecklistResponse,
     DocumentoRequerido,
     ReferenciaDocumento,
+    FichaResumen,
+    DocumentoDetectado,
+    DocumentosDetectados,
 )
\ No newline at end of file
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
+import json
+import unicodedata
 
 
 # === PLIEGOS ===
@@ -20,6 +22,7 @@ class PliegoResponse(PliegoBase):
     nombre_archivo: str
     estado: str
     num_paginas: Optional[int] = None
+    pliego_origen_id: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -30,6 +33,18 @@ class PliegoDetalle(PliegoResponse):
     texto_completo: Optional[str] = None
     datos_extraidos: Optional[dict] = None
     error_mensaje: Optional[str] = None
+    version: Optional[int] = None
+    derivados_obsoletos: Optional[List[str]] = None
+
+
+class VersionPliegoResponse(BaseModel):
+    pliego: PliegoDetalle
+    version: int
+    chunks_nuevos: int
+    chunks_eliminados: int
+    chunks_conservados: int
+    paginas_modificadas: List[int]
+    derivados_obsoletos: List[str]
 
 
 # === CHAT ===
@@ -37,6 +52,7 @@ class PliegoDetalle(PliegoResponse):
 class PreguntaRequest(BaseModel):
     pliego_id: int
     pregunta: str
+    sesion_id: Optional[int] = None
 
 
 class FuenteChunk(BaseModel):
@@ -49,11 +65,17 @@ class RespuestaChat(BaseModel):
     tokens_prompt: Optional[int] = None
     tokens_respuesta: Optional[int] = None
     tiempo_ms: Optional[int] = None
+    tiempo_carga_ms: Optional[int] = None
     fuentes: Optional[list[FuenteChunk]] = []
+    sesion_id: Optional[int] = None
+    contexto_reutilizado: Optional[bool] = None
+    modelo_usado: Optional[str] = None
+    intencion: Optional[str] = None
 
 
 class ConversacionResponse(BaseModel):
     id: int
+    sesion_id: Optional[int] = None
     pregunta: str
     respuesta: Optional[str] = None
     created_at: datetime
@@ -62,6 +84,32 @@ class ConversacionResponse(BaseModel):
         from_attributes = True
 
 
+# === BÚSQUEDA EN EL CORPUS ===
+
+class FragmentoBusqueda(BaseModel):
+    texto: str
+    page: int
+    section: str
+    tipo: str
+    score: float
+
+
+class ResultadoBusqueda(BaseModel):
+    pliego: PliegoResponse
+    score: float
+    fragmentos: List[FragmentoBusqueda]
+
+
+class BusquedaResponse(BaseModel):
+    pagina: int
+    por_pagina: int
+    pagina_maxima: int
+    hay_mas: bool
+    # Última página alcanzable y aún quedan resultados (tope BUSQUEDA_MAX_CANDIDATOS)
+    truncado: bool = False
+    resultados: List[ResultadoBusqueda]
+
+
 # === RESUMEN ===
 
 class ResumenRequest(BaseModel):
@@ -70,6 +118,10 @@ class ResumenRequest(BaseModel):
 
 class ResumenResponse(BaseModel):
     ficha: dict
+    campos_llm: List[str] = []
+    tokens_prompt: Optional[int] = None
+    tokens_respuesta: Optional[int] = None
+    reintentos: Optional[int] = None
 
 
 # === CHECKLIST DE DOCUMENTOS ===
@@ -95,4 +147,56 @@ class ChecklistRequest(BaseModel):
 class ChecklistResponse(BaseModel):
     documentos_base: List[DocumentoRequerido]
     documentos_especificos: List[DocumentoRequerido]
-    total_documentos: int
\ No newline at end of file
+    total_documentos: int
+    tokens_prompt: Optional[int] = None
+    tokens_respuesta: Optional[int] = None
+    reintentos: Optional[int] = None
+
+
+# === SALIDAS ESTRUCTURADAS DEL LLM ===
+# Su JSON schema se envía a Ollama en "format" y la respuesta se valida con ellas.
+
+class FichaResumen(BaseModel):
+    numero_proceso: Optional[str] = None
+    entidad: Optional[str] = None
+    objeto: Optional[str] = None
+    presupuesto: Optional[str] = None
+    fecha_cierre: Optional[str] = None
+    experiencia_requerida: Optional[str] = None
+    garantias: Optional[str] = None
+    criterios_evaluacion: Optional[str] = None
+    observaciones: Optional[str] = None
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def a_texto(cls, valor):
+        # Sin format (versiones antiguas de Ollama) a veces llegan listas, objetos o números
+        if isinstance(valor, list):
+            return "; ".join(v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in valor)
+        if isinstance(valor, dict):
+            return json.dumps(valor, ensure_ascii=False)
+        if isinstance(valor, (int, float)):
+            return str(valor)
+        return valor
+
+
+CATEGORIAS_DOCUMENTO = ("experiencia", "tecnico", "financiero", "legal", "otros")
+
+
+class DocumentoDetectado(BaseModel):
+    nombre: str
+    descripcion: str = ""
+    categoria: Literal["experiencia", "tecnico", "financiero", "legal", "otros"] = "otros"
+    mencionado_en: str = ""
+
+    @field_validator("categoria", mode="before")
+    @classmethod
+    def categoria_conocida(cls, valor):
+        # "Técnico" -> "tecnico": el modelo a veces devuelve la categoría con tilde o mayúscula
+        valor = unicodedata.normalize("NFKD", str(valor or "").strip().lower())
+        valor = "".join(c for c in valor if not unicodedata.combining(c))
+        return valor if valor in CATEGORIAS_DOCUMENTO else "otros"
+
+
+class DocumentosDetectados(BaseModel):
+    documentos: List[DocumentoDetectado] = []
\ No newline at end of file
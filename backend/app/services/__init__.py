@@ -1,10 +1,29 @@
 from app.services.pdf_service import extraer_texto_pdf
-from app.services.ollama_service import preguntar_ollama, generar_resumen
-from app.services.chunk_service import dividir_en_chunks
+from app.services.archivo_service import guardar_pdf_subido, LimiteSubidaMiddleware
+from app.services.ollama_service import generar_resumen, llamar_ollama, precalentar_modelos
+from app.services.chat_service import obtener_sesion, responder_en_sesion, memoria_pendiente, condensar_memoria
+from app.services.extraccion_service import extraer_campos, extraer_campos_texto, aplicar_campos, tiene_resumen_llm
+from app.services.busqueda_service import buscar_en_corpus
+from app.services.chunk_service import dividir_en_chunks, dividir_por_paginas, ESTRATEGIAS_CHUNKING
 from app.services.embedding_service import (
     guardar_chunks,
     buscar_chunks_relevantes,
     buscar_normativa,
-    eliminar_chunks_pliego
+    eliminar_chunks_pliego,
+    reasignar_chunks_pliego,
+    copiar_chunks_pliego,
+    actualizar_chunks_pliego,
+    guardar_normativa
 )
 from app.services.documento_service import generar_checklist_completo, DOCUMENTOS_BASE
+from app.services.ingesta_service import (
+    procesar_pliego,
+    buscar_pliego_original,
+    registrar_duplicado,
+    liberar_pliego,
+    procesar_nueva_version,
+    marcar_derivado_vigente
+)
+from app.services.normativa_service import cargar_normativa, dividir_en_articulos
+from app.services.lote_service import procesar_en_lotes
+from app.services.mantenimiento_service import reconciliar, compactar_vectores
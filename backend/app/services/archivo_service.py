@@ -0,0 +1,162 @@
+import hashlib
+import os
+
+import pdfplumber
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+FIRMA_PDF = b"%PDF-"
+# Margen sobre MAX_UPLOAD_MB para las cabeceras y separadores del multipart
+MARGEN_MULTIPART_BYTES = 1024 * 1024
+
+
+def _mensaje_limite() -> str:
+    return f"El archivo supera el límite de {settings.MAX_UPLOAD_MB} MB"
+
+
+class LimiteSubidaMiddleware:
+    """
+    Corta los cuerpos multipart que superan MAX_UPLOAD_MB antes de que lleguen a disco.
+
+    FastAPI (python-multipart) recibe el archivo completo a un temporal antes
+    de llamar al endpoint, así que el límite de guardar_pdf_subido llega tarde.
+    Aquí se rechaza por Content-Length sin leer el cuerpo y, si no viene
+    (transfer-encoding chunked) o miente, se corta al leer el stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabeceras = dict(scope["headers"])
+        if not cabeceras.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024 + MARGEN_MULTIPART_BYTES
+        declarado = cabeceras.get(b"content-length")
+        if declarado and declarado.isdigit() and int(declarado) > max_bytes:
+            respuesta = JSONResponse({"detail": _mensaje_limite()}, status_code=413)
+            await respuesta(scope, receive, send)
+            return
+
+        recibidos = 0
+
+        async def recibir_limitado():
+            nonlocal recibidos
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibidos += len(mensaje.get("body", b""))
+                if recibidos > max_bytes:
+                    # Se lanza mientras el endpoint parsea el formulario: FastAPI responde 413
+                    raise HTTPException(status_code=413, detail=_mensaje_limite())
+            return mensaje
+
+        await self.app(scope, recibir_limitado, send)
+
+
+async def guardar_pdf_subido(archivo: UploadFile, ruta_destino: str) -> dict:
+    """
+    Guarda un PDF subido en disco por bloques, sin cargarlo completo en memoria.
+
+    Valida la firma del PDF en el primer bloque, calcula el hash SHA-256
+    mientras escribe y rechaza el archivo si supera el tamaño máximo. El
+    corte temprano de cuerpos demasiado grandes lo hace LimiteSubidaMiddleware.
+    Al final verifica que el PDF abra y no exceda el número de páginas permitido.
+
+    Args:
+        archivo: Archivo recibido por FastAPI
+        ruta_destino: Ruta final donde quedará el PDF
+
+    Returns:
+        Dict con tamano_bytes, hash_contenido, num_paginas, error y codigo (HTTP)
+    """
+    resultado = {
+        "tamano_bytes": 0,
+        "hash_contenido": None,
+        "num_paginas": 0,
+        "error": None,
+        "codigo": None
+    }
+
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+    ruta_temporal = f"{ruta_destino}.part"
+    hasher = hashlib.sha256()
+
+    try:
+        with open(ruta_temporal, "wb") as f:
+            while True:
+                bloque = await archivo.read(settings.UPLOAD_CHUNK_BYTES)
+                if not bloque:
+                    break
+
+                if resultado["tamano_bytes"] == 0 and not bloque.startswith(FIRMA_PDF):
+                    resultado["error"] = "El archivo no es un PDF válido"
+                    resultado["codigo"] = 400
+                    break
+
+                resultado["tamano_bytes"] += len(bloque)
+                if resultado["tamano_bytes"] > max_bytes:
+                    resultado["error"] = _mensaje_limite()
+                    resultado["codigo"] = 413
+                    break
+
+                hasher.update(bloque)
+                f.write(bloque)
+
+        if not resultado["error"] and resultado["tamano_bytes"] == 0:
+            resultado["error"] = "El archivo está vacío"
+            resultado["codigo"] = 400
+
+        if not resultado["error"]:
+            # pdfplumber es bloqueante: con un PDF grande congelaría el event loop
+            resultado.update(await run_in_threadpool(validar_paginas_pdf, ruta_temporal))
+
+        if resultado["error"]:
+            os.remove(ruta_temporal)
+            return resultado
+
+        os.replace(ruta_temporal, ruta_destino)
+        resultado["hash_contenido"] = hasher.hexdigest()
+
+    except Exception as e:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        resultado["error"] = f"Error al guardar archivo: {str(e)}"
+        resultado["codigo"] = 500
+
+    return resultado
+
+
+def validar_paginas_pdf(ruta_archivo: str) -> dict:
+    """
+    Abre el PDF y verifica que tenga páginas y no exceda el máximo configurado.
+
+    Returns:
+        Dict con num_paginas, error y codigo (HTTP)
+    """
+    resultado = {"num_paginas": 0, "error": None, "codigo": None}
+
+    try:
+        with pdfplumber.open(ruta_archivo) as pdf:
+            resultado["num_paginas"] = len(pdf.pages)
+    except Exception as e:
+        resultado["error"] = f"No se pudo leer el PDF: {str(e)}"
+        resultado["codigo"] = 400
+        return resultado
+
+    if resultado["num_paginas"] == 0:
+        resultado["error"] = "El PDF no tiene páginas"
+        resultado["codigo"] = 400
+    elif resultado["num_paginas"] > settings.MAX_PAGINAS_PDF:
+        resultado["error"] = f"El PDF supera el límite de {settings.MAX_PAGINAS_PDF} páginas"
+        resultado["codigo"] = 413
+
+    return resultado
@@ -0,0 +1,157 @@
+from datetime import date, datetime, time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Pliego
+from app.services.embedding_service import buscar_chunks_corpus, codificar
+
+
+def _filtrar_pliegos(
+    db: Session,
+    entidad: Optional[str],
+    estado: str,
+    fecha_desde: Optional[date],
+    fecha_hasta: Optional[date]
+):
+    # Solo pliegos canónicos: los duplicados comparten los chunks del original
+    consulta = db.query(Pliego).filter(Pliego.pliego_origen_id.is_(None), Pliego.estado == estado)
+    if entidad:
+        consulta = consulta.filter(Pliego.entidad.ilike(f"%{entidad}%"))
+    if fecha_desde:
+        consulta = consulta.filter(Pliego.created_at >= datetime.combine(fecha_desde, time.min))
+    if fecha_hasta:
+        consulta = consulta.filter(Pliego.created_at <= datetime.combine(fecha_hasta, time.max))
+    return consulta
+
+
+def pagina_maxima(por_pliego: int, por_pagina: int) -> int:
+    """
+    Última página que se puede servir completa sin pasar de BUSQUEDA_MAX_CANDIDATOS.
+
+    Cada página pide a ChromaDB (pagina * por_pagina + 1) * por_pliego *
+    BUSQUEDA_SOBREMUESTREO candidatos; más allá del tope las páginas
+    saldrían cortas o vacías aunque haya más pliegos que coinciden.
+    """
+    pliegos_alcanzables = settings.BUSQUEDA_MAX_CANDIDATOS // (por_pliego * settings.BUSQUEDA_SOBREMUESTREO)
+    return max(1, (pliegos_alcanzables - 1) // por_pagina)
+
+
+def buscar_en_corpus(
+    db: Session,
+    q: str,
+    entidad: Optional[str] = None,
+    estado: str = "listo",
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    section: Optional[str] = None,
+    tipo: Optional[str] = None,
+    contiene: Optional[str] = None,
+    por_pliego: int = 3,
+    pagina: int = 1,
+    por_pagina: int = 10
+) -> dict:
+    """
+    Búsqueda semántica en todos los pliegos, agrupada por pliego.
+
+    Los filtros de entidad, estado y fecha se resuelven en la BD y llegan a
+    ChromaDB como un $in de pliego_id; sección y tipo son metadata de los
+    chunks. No hay un índice léxico aparte: contiene es un filtro literal
+    ($contains de ChromaDB) sobre los mismos candidatos y el orden sigue
+    siendo el de la similitud semántica.
+
+    La paginación trabaja sobre un máximo de BUSQUEDA_MAX_CANDIDATOS chunks:
+    no se sirven páginas después de pagina_maxima, y en la última truncado
+    indica que pueden quedar resultados fuera de alcance.
+
+    Args:
+        db: Sesión de BD
+        q: Consulta en lenguaje natural
+        entidad: Parte del nombre de la entidad
+        estado: Estado del pliego
+        fecha_desde: Pliegos subidos desde esta fecha
+        fecha_hasta: Pliegos subidos hasta esta fecha
+        section: Sección de los chunks
+        tipo: "texto" o "tabla"
+        contiene: Texto literal que debe aparecer en el chunk
+        por_pliego: Fragmentos máximos por pliego
+        pagina: Página de resultados (desde 1)
+        por_pagina: Pliegos por página
+
+    Returns:
+        Dict con pagina, por_pagina, pagina_maxima, hay_mas, truncado y
+        resultados (pliego, score y fragmentos), o con error si la página
+        pasa de pagina_maxima
+    """
+    maxima = pagina_maxima(por_pliego, por_pagina)
+    if pagina > maxima:
+        return {
+            "error": f"La búsqueda solo llega a la página {maxima} con por_pagina={por_pagina} "
+                     f"y por_pliego={por_pliego}; usa filtros para acotarla"
+        }
+    vacio = {
+        "pagina": pagina, "por_pagina": por_pagina, "pagina_maxima": maxima,
+        "hay_mas": False, "truncado": False, "resultados": []
+    }
+
+    hay_facetas = bool(entidad or fecha_desde or fecha_hasta or estado != "listo")
+    consulta_pliegos = _filtrar_pliegos(db, entidad, estado, fecha_desde, fecha_hasta)
+
+    if hay_facetas:
+        pliego_ids = [pid for (pid,) in consulta_pliegos.with_entities(Pliego.id).all()]
+        if not pliego_ids:
+            return vacio
+    else:
+        # Sin facetas el $in abarcaría todo el corpus: se filtra después de la consulta
+        pliego_ids = None
+
+    # Candidatos suficientes para llenar la página pedida y saber si hay otra
+    necesarios = (pagina * por_pagina + 1) * por_pliego
+    n_candidatos = min(necesarios * settings.BUSQUEDA_SOBREMUESTREO, settings.BUSQUEDA_MAX_CANDIDATOS)
+
+    chunks = buscar_chunks_corpus(
+        q,
+        n_resultados=n_candidatos,
+        pliego_ids=pliego_ids,
+        section=section,
+        tipo=tipo,
+        contiene=contiene,
+        embedding=codificar([q])[0]
+    )
+
+    # Agrupar por pliego conservando el orden por score
+    grupos = {}
+    for chunk in chunks:
+        fragmentos = grupos.setdefault(chunk["pliego_id"], [])
+        if len(fragmentos) < por_pliego:
+            fragmentos.append(chunk)
+
+    if pliego_ids is None and grupos:
+        validos = {
+            pid for (pid,) in consulta_pliegos.filter(Pliego.id.in_(list(grupos))).with_entities(Pliego.id).all()
+        }
+        grupos = {pid: f for pid, f in grupos.items() if pid in validos}
+
+    orden = list(grupos)
+    inicio = (pagina - 1) * por_pagina
+    ids_pagina = orden[inicio:inicio + por_pagina]
+    pliegos = {p.id: p for p in db.query(Pliego).filter(Pliego.id.in_(ids_pagina)).all()} if ids_pagina else {}
+
+    resultados = []
+    for pid in ids_pagina:
+        fragmentos = [{k: v for k, v in c.items() if k != "pliego_id"} for c in grupos[pid]]
+        resultados.append({
+            "pliego": pliegos[pid],
+            "score": fragmentos[0]["score"],
+            "fragmentos": fragmentos
+        })
+
+    # Con todos los candidatos ocupados ChromaDB pudo tener más pliegos que no entraron
+    hay_mas = len(orden) > inicio + por_pagina or len(chunks) >= n_candidatos
+    return {
+        **vacio,
+        "hay_mas": hay_mas and pagina < maxima,
+        "truncado": hay_mas and pagina >= maxima,
+        "resultados": resultados
+    }
@@ -0,0 +1,226 @@
+import logging
+import time
+from typing import List, Optional
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Pliego, SesionChat
+from app.services.embedding_service import buscar_chunks_relevantes, buscar_normativa, codificar
+from app.services.intencion_service import (
+    clasificar_intencion,
+    registrar_ruta,
+    respuesta_ficha,
+    valor_ficha
+)
+from app.services.ollama_service import (
+    MODELO_COMPLEJO,
+    MODELO_SIMPLE,
+    fuentes_de_chunks,
+    llamar_ollama,
+    llamar_ollama_chat
+)
+from app.services.prompts import contexto_pregunta, mensajes_sesion, prompt_memoria
+
+logger = logging.getLogger(__name__)
+
+
+def obtener_sesion(db: Session, pliego: Pliego, sesion_id: Optional[int] = None) -> Optional[SesionChat]:
+    """
+    Retorna la sesión indicada o crea una nueva para el pliego.
+
+    Returns:
+        La sesión, o None si sesion_id no existe o es de otro pliego
+    """
+    if sesion_id is None:
+        sesion = SesionChat(pliego_id=pliego.id, turnos_resumidos=0)
+        db.add(sesion)
+        db.flush()
+        return sesion
+
+    return (
+        db.query(SesionChat)
+        .filter(SesionChat.id == sesion_id, SesionChat.pliego_id == pliego.id)
+        .first()
+    )
+
+
+def _similitud(a: List[float], b: List[float]) -> float:
+    # Los embeddings ya vienen normalizados: el producto punto es el coseno
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _version_contexto(pliego: Pliego) -> list:
+    # Chunks de los que sale el contexto: cambian con una nueva versión o al independizarse un duplicado
+    return [pliego.pliego_indice_id, pliego.fuente.version or 1]
+
+
+def _recuperar_contexto(sesion: SesionChat, pliego: Pliego, pregunta: str, embedding: List[float]) -> bool:
+    """
+    Deja en sesion.contexto los extractos para la pregunta.
+
+    Si la pregunta sigue el tema de la que recuperó el contexto actual, se
+    reutiliza sin consultar ChromaDB y el prefijo de mensajes no cambia. Un
+    contexto recuperado de otra versión del pliego se descarta.
+
+    Returns:
+        True si se reutilizó el contexto de la sesión
+    """
+    version = _version_contexto(pliego)
+    if sesion.contexto and sesion.embedding_tema and sesion.contexto.get("version") == version:
+        if _similitud(embedding, sesion.embedding_tema) >= settings.SESION_UMBRAL_TEMA:
+            return True
+
+    chunks = buscar_chunks_relevantes(pregunta, pliego.pliego_indice_id, n_resultados=3, embedding=embedding)
+    normativa = buscar_normativa(pregunta, n_resultados=2, embedding=embedding)
+
+    if chunks:
+        contexto_pliego = "\n\n".join(c["texto"][:1000] for c in chunks)
+    else:
+        contexto_pliego = (pliego.fuente.texto_completo or "")[:3000]
+
+    sesion.contexto = {
+        "texto": contexto_pregunta(contexto_pliego, normativa),
+        "fuentes": fuentes_de_chunks(chunks),
+        "version": version
+    }
+    sesion.embedding_tema = embedding
+    return False
+
+
+def memoria_pendiente(sesion: SesionChat) -> bool:
+    """True si la sesión acumuló turnos suficientes para condensar los más antiguos."""
+    return len(sesion.conversaciones) - (sesion.turnos_resumidos or 0) >= settings.SESION_TURNOS_MAX
+
+
+def condensar_memoria(sesion_id: int):
+    """
+    Resume en la memoria de la sesión sus turnos más antiguos.
+
+    Corre en segundo plano después de enviar la respuesta (BackgroundTasks),
+    así la llamada al LLM no suma latencia a la pregunta; mientras tanto los
+    turnos sin resumir se envían literales. Si otra condensación de la misma
+    sesión terminó antes, el resultado se descarta.
+    """
+    db = SessionLocal()
+    try:
+        sesion = db.query(SesionChat).filter(SesionChat.id == sesion_id).first()
+        if not sesion or not memoria_pendiente(sesion):
+            return
+
+        resumidos = sesion.turnos_resumidos or 0
+        antiguos = sesion.conversaciones[resumidos:][:-settings.SESION_TURNOS_RECIENTES]
+        prompt = prompt_memoria(sesion.memoria, [{"pregunta": t.pregunta, "respuesta": t.respuesta} for t in antiguos])
+        # No mantener la transacción abierta durante la llamada al LLM
+        db.commit()
+
+        try:
+            llamada = llamar_ollama(MODELO_SIMPLE, prompt, "memoria")
+        except httpx.HTTPError as e:
+            # Sin memoria nueva la sesión sigue funcionando, solo con más turnos literales
+            logger.warning("No se pudo condensar la memoria de la sesión %s: %s", sesion_id, e)
+            return
+
+        (
+            db.query(SesionChat)
+            .filter(SesionChat.id == sesion_id, func.coalesce(SesionChat.turnos_resumidos, 0) == resumidos)
+            .update(
+                {"memoria": llamada["respuesta"].strip(), "turnos_resumidos": resumidos + len(antiguos)},
+                synchronize_session=False
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def responder_en_sesion(sesion: SesionChat, pliego: Pliego, pregunta: str) -> dict:
+    """
+    Responde una pregunta dentro de una sesión de chat con /api/chat.
+
+    La intención de la pregunta decide la ruta:
+    - extraccion: se responde con la ficha (datos_extraidos) sin LLM; si el
+      campo no está, modelo pequeño con contexto.
+    - simple: modelo pequeño sin contexto.
+    - analitica: modelo grande con contexto.
+
+    Los mensajes llevan el contexto recuperado, la memoria resumida y los
+    turnos aún sin resumir. El llamador guarda la Conversacion con sesion_id
+    y, si memoria_pendiente, programa condensar_memoria en segundo plano.
+
+    Args:
+        sesion: Sesión de chat del pliego
+        pliego: Pliego consultado
+        pregunta: Pregunta del usuario
+
+    Returns:
+        Dict con respuesta, tokens, tiempos, modelo, intención, fuentes, contexto_reutilizado y error
+    """
+    resultado = {
+        "respuesta": "",
+        "tokens_prompt": 0,
+        "tokens_respuesta": 0,
+        "tiempo_ms": 0,
+        "tiempo_carga_ms": 0,
+        "modelo_usado": "",
+        "intencion": "",
+        "fuentes": [],
+        "contexto_reutilizado": False,
+        "error": None
+    }
+
+    inicio = time.time()
+
+    try:
+        embedding = codificar([pregunta])[0]
+        clasificacion = clasificar_intencion(embedding)
+        resultado["intencion"] = clasificacion["intencion"]
+
+        if clasificacion["intencion"] == "extraccion":
+            valor = valor_ficha(pliego, clasificacion["campo"])
+            if valor:
+                resultado["respuesta"] = respuesta_ficha(clasificacion["campo"], valor)
+                resultado["modelo_usado"] = "ficha"
+                resultado["tiempo_ms"] = int((time.time() - inicio) * 1000)
+                registrar_ruta(clasificacion, None, resultado["tiempo_ms"])
+                return resultado
+
+        turnos = sesion.conversaciones[sesion.turnos_resumidos or 0:]
+
+        if clasificacion["intencion"] == "simple":
+            modelo = MODELO_SIMPLE
+            contexto = ""
+        else:
+            modelo = MODELO_SIMPLE if clasificacion["intencion"] == "extraccion" else MODELO_COMPLEJO
+            resultado["contexto_reutilizado"] = _recuperar_contexto(sesion, pliego, pregunta, embedding)
+            contexto = sesion.contexto["texto"]
+            resultado["fuentes"] = sesion.contexto["fuentes"]
+
+        resultado["modelo_usado"] = modelo
+
+        mensajes = mensajes_sesion(
+            pregunta,
+            contexto,
+            sesion.memoria,
+            [{"pregunta": t.pregunta, "respuesta": t.respuesta} for t in turnos]
+        )
+        llamada = llamar_ollama_chat(modelo, mensajes, "pregunta")
+
+        resultado["respuesta"] = llamada["respuesta"]
+        resultado["tokens_prompt"] = llamada["tokens_prompt"]
+        resultado["tokens_respuesta"] = llamada["tokens_respuesta"]
+        resultado["tiempo_ms"] = llamada["tiempo_ms"]
+        resultado["tiempo_carga_ms"] = llamada["tiempo_carga_ms"]
+        registrar_ruta(clasificacion, modelo, llamada["tiempo_ms"])
+
+    except httpx.TimeoutException:
+        resultado["error"] = "Timeout: Ollama tardó demasiado en responder"
+    except httpx.HTTPError as e:
+        resultado["error"] = f"Error HTTP: {str(e)}"
+    except Exception as e:
+        resultado["error"] = f"Error: {str(e)}"
+
+    return resultado
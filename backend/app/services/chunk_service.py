@@ -1,6 +1,25 @@
-from typing import List
+from typing import Callable, Dict, List
 import re
 
+from app.config import settings
+from app.services.pdf_service import tabla_a_markdown
+from app.services.embedding_service import contar_tokens, max_tokens_embedding
+
+# Palabras que delatan el contenido de una tabla cuando no trae un título reconocible
+PATRONES_TABLAS = [
+    (r'PUNTAJE|PUNTOS|PONDERACI[OÓ]N|CRITERIOS?', 'criterios_evaluacion'),
+    (r'PRESUPUESTO|VALOR|PRECIO|CANT(IDAD)?\.?|SUBTOTAL|IVA', 'presupuesto'),
+    (r'CRONOGRAMA|FECHA|HORA', 'cronograma'),
+]
+
+# Líneas que abren un bloque: numerales, capítulos/anexos y títulos en mayúscula
+PATRON_NUMERAL = re.compile(r'^\s*(\d+\.)+\d*\s+\S|^\s*(\d+|[a-z])\)\s+\S')
+PATRON_ENCABEZADO = re.compile(
+    r'^\s*(CAP[IÍ]TULO|SECCI[OÓ]N|T[IÍ]TULO|ANEXO|FORMATO|PAR[AÁ]GRAFO)\b',
+    re.IGNORECASE
+)
+PATRON_FIN_ORACION = re.compile(r'(?<=[\.\?\!;:])\s+(?=[¿¡"“(]?[A-ZÁÉÍÓÚÑ0-9])')
+
 
 def detectar_seccion(texto: str) -> str:
     """
@@ -103,7 +122,8 @@ def dividir_en_chunks(texto: str, paginas: List[dict] = None, tamano: int = 500,
             "fin": min(fin, len(palabras)),
             "palabras": len(chunk_texto.split()),
             "page": pagina,
-            "section": seccion
+            "section": seccion,
+            "tipo": "texto"
         })
 
         chunk_id += 1
@@ -113,3 +133,287 @@ def dividir_en_chunks(texto: str, paginas: List[dict] = None, tamano: int = 500,
             break
 
     return chunks
+
+
+def detectar_seccion_tabla(tabla: dict, texto_pagina: str) -> str:
+    """Detecta la sección de una tabla por su contenido, su página o su encabezado."""
+    seccion = detectar_seccion(tabla["markdown"])
+    if seccion != "sin_seccion":
+        return seccion
+
+    seccion = detectar_seccion(texto_pagina or "")
+    if seccion != "sin_seccion":
+        return seccion
+
+    encabezado = " ".join(" ".join(fila) for fila in tabla["filas"][:2]).upper()
+    for patron, nombre_seccion in PATRONES_TABLAS:
+        if re.search(patron, encabezado):
+            return nombre_seccion
+
+    return "tabla"
+
+
+def contar_palabras(textos: List[str]) -> List[int]:
+    return [len(t.split()) for t in textos]
+
+
+def dividir_tabla(
+    tabla: dict,
+    texto_pagina: str = "",
+    tamano: int = 500,
+    medir: Callable[[List[str]], List[int]] = contar_palabras
+) -> List[dict]:
+    """
+    Divide una tabla en chunks por filas, repitiendo el encabezado en cada uno.
+
+    Args:
+        tabla: Dict con filas (la primera es el encabezado) y markdown
+        texto_pagina: Texto de la página, para detectar la sección
+        tamano: Tamaño máximo por chunk, en las unidades de medir
+        medir: Función que mide una lista de textos (palabras o tokens)
+
+    Returns:
+        Lista de chunks de tipo tabla
+    """
+    encabezado, filas = tabla["filas"][0], tabla["filas"][1:]
+    seccion = detectar_seccion_tabla(tabla, texto_pagina)
+
+    # El encabezado y su separador se repiten en cada chunk
+    lineas = ["|" + "---|" * len(encabezado)]
+    lineas += ["| " + " | ".join(fila) + " |" for fila in [encabezado] + filas]
+    medidas = medir(lineas)
+    medida_encabezado, medidas_filas = medidas[0] + medidas[1], medidas[2:]
+
+    grupos = []
+    actual = []
+    total = medida_encabezado
+    for fila, medida in zip(filas, medidas_filas):
+        if actual and total + medida > tamano:
+            grupos.append(actual)
+            actual = []
+            total = medida_encabezado
+        actual.append(fila)
+        total += medida
+    if actual:
+        grupos.append(actual)
+
+    chunks = []
+    for grupo in grupos:
+        chunk_texto = tabla_a_markdown(grupo, encabezado)
+        chunks.append({
+            "texto": chunk_texto,
+            "palabras": len(chunk_texto.split()),
+            "section": seccion,
+            "tipo": "tabla"
+        })
+
+    return chunks
+
+
+# === ESTRATEGIAS DE CHUNKING ===
+
+def _chunks_palabras(texto: str, tamano: int = 500, solapamiento: int = 50) -> List[dict]:
+    """Ventanas fijas de palabras con solapamiento (estrategia original)."""
+    return dividir_en_chunks(texto, tamano=tamano, solapamiento=solapamiento)
+
+
+def _es_encabezado(linea: str) -> bool:
+    linea = linea.strip()
+    if not linea:
+        return False
+    if PATRON_NUMERAL.match(linea) or PATRON_ENCABEZADO.match(linea):
+        return True
+
+    # Títulos cortos en mayúscula ("GARANTÍAS", "FORMA DE PAGO")
+    letras = [c for c in linea if c.isalpha()]
+    return len(linea.split()) <= 12 and len(letras) >= 4 and all(c.isupper() for c in letras)
+
+
+def _bloques_estructura(texto: str) -> List[dict]:
+    """Agrupa las líneas en bloques que empiezan en un encabezado o numeral."""
+    bloques = []
+    actual = {"encabezado": None, "lineas": []}
+
+    for linea in texto.split("\n"):
+        linea = linea.strip()
+        if not linea:
+            continue
+        if _es_encabezado(linea):
+            if actual["lineas"]:
+                bloques.append(actual)
+                actual = {"encabezado": None, "lineas": []}
+            if actual["encabezado"] is None:
+                actual["encabezado"] = linea
+        actual["lineas"].append(linea)
+
+    if actual["lineas"]:
+        bloques.append(actual)
+
+    return bloques
+
+
+def _partir_por_tokens(oracion: str, tokens: int, max_tokens: int) -> List[str]:
+    """Parte una oración que no cabe en un chunk en trozos de palabras de tamaño similar."""
+    palabras = oracion.split()
+    partes = -(-tokens // max_tokens)
+    por_parte = -(-len(palabras) // partes)
+    return [" ".join(palabras[i:i + por_parte]) for i in range(0, len(palabras), por_parte)]
+
+
+def _chunks_estructura(texto: str, max_tokens: int = 240, solapamiento_tokens: int = 32) -> List[dict]:
+    """
+    Chunks limitados por tokens del modelo de embeddings que cortan en
+    oraciones, numerales y encabezados.
+
+    Un encabezado abre chunk nuevo si el actual ya tiene contenido suficiente;
+    dentro de un bloque se acumulan oraciones hasta llenar el presupuesto de
+    tokens y el siguiente chunk repite las últimas oraciones como solapamiento.
+    """
+    max_tokens = min(max_tokens, max_tokens_embedding())
+
+    unidades = []
+    for bloque in _bloques_estructura(texto):
+        oraciones = [o.strip() for o in PATRON_FIN_ORACION.split(" ".join(bloque["lineas"])) if o.strip()]
+        for i, oracion in enumerate(oraciones):
+            unidades.append({
+                "texto": oracion,
+                "encabezado": bloque["encabezado"],
+                "inicia_bloque": i == 0
+            })
+
+    if not unidades:
+        return []
+
+    tokens_unidades = contar_tokens([u["texto"] for u in unidades])
+    oraciones = []
+    for unidad, tokens in zip(unidades, tokens_unidades):
+        if tokens <= max_tokens:
+            oraciones.append({**unidad, "tokens": tokens})
+            continue
+        partes = _partir_por_tokens(unidad["texto"], tokens, max_tokens)
+        for parte, tokens_parte in zip(partes, contar_tokens(partes)):
+            oraciones.append({**unidad, "texto": parte, "tokens": tokens_parte})
+            unidad = {**unidad, "inicia_bloque": False}
+
+    chunks = []
+    actual = []
+    tokens_actual = 0
+    encabezado = None
+
+    def cerrar_chunk():
+        chunk_texto = " ".join(o["texto"] for o in actual)
+        seccion = detectar_seccion(chunk_texto)
+        if seccion == "sin_seccion" and encabezado:
+            seccion = encabezado[:100]
+        chunks.append({
+            "id": len(chunks),
+            "texto": chunk_texto,
+            "palabras": len(chunk_texto.split()),
+            "tokens": tokens_actual,
+            "section": seccion,
+            "tipo": "texto"
+        })
+
+    for oracion in oraciones:
+        nuevo_bloque = oracion["inicia_bloque"] and tokens_actual >= max_tokens // 4
+        if actual and (nuevo_bloque or tokens_actual + oracion["tokens"] > max_tokens):
+            cerrar_chunk()
+
+            # Solapamiento: últimas oraciones del mismo bloque que quepan
+            solapadas = []
+            if not nuevo_bloque:
+                for previa in reversed(actual):
+                    usados = sum(o["tokens"] for o in solapadas)
+                    if usados + previa["tokens"] > solapamiento_tokens:
+                        break
+                    if usados + previa["tokens"] + oracion["tokens"] > max_tokens:
+                        break
+                    solapadas.insert(0, previa)
+            actual = solapadas
+            tokens_actual = sum(o["tokens"] for o in actual)
+
+        if not actual:
+            encabezado = oracion["encabezado"] or encabezado
+        actual.append(oracion)
+        tokens_actual += oracion["tokens"]
+
+    if actual:
+        cerrar_chunk()
+
+    # Un resto muy pequeño al final de la página se une al chunk anterior si cabe
+    if len(chunks) > 1 and chunks[-1]["tokens"] < max_tokens // 8:
+        ultimo, previo = chunks[-1], chunks[-2]
+        if previo["tokens"] + ultimo["tokens"] <= max_tokens:
+            previo["texto"] = f"{previo['texto']} {ultimo['texto']}"
+            previo["palabras"] += ultimo["palabras"]
+            previo["tokens"] += ultimo["tokens"]
+            chunks.pop()
+
+    return chunks
+
+
+ESTRATEGIAS_CHUNKING: Dict[str, Callable[..., List[dict]]] = {
+    "palabras": _chunks_palabras,
+    "estructura": _chunks_estructura,
+}
+
+
+def configuracion_estrategia(estrategia: str) -> dict:
+    """Configuración por defecto de cada estrategia, tomada de settings."""
+    return {
+        "palabras": {
+            "tamano": settings.CHUNK_PALABRAS,
+            "solapamiento": settings.CHUNK_SOLAPAMIENTO_PALABRAS,
+        },
+        "estructura": {
+            "max_tokens": settings.CHUNK_MAX_TOKENS,
+            "solapamiento_tokens": settings.CHUNK_SOLAPAMIENTO_TOKENS,
+        },
+    }[estrategia]
+
+
+def dividir_por_paginas(paginas: List[dict], estrategia: str = None, **config) -> List[dict]:
+    """
+    Divide el documento en chunks sin cruzar límites de página.
+
+    Al anclar los chunks a su página, un cambio en una página (por ejemplo una
+    adenda) solo altera los chunks de esa página y el resto conserva su hash.
+    Las tablas de cada página van en chunks propios de tipo tabla.
+
+    Args:
+        paginas: Lista de dicts con numero, texto y tablas de cada página
+        estrategia: Nombre en ESTRATEGIAS_CHUNKING (por defecto settings.CHUNK_ESTRATEGIA)
+        **config: Parámetros de la estrategia; los omitidos salen de settings
+
+    Returns:
+        Lista de dicts con texto, metadata, page y section
+    """
+    estrategia = estrategia or settings.CHUNK_ESTRATEGIA
+    if estrategia not in ESTRATEGIAS_CHUNKING:
+        raise ValueError(f"Estrategia de chunking desconocida: {estrategia}")
+
+    dividir = ESTRATEGIAS_CHUNKING[estrategia]
+    config = {**configuracion_estrategia(estrategia), **config}
+
+    # Las tablas se miden en las mismas unidades que la estrategia
+    if estrategia == "estructura":
+        tamano_tabla = min(config["max_tokens"], max_tokens_embedding())
+        medir_tabla = contar_tokens
+    else:
+        tamano_tabla = config["tamano"]
+        medir_tabla = contar_palabras
+
+    chunks = []
+
+    for pagina in paginas:
+        chunks_pagina = dividir(pagina["texto"], **config)
+        for tabla in pagina.get("tablas", []):
+            chunks_pagina += dividir_tabla(tabla, pagina["texto"], tamano=tamano_tabla, medir=medir_tabla)
+
+        for chunk in chunks_pagina:
+            chunk["id"] = len(chunks)
+            chunk["page"] = pagina["numero"]
+            chunk["extraccion"] = pagina.get("metodo", "texto")
+            chunks.append(chunk)
+
+    return chunks
@@ -1,8 +1,16 @@
 from typing import List, Dict
-import httpx
-import json
+import logging
+
+from pydantic import ValidationError
+
 from app.config import settings
+from app.metricas import LLM_REINTENTOS_TOTAL
+from app.schemas import DocumentoDetectado, DocumentosDetectados
 from app.services.embedding_service import buscar_chunks_relevantes
+from app.services.ollama_service import MODELO_COMPLEJO, esquema_formato, extraer_json, llamar_ollama
+from app.services.prompts import prompt_documentos
+
+logger = logging.getLogger(__name__)
 
 # Lista base de documentos siempre requeridos en licitaciones colombianas
 DOCUMENTOS_BASE = [
@@ -61,15 +69,22 @@ def detectar_documentos_adicionales(texto_pliego: str, pliego_id: int) -> Dict:
     """
     Usa IA para detectar documentos adicionales específicos del pliego.
 
+    La salida se restringe con el JSON schema de DocumentosDetectados y cada
+    documento se valida por separado. Si la respuesta llega cortada se pide
+    solo lo que falte, indicando los ya detectados (LLM_REINTENTOS_JSON).
+
     Args:
         texto_pliego: Texto completo del pliego
         pliego_id: ID del pliego para buscar chunks relevantes
 
     Returns:
-        Dict con documentos detectados y error si hay
+        Dict con documentos detectados, tokens_prompt, tokens_respuesta, reintentos y error si hay
     """
     resultado = {
         "documentos": [],
+        "tokens_prompt": 0,
+        "tokens_respuesta": 0,
+        "reintentos": 0,
         "error": None
     }
 
@@ -85,68 +100,44 @@ def detectar_documentos_adicionales(texto_pliego: str, pliego_id: int) -> Dict:
         # Crear contexto para el LLM
         contexto = "\n\n".join([f"[Página {c['page']}, Sección: {c['section']}]\n{c['texto']}" for c in chunks_combinados[:8]])
 
-        prompt = f"""Eres un experto en contratación estatal colombiana.
-Analiza el siguiente extracto del pliego y extrae ÚNICAMENTE los documentos ESPECÍFICOS requeridos que NO estén en esta lista base:
-- Certificado de Cámara de Comercio
-- RUT
-- Antecedentes fiscales, disciplinarios y judiciales
-- Certificado de aportes a seguridad social
-- Garantía de seriedad de la oferta
-- Carta de presentación
-
-EXTRACTO DEL PLIEGO:
-{contexto}
-
-Identifica documentos ADICIONALES como:
-- Certificaciones de experiencia específicas
-- Licencias o permisos especiales
-- Certificados técnicos o de calidad
-- Documentos financieros específicos
-- Certificaciones de personal
-- Autorizaciones especiales
-
-Responde ÚNICAMENTE con un JSON válido en este formato:
-{{
-  "documentos": [
-    {{
-      "nombre": "nombre del documento",
-      "descripcion": "descripción breve",
-      "categoria": "experiencia|tecnico|financiero|legal|otros",
-      "mencionado_en": "texto exacto donde se menciona (máximo 200 caracteres)"
-    }}
-  ]
-}}
-
-Si no hay documentos adicionales específicos, retorna: {{"documentos": []}}"""
-
-        with httpx.Client(timeout=120.0) as client:
-            response = client.post(
-                f"{settings.OLLAMA_HOST}/api/generate",
-                json={
-                    "model": "llama3.1:latest",
-                    "prompt": prompt,
-                    "stream": False
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-
-        respuesta_texto = data.get("response", "{}")
+        documentos = {}
+        ya_detectados = None
+        formato = esquema_formato(DocumentosDetectados)
 
-        # Limpiar respuesta (a veces viene con texto adicional)
-        # Buscar el primer { y último }
-        inicio = respuesta_texto.find("{")
-        fin = respuesta_texto.rfind("}") + 1
-
-        if inicio != -1 and fin > inicio:
-            json_limpio = respuesta_texto[inicio:fin]
-            documentos_detectados = json.loads(json_limpio)
-            resultado["documentos"] = documentos_detectados.get("documentos", [])
-        else:
-            resultado["error"] = "No se pudo extraer JSON de la respuesta"
+        while True:
+            llamada = llamar_ollama(
+                MODELO_COMPLEJO, prompt_documentos(contexto, ya_detectados), "documentos",
+                timeout=120.0, formato=formato
+            )
+            resultado["tokens_prompt"] += llamada["tokens_prompt"]
+            resultado["tokens_respuesta"] += llamada["tokens_respuesta"]
+
+            respuesta = extraer_json(llamada["respuesta"])
+            for item in (respuesta or {}).get("documentos") or []:
+                try:
+                    documento = DocumentoDetectado.model_validate(item)
+                except ValidationError:
+                    continue  # elemento incompleto: se descarta solo ese
+                documentos.setdefault(documento.nombre.strip().lower(), documento.model_dump())
+
+            # Completa: no hace falta pedir más. Cortada o sin JSON: se piden solo los que falten
+            if respuesta is not None and not llamada["truncada"]:
+                break
+            if resultado["reintentos"] >= settings.LLM_REINTENTOS_JSON:
+                if respuesta is None and not documentos:
+                    resultado["error"] = "No se pudo extraer JSON de la respuesta"
+                break
+
+            resultado["reintentos"] += 1
+            LLM_REINTENTOS_TOTAL.labels("documentos").inc()
+            ya_detectados = [d["nombre"] for d in documentos.values()] or None
+
+        resultado["documentos"] = list(documentos.values())
+        logger.info(
+            "Documentos detectados: %d tokens_prompt=%d tokens_respuesta=%d reintentos=%d",
+            len(documentos), resultado["tokens_prompt"], resultado["tokens_respuesta"], resultado["reintentos"]
+        )
 
-    except json.JSONDecodeError as e:
-        resultado["error"] = f"Error al parsear JSON: {str(e)}"
     except Exception as e:
         resultado["error"] = f"Error al detectar documentos: {str(e)}"
 
@@ -185,7 +176,7 @@ def encontrar_referencias_documento(nombre_documento: str, descripcion: str, pli
                 referencias.append(ref)
 
     except Exception as e:
-        print(f"Error al buscar referencias para {nombre_documento}: {str(e)}")
+        logger.warning("Error al buscar referencias para %s: %s", nombre_documento, e)
 
     return referencias
 
@@ -199,12 +190,15 @@ def generar_checklist_completo(pliego_id: int, texto_pliego: str) -> Dict:
         texto_pliego: Texto completo del pliego
 
     Returns:
-        Dict con checklist completo y metadatos
+        Dict con checklist completo y metadatos (tokens y reintentos del LLM)
     """
     resultado = {
         "documentos_base": [],
         "documentos_especificos": [],
         "total_documentos": 0,
+        "tokens_prompt": 0,
+        "tokens_respuesta": 0,
+        "reintentos": 0,
         "error": None
     }
 
@@ -222,6 +216,8 @@ def generar_checklist_completo(pliego_id: int, texto_pliego: str) -> Dict:
 
         # 2. Detectar documentos adicionales con IA
         deteccion = detectar_documentos_adicionales(texto_pliego, pliego_id)
+        for clave in ("tokens_prompt", "tokens_respuesta", "reintentos"):
+            resultado[clave] = deteccion[clave]
 
         if deteccion["error"]:
             resultado["error"] = f"Advertencia al detectar documentos específicos: {deteccion['error']}"
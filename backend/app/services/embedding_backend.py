@@ -0,0 +1,132 @@
+import logging
+import threading
+from typing import List
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BackendSentenceTransformer:
+    """Modelo de sentence-transformers en PyTorch; con int8 se cuantizan las capas lineales."""
+
+    def __init__(self, modelo: str, cuantizar: bool = False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if settings.EMBEDDING_THREADS > 0:
+            torch.set_num_threads(settings.EMBEDDING_THREADS)
+
+        self.modelo = SentenceTransformer(modelo, device="cpu")
+        if cuantizar:
+            self.modelo = torch.quantization.quantize_dynamic(
+                self.modelo, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.nombre = "int8" if cuantizar else "sentence_transformers"
+        self.tokenizer = self.modelo.tokenizer
+        self.max_seq_length = self.modelo.max_seq_length
+
+    def encode(self, textos: List[str], batch_size: int) -> np.ndarray:
+        return self.modelo.encode(
+            textos,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+
+
+class BackendOnnx:
+    """
+    Mismo modelo exportado a ONNX y ejecutado con ONNX Runtime.
+
+    Replica el pipeline de sentence-transformers: mean pooling sobre la
+    máscara de atención y normalización L2.
+    """
+
+    def __init__(self, modelo: str, ruta_onnx: str, archivo_onnx: str):
+        import onnxruntime as ort  # dependencia de chromadb
+        from transformers import AutoTokenizer
+
+        repo = modelo if "/" in modelo else f"sentence-transformers/{modelo}"
+        if not ruta_onnx:
+            from huggingface_hub import hf_hub_download
+            ruta_onnx = hf_hub_download(repo, archivo_onnx)
+        self.tokenizer = AutoTokenizer.from_pretrained(repo)
+
+        opciones = ort.SessionOptions()
+        if settings.EMBEDDING_THREADS > 0:
+            opciones.intra_op_num_threads = settings.EMBEDDING_THREADS
+        opciones.inter_op_num_threads = 1
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.sesion = ort.InferenceSession(ruta_onnx, opciones, providers=["CPUExecutionProvider"])
+        self.entradas = {i.name for i in self.sesion.get_inputs()}
+        self.nombre = "onnx"
+        self.max_seq_length = settings.EMBEDDING_MAX_TOKENS
+
+    def encode(self, textos: List[str], batch_size: int) -> np.ndarray:
+        resultados = []
+        for inicio in range(0, len(textos), batch_size):
+            lote = self.tokenizer(
+                textos[inicio:inicio + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            entradas = {k: v.astype(np.int64) for k, v in lote.items() if k in self.entradas}
+            salida = self.sesion.run(None, entradas)[0]
+
+            mascara = lote["attention_mask"][..., None].astype(np.float32)
+            promedio = (salida * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+            normas = np.linalg.norm(promedio, axis=1, keepdims=True)
+            resultados.append(promedio / np.clip(normas, 1e-12, None))
+
+        return np.vstack(resultados) if resultados else np.zeros((0, 0), dtype=np.float32)
+
+
+def crear_backend(nombre: str):
+    """Crea el backend pedido; si falla, cae a sentence-transformers fp32."""
+    try:
+        if nombre == "onnx":
+            return BackendOnnx(settings.EMBEDDING_MODELO, settings.EMBEDDING_ONNX_PATH, settings.EMBEDDING_ONNX_ARCHIVO)
+        if nombre == "int8":
+            return BackendSentenceTransformer(settings.EMBEDDING_MODELO, cuantizar=True)
+        if nombre != "sentence_transformers":
+            raise ValueError(f"Backend de embeddings desconocido: {nombre}")
+    except Exception:
+        logger.exception("No se pudo cargar el backend de embeddings '%s', se usa sentence_transformers", nombre)
+
+    return BackendSentenceTransformer(settings.EMBEDDING_MODELO)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_backends_modelo = {}
+
+
+def obtener_backend(modelo: str = None):
+    """
+    Backend configurado en EMBEDDING_BACKEND, cargado la primera vez que se usa.
+
+    Con otro modelo (reindex --modelo, o una colección construida con él) se
+    carga aparte en sentence-transformers; el configurado no se reemplaza.
+    """
+    global _backend
+    if modelo and modelo != settings.EMBEDDING_MODELO:
+        if modelo not in _backends_modelo:
+            with _backend_lock:
+                if modelo not in _backends_modelo:
+                    _backends_modelo[modelo] = BackendSentenceTransformer(modelo)
+                    logger.info("Modelo de embeddings adicional: %s", modelo)
+        return _backends_modelo[modelo]
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = crear_backend(settings.EMBEDDING_BACKEND)
+                logger.info("Backend de embeddings: %s", _backend.nombre)
+    return _backend
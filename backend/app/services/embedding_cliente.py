@@ -0,0 +1,129 @@
+import threading
+from typing import List, Optional
+
+import httpx
+
+from app.config import settings
+from app.metricas import CABECERA_ID_PETICION, id_peticion
+
+_cliente = None
+_cliente_lock = threading.Lock()
+_tokenizer = None
+
+
+def _obtener_cliente() -> httpx.Client:
+    """Cliente HTTP persistente hacia el worker de embeddings (TCP local o socket Unix)."""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                url = settings.EMBEDDING_WORKER_URL
+                if url.startswith("unix://"):
+                    _cliente = httpx.Client(
+                        transport=httpx.HTTPTransport(uds=url[len("unix://"):]),
+                        base_url="http://embeddings",
+                        timeout=settings.EMBEDDING_WORKER_TIMEOUT_S
+                    )
+                else:
+                    _cliente = httpx.Client(base_url=url, timeout=settings.EMBEDDING_WORKER_TIMEOUT_S)
+    return _cliente
+
+
+def _post(ruta: str, datos: dict, timeout=httpx.USE_CLIENT_DEFAULT):
+    response = _obtener_cliente().post(
+        ruta, json=datos, headers={CABECERA_ID_PETICION: id_peticion.get()}, timeout=timeout
+    )
+    if response.status_code == 400:
+        # Mismo tipo de error que lanzaría ChromaDB en modo local
+        raise ValueError(response.json().get("detail"))
+    response.raise_for_status()
+    return response.json()
+
+
+def codificar_remoto(textos: List[str], modelo: Optional[str] = None) -> List[List[float]]:
+    return _post("/encode", {"textos": textos, "modelo": modelo})["embeddings"]
+
+
+def activar_coleccion_remota(
+    nombre: Optional[str],
+    modelo: Optional[str] = None,
+    actualizados: Optional[List[int]] = None,
+    vigentes: Optional[List[int]] = None
+) -> dict:
+    """Activa una colección de pliegos en el worker (sin nombre solo consulta la activa y su modelo)."""
+    return _post(
+        "/coleccion_activa",
+        {"nombre": nombre, "modelo": modelo, "actualizados": actualizados, "vigentes": vigentes},
+        timeout=None if vigentes is not None else httpx.USE_CLIENT_DEFAULT
+    )
+
+
+def sincronizar_coleccion_remota(nombre: str, actualizados: List[int], vigentes: List[int]) -> dict:
+    return _post(
+        f"/colecciones/{nombre}/sincronizar",
+        {"actualizados": actualizados, "vigentes": vigentes},
+        timeout=None
+    )
+
+
+def crear_coleccion_remota(modelo: str) -> str:
+    """Crea en el worker una colección sombra para el modelo indicado y retorna su nombre."""
+    return _post("/colecciones", {"modelo": modelo})["nombre"]
+
+
+def eliminar_coleccion_remota(nombre: str):
+    return _post(f"/colecciones/{nombre}/eliminar", {})
+
+
+def compactar_remoto(consultas: int, tamano_lote: int) -> dict:
+    # Copia la colección completa: puede tardar mucho más que una operación normal
+    return _post("/compactar", {"consultas": consultas, "tamano_lote": tamano_lote}, timeout=None)
+
+
+def obtener_tokenizer():
+    """Tokenizer local del modelo: contar tokens no justifica un viaje al worker."""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+
+        modelo = settings.EMBEDDING_MODELO
+        _tokenizer = AutoTokenizer.from_pretrained(
+            modelo if "/" in modelo else f"sentence-transformers/{modelo}"
+        )
+    return _tokenizer
+
+
+class ColeccionRemota:
+    """
+    Colección de ChromaDB que vive en el worker de embeddings.
+
+    Expone los mismos métodos que usa embedding_service sobre una colección
+    local, así el resto del servicio no distingue entre modo local y remoto.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+
+    def _llamar(self, operacion: str, **kwargs):
+        return _post(f"/colecciones/{self.nombre}/{operacion}", kwargs)
+
+    def add(self, **kwargs):
+        return self._llamar("add", **kwargs)
+
+    def upsert(self, **kwargs):
+        return self._llamar("upsert", **kwargs)
+
+    def update(self, **kwargs):
+        return self._llamar("update", **kwargs)
+
+    def delete(self, **kwargs):
+        return self._llamar("delete", **kwargs)
+
+    def get(self, **kwargs):
+        return self._llamar("get", **kwargs)
+
+    def query(self, **kwargs):
+        return self._llamar("query", **kwargs)
+
+    def count(self) -> int:
+        return self._llamar("count")
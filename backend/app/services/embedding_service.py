@@ -1,73 +1,671 @@
 import chromadb
-from sentence_transformers import SentenceTransformer
+from chromadb.db.base import UniqueConstraintError
+from collections import OrderedDict
+from concurrent.futures import Future
 from typing import List
+import hashlib
+import json
 import os
+import re
+import queue
+import threading
+import time
 
-# Inicializar modelo de embeddings
-
-# Inicializar modelo de embeddings (se carga al importar)
-from sentence_transformers import SentenceTransformer
-modelo_embeddings = SentenceTransformer('all-MiniLM-L6-v2')
+from app.config import settings
+from app.metricas import medir, observar
+from app.services.embedding_backend import obtener_backend
+from app.services.embedding_cliente import (
+    ColeccionRemota,
+    activar_coleccion_remota,
+    codificar_remoto,
+    crear_coleccion_remota,
+    eliminar_coleccion_remota,
+    obtener_tokenizer,
+    sincronizar_coleccion_remota
+)
 
 cliente_chroma = None
 coleccion_pliegos = None
 coleccion_normativa = None
 
+# Alias de la colección de pliegos activa: python -m app.cli reindex --sombra
+# construye una colección nueva y al terminar reescribe este archivo
+ARCHIVO_COLECCION_ACTIVA = "coleccion_activa.json"
+COLECCION_PLIEGOS = "pliegos"
+NOMBRE_SOMBRA = re.compile(r"pliegos_\d{14}$")
+METADATA_PLIEGOS = {"descripcion": "Chunks de pliegos de usuarios"}
+_alias_mtime = None
+_dimensiones = {}
+
+# Caché de consultas de normativa (LRU con expiración) y del conteo de la colección
+_cache_normativa = OrderedDict()
+_cache_normativa_lock = threading.Lock()
+_normativa_conteo = None
+_normativa_conteo_ts = 0.0
+
+def usa_worker_remoto() -> bool:
+    """True si el modelo y ChromaDB viven en el worker de embeddings (EMBEDDING_WORKER_URL)."""
+    return bool(settings.EMBEDDING_WORKER_URL)
+
+
 def inicializar_servicios():
-    """Inicializa modelo de embeddings y ChromaDB."""
-    global modelo_embeddings, cliente_chroma, coleccion_pliegos, coleccion_normativa
-    
+    """
+    Inicializa ChromaDB (el modelo de embeddings se carga al primer uso).
+
+    Con EMBEDDING_WORKER_URL las colecciones son proxies al worker, que es el
+    único proceso que abre el directorio de ChromaDB.
+    """
+    global cliente_chroma, coleccion_pliegos, coleccion_normativa
+
+    if coleccion_pliegos is not None:
+        if cliente_chroma is not None:
+            _seguir_coleccion_activa()
+        return
+
+    if usa_worker_remoto():
+        coleccion_pliegos = ColeccionRemota(COLECCION_PLIEGOS)
+        coleccion_normativa = ColeccionRemota("normativa")
+        return
+
     if cliente_chroma is None:
-        ruta_db = os.environ.get('CHROMA_PATH', '/app/chroma_data')
-        cliente_chroma = chromadb.PersistentClient(path=ruta_db)
-        
-        coleccion_pliegos = cliente_chroma.get_or_create_collection(
-            name="pliegos",
-            metadata={"descripcion": "Chunks de pliegos de usuarios"}
-        )
-        
+        cliente_chroma = chromadb.PersistentClient(path=ruta_chroma())
+
+        _seguir_coleccion_activa()
+
         coleccion_normativa = cliente_chroma.get_or_create_collection(
             name="normativa",
             metadata={"descripcion": "Normativa colombiana de contratacion"}
         )
 
-def guardar_chunks(pliego_id: int, chunks: List[dict]):
-    """Guarda chunks de un pliego en ChromaDB con metadata de página y sección."""
+
+def ruta_chroma() -> str:
+    return os.environ.get('CHROMA_PATH', '/app/chroma_data')
+
+
+def _ruta_alias() -> str:
+    return os.path.join(ruta_chroma(), ARCHIVO_COLECCION_ACTIVA)
+
+
+def _leer_coleccion_activa() -> str:
+    try:
+        with open(_ruta_alias(), encoding="utf-8") as f:
+            return json.load(f)[COLECCION_PLIEGOS]
+    except FileNotFoundError:
+        return COLECCION_PLIEGOS
+
+
+def _seguir_coleccion_activa():
+    """Cambia de colección si otro proceso activó una nueva (un stat por llamada)."""
+    global coleccion_pliegos, _alias_mtime
+
+    try:
+        mtime = os.stat(_ruta_alias()).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if coleccion_pliegos is not None and mtime == _alias_mtime:
+        return
+
+    _alias_mtime = mtime
+    nombre = _leer_coleccion_activa()
+    try:
+        # get_collection: get_or_create reescribiría la metadata (y con ella el modelo registrado)
+        coleccion_pliegos = cliente_chroma.get_collection(nombre)
+    except ValueError:
+        coleccion_pliegos = cliente_chroma.get_or_create_collection(
+            name=nombre,
+            metadata=_metadata_pliegos(settings.EMBEDDING_MODELO)
+        )
+
+
+def dimension_modelo(modelo: str) -> int:
+    """Dimensión de los embeddings del modelo (se calcula una vez codificando un texto de prueba)."""
+    if modelo not in _dimensiones:
+        _dimensiones[modelo] = len(codificar(["dimension"], modelo)[0])
+    return _dimensiones[modelo]
+
+
+def _metadata_pliegos(modelo: str) -> dict:
+    return {**METADATA_PLIEGOS, "modelo": modelo, "dimension": dimension_modelo(modelo)}
+
+
+def modelo_coleccion(coleccion) -> str:
+    """Modelo con que se calcularon los vectores de una colección local (las anteriores a registrarlo usan el configurado)."""
+    return (coleccion.metadata or {}).get("modelo") or settings.EMBEDDING_MODELO
+
+
+def modelo_pliegos() -> str:
+    """Modelo de la colección de pliegos activa: el que hay que usar para escribir y consultar en ella."""
     inicializar_servicios()
+    if usa_worker_remoto():
+        return activar_coleccion_remota(None)["modelo"]
+    return modelo_coleccion(coleccion_pliegos)
 
-    textos = [c["texto"] for c in chunks]
-    ids = [f"pliego_{pliego_id}_chunk_{c['id']}" for c in chunks]
-    metadatas = [
-        {
-            "pliego_id": pliego_id,
-            "chunk_id": c["id"],
-            "page": c.get("page", 1),
-            "section": c.get("section", "sin_seccion")
+
+def _verificar_modelo(coleccion, modelo: str = None):
+    """Rechaza una colección de otro modelo que el esperado o con vectores de otra dimensión que la de su modelo."""
+    registrado = modelo_coleccion(coleccion)
+    if modelo and registrado != modelo:
+        raise ValueError(f"La colección {coleccion.name} es del modelo {registrado}, no de {modelo}")
+
+    muestra = coleccion.get(limit=1, include=["embeddings"])
+    if muestra["ids"] and len(muestra["embeddings"][0]) != dimension_modelo(registrado):
+        raise ValueError(
+            f"La colección {coleccion.name} tiene vectores de dimensión {len(muestra['embeddings'][0])} "
+            f"y el modelo {registrado} produce {dimension_modelo(registrado)}"
+        )
+
+
+def _validar_nombre_coleccion(nombre: str):
+    if nombre != COLECCION_PLIEGOS and not NOMBRE_SOMBRA.match(nombre):
+        raise ValueError(f"Nombre de colección no válido: {nombre}")
+
+
+def nombre_coleccion_activa() -> str:
+    """Nombre físico de la colección de pliegos que atiende las consultas."""
+    inicializar_servicios()
+    if usa_worker_remoto():
+        return activar_coleccion_remota(None)["activa"]
+    return coleccion_pliegos.name
+
+
+def obtener_coleccion_pliegos(nombre: str):
+    """
+    Colección de pliegos por nombre físico ("pliegos" o una sombra pliegos_AAAAMMDDHHMMSS).
+
+    Debe existir (ver crear_coleccion_sombra). En modo remoto es un proxy al worker.
+    """
+    _validar_nombre_coleccion(nombre)
+    inicializar_servicios()
+    if usa_worker_remoto():
+        return ColeccionRemota(nombre)
+    return cliente_chroma.get_collection(nombre)
+
+
+def crear_coleccion_sombra(modelo: str = None) -> str:
+    """
+    Crea una colección vacía para reindexar sin tocar la activa y retorna su nombre.
+
+    Args:
+        modelo: Modelo de embeddings con que se llenará (por defecto EMBEDDING_MODELO);
+            queda en la metadata junto con su dimensión
+    """
+    modelo = modelo or settings.EMBEDDING_MODELO
+    inicializar_servicios()
+    if usa_worker_remoto():
+        return crear_coleccion_remota(modelo)
+
+    metadata = _metadata_pliegos(modelo)
+    while True:
+        nombre = f"pliegos_{time.strftime('%Y%m%d%H%M%S')}"
+        # Dos sombras en el mismo segundo (compactar justo después de un reindex) no comparten colección
+        try:
+            cliente_chroma.create_collection(name=nombre, metadata=metadata)
+            return nombre
+        except UniqueConstraintError:
+            time.sleep(1)
+
+
+def sincronizar_coleccion_pliegos(nombre: str, actualizados: List[int], vigentes: List[int]) -> dict:
+    """
+    Pone al día una colección sombra con lo que cambió en la activa mientras se construía.
+
+    Los chunks de los pliegos actualizados se copian de la activa (re-codificados
+    si la sombra es de otro modelo) y se eliminan los de pliegos que ya no existen.
+
+    Args:
+        nombre: Colección sombra
+        actualizados: Pliegos cuyos chunks en la activa son más nuevos que los de la sombra
+        vigentes: Todos los pliegos que deben quedar en la colección
+
+    Returns:
+        Dict con pliegos copiados y chunks eliminados
+    """
+    inicializar_servicios()
+    if usa_worker_remoto():
+        return sincronizar_coleccion_remota(nombre, actualizados, vigentes)
+
+    destino = obtener_coleccion_pliegos(nombre)
+    modelo = modelo_coleccion(destino)
+    recodificar = modelo != modelo_coleccion(coleccion_pliegos)
+
+    for pliego_id in actualizados:
+        existentes = coleccion_pliegos.get(
+            where={"pliego_id": pliego_id},
+            include=["documents", "embeddings", "metadatas"]
+        )
+        embeddings = existentes["embeddings"]
+        if recodificar and existentes["ids"]:
+            embeddings = codificar(existentes["documents"], modelo)
+        reemplazar_chunks_pliego(pliego_id, {
+            "ids": existentes["ids"],
+            "documents": existentes["documents"],
+            "embeddings": embeddings,
+            "metadatas": existentes["metadatas"]
+        }, destino)
+
+    filtro = {"pliego_id": {"$nin": list(vigentes)}} if vigentes else None
+    sobrantes = destino.get(where=filtro, include=[])["ids"]
+    if sobrantes:
+        destino.delete(ids=sobrantes)
+    return {"copiados": len(actualizados), "eliminados": len(sobrantes)}
+
+
+def activar_coleccion_pliegos(
+    nombre: str,
+    modelo: str = None,
+    actualizados: List[int] = None,
+    vigentes: List[int] = None
+) -> str:
+    """
+    Hace de nombre la colección activa reescribiendo el alias de forma atómica.
+
+    Los demás procesos que abren ChromaDB la toman en su siguiente consulta y
+    desde entonces codifican con el modelo registrado en ella.
+
+    Args:
+        nombre: Colección a activar
+        modelo: Modelo con que se construyó; si la colección registra otro, o sus
+            vectores no tienen la dimensión de su modelo, no se activa
+        actualizados, vigentes: Si se pasan, última sincronización con la activa
+            justo antes del swap (ver sincronizar_coleccion_pliegos); en el worker
+            corre con las escrituras detenidas
+
+    Returns:
+        Nombre de la colección que estaba activa
+    """
+    global coleccion_pliegos, _alias_mtime
+    inicializar_servicios()
+
+    if usa_worker_remoto():
+        return activar_coleccion_remota(nombre, modelo, actualizados, vigentes)["anterior"]
+
+    _validar_nombre_coleccion(nombre)
+    # get_collection: activar un nombre que no existe es un error, no una colección vacía
+    nueva = cliente_chroma.get_collection(nombre)
+    _verificar_modelo(nueva, modelo)
+    if vigentes is not None:
+        sincronizar_coleccion_pliegos(nombre, actualizados or [], vigentes)
+    anterior = coleccion_pliegos.name
+
+    temporal = _ruta_alias() + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({COLECCION_PLIEGOS: nombre}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, _ruta_alias())
+
+    coleccion_pliegos = nueva
+    _alias_mtime = os.stat(_ruta_alias()).st_mtime_ns
+    return anterior
+
+
+def eliminar_coleccion_pliegos(nombre: str):
+    """Elimina una colección de pliegos que ya no está activa (la anterior a un swap)."""
+    inicializar_servicios()
+
+    if usa_worker_remoto():
+        eliminar_coleccion_remota(nombre)
+        return
+
+    if nombre == coleccion_pliegos.name:
+        raise ValueError(f"La colección {nombre} está activa")
+    _validar_nombre_coleccion(nombre)
+    cliente_chroma.delete_collection(nombre)
+
+def _codificar_directo(textos: List[str], modelo: str = None) -> List[List[float]]:
+    if usa_worker_remoto():
+        return codificar_remoto(textos, modelo)
+    with medir("embedding_encode"):
+        return obtener_backend(modelo).encode(textos, batch_size=settings.EMBEDDING_BATCH_SIZE).tolist()
+
+
+class CoalescedorEmbeddings:
+    """
+    Agrupa llamadas concurrentes a codificar en un solo lote del modelo.
+
+    Cada llamada deja sus textos en una cola y espera. Un hilo de fondo toma
+    el primer pedido, sigue recogiendo durante max_espera_ms o hasta juntar
+    max_lote textos, codifica todo junto y reparte los vectores a cada llamada.
+    """
+
+    def __init__(self, funcion_codificar, max_espera_ms: float, max_lote: int):
+        self.funcion_codificar = funcion_codificar
+        self.max_espera_ms = max_espera_ms
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._hilo_lock = threading.Lock()
+        self._metricas_lock = threading.Lock()
+        self._metricas = {
+            "lotes": 0,
+            "textos": 0,
+            "pedidos": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0
         }
-        for c in chunks
-    ]
 
-    embeddings = modelo_embeddings.encode(textos).tolist()
+    def _iniciar(self):
+        if self._hilo is None:
+            with self._hilo_lock:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._procesar, name="coalescedor-embeddings", daemon=True)
+                    self._hilo.start()
 
-    coleccion_pliegos.add(
-        documents=textos,
-        embeddings=embeddings,
-        ids=ids,
-        metadatas=metadatas
-    )
+    def codificar(self, textos: List[str]) -> List[List[float]]:
+        self._iniciar()
+        futuro = Future()
+        self._cola.put((textos, futuro, time.perf_counter()))
+        return futuro.result()
+
+    def _procesar(self):
+        while True:
+            pendientes = [self._cola.get()]
+            total = len(pendientes[0][0])
+            limite = time.perf_counter() + self.max_espera_ms / 1000
+
+            while total < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    pendiente = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                pendientes.append(pendiente)
+                total += len(pendiente[0])
+
+            inicio_lote = time.perf_counter()
+            textos = [t for lote, _, _ in pendientes for t in lote]
+            try:
+                vectores = self.funcion_codificar(textos)
+            except Exception as e:
+                for _, futuro, _ in pendientes:
+                    futuro.set_exception(e)
+                continue
+
+            desde = 0
+            for lote, futuro, _ in pendientes:
+                futuro.set_result(vectores[desde:desde + len(lote)])
+                desde += len(lote)
+
+            self._registrar(pendientes, total, inicio_lote)
+
+    def _registrar(self, pendientes: list, total: int, inicio_lote: float):
+        # Latencia agregada: lo que cada pedido esperó en la cola antes de codificarse
+        esperas = [(inicio_lote - encolado) * 1000 for _, _, encolado in pendientes]
+        for espera in esperas:
+            observar("embedding_cola", espera / 1000)
+        with self._metricas_lock:
+            self._metricas["lotes"] += 1
+            self._metricas["textos"] += total
+            self._metricas["pedidos"] += len(pendientes)
+            self._metricas["espera_total_ms"] += sum(esperas)
+            self._metricas["espera_max_ms"] = max(self._metricas["espera_max_ms"], max(esperas))
+
+    def metricas(self) -> dict:
+        with self._metricas_lock:
+            m = dict(self._metricas)
+        lotes = m["lotes"] or 1
+        return {
+            "lotes": m["lotes"],
+            "pedidos": m["pedidos"],
+            "textos": m["textos"],
+            "textos_por_lote": round(m["textos"] / lotes, 2),
+            "ocupacion_lote": round(m["textos"] / (lotes * self.max_lote), 4),
+            "espera_promedio_ms": round(m["espera_total_ms"] / (m["pedidos"] or 1), 3),
+            "espera_max_ms": round(m["espera_max_ms"], 3),
+            "max_espera_ms": self.max_espera_ms,
+            "max_lote": self.max_lote
+        }
+
+
+coalescedor = CoalescedorEmbeddings(
+    _codificar_directo,
+    max_espera_ms=settings.EMBEDDING_COALESCER_ESPERA_MS,
+    max_lote=settings.EMBEDDING_COALESCER_MAX_LOTE
+)
+
+
+def codificar(textos: List[str], modelo: str = None) -> List[List[float]]:
+    """
+    Calcula embeddings normalizados con el backend configurado (EMBEDDING_BACKEND).
+
+    Las llamadas pequeñas (preguntas) pasan por el coalescedor para compartir
+    lote con otras concurrentes; los lotes de ingesta ya llenos van directo.
+    Con otro modelo que EMBEDDING_MODELO (colecciones reindexadas con --modelo)
+    siempre van directo.
+    """
+    if not textos:
+        return []
+    if modelo and modelo != settings.EMBEDDING_MODELO:
+        return _codificar_directo(textos, modelo)
+    if settings.EMBEDDING_COALESCER_ESPERA_MS <= 0 or len(textos) >= coalescedor.max_lote:
+        return _codificar_directo(textos)
+    return coalescedor.codificar(textos)
+
+
+def metricas_coalescedor() -> dict:
+    """Métricas del coalescedor: ocupación de lotes y latencia agregada por la espera."""
+    return coalescedor.metricas()
+
+
+def contar_tokens(textos: List[str]) -> List[int]:
+    """Cuenta tokens con el tokenizer del modelo de embeddings (sin tokens especiales)."""
+    if not textos:
+        return []
+    tokenizer = obtener_tokenizer() if usa_worker_remoto() else obtener_backend().tokenizer
+    codificado = tokenizer(textos, add_special_tokens=False, verbose=False)
+    return [len(ids) for ids in codificado["input_ids"]]
+
+
+def max_tokens_embedding() -> int:
+    """Tokens de texto que caben en una entrada del modelo antes de truncarse."""
+    if usa_worker_remoto():
+        return settings.EMBEDDING_MAX_TOKENS - 2
+    return obtener_backend().max_seq_length - 2
+
+
+def hash_chunk(texto: str) -> str:
+    """Hash corto del contenido de un chunk, usado para detectar cambios entre versiones."""
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _metadata_chunk(pliego_id: int, chunk: dict) -> dict:
+    return {
+        "pliego_id": pliego_id,
+        "chunk_id": chunk["id"],
+        "page": chunk.get("page", 1),
+        "section": chunk.get("section", "sin_seccion"),
+        "tipo": chunk.get("tipo", "texto"),
+        "extraccion": chunk.get("extraccion", "texto"),
+        "hash": hash_chunk(chunk["texto"])
+    }
 
-def buscar_chunks_relevantes(pregunta: str, pliego_id: int, n_resultados: int = 5) -> List[dict]:
-    """Busca chunks relevantes para una pregunta, retornando texto y metadata."""
+
+def _id_chunk(pliego_id: int, hash_texto: str, usados: set) -> str:
+    """Genera un ID estable por contenido; los textos repetidos llevan sufijo."""
+    ocurrencia = 0
+    while f"pliego_{pliego_id}_{hash_texto}_{ocurrencia}" in usados:
+        ocurrencia += 1
+    id_chunk = f"pliego_{pliego_id}_{hash_texto}_{ocurrencia}"
+    usados.add(id_chunk)
+    return id_chunk
+
+
+def preparar_chunks(pliego_id: int, chunks: List[dict], usados: set = None, modelo: str = None) -> dict:
+    """
+    Calcula IDs, metadata y embeddings de los chunks sin escribirlos en ChromaDB.
+
+    Permite repartir el cálculo entre procesos y dejar la escritura en uno solo.
+    modelo debe ser el de la colección destino (ver modelo_pliegos).
+
+    Returns:
+        Dict con ids, documents, embeddings y metadatas (argumentos de add/upsert)
+    """
+    usados = set() if usados is None else usados
+    textos = [c["texto"] for c in chunks]
+    metadatas = [_metadata_chunk(pliego_id, c) for c in chunks]
+    return {
+        "ids": [_id_chunk(pliego_id, m["hash"], usados) for m in metadatas],
+        "documents": textos,
+        "embeddings": codificar(textos, modelo),
+        "metadatas": metadatas
+    }
+
+
+def _agregar_chunks(pliego_id: int, chunks: List[dict], usados: set):
+    if not chunks:
+        return
+
+    preparados = preparar_chunks(pliego_id, chunks, usados, modelo_pliegos())
+
+    with medir("chroma_add"):
+        coleccion_pliegos.add(**preparados)
+
+
+def reemplazar_chunks_pliego(pliego_id: int, preparados: dict, coleccion=None) -> int:
+    """
+    Reemplaza los chunks de un pliego por los ya preparados (ver preparar_chunks).
+
+    Primero se escriben los nuevos (upsert) y después se borran los que
+    sobran, así el pliego nunca queda sin chunks en la colección.
+
+    Args:
+        pliego_id: ID del pliego
+        preparados: Resultado de preparar_chunks
+        coleccion: Colección destino (por defecto la activa)
+
+    Returns:
+        Número de chunks viejos eliminados
+    """
     inicializar_servicios()
+    coleccion = coleccion or coleccion_pliegos
 
-    embedding_pregunta = modelo_embeddings.encode([pregunta]).tolist()
+    if preparados["ids"]:
+        with medir("chroma_add"):
+            coleccion.upsert(**preparados)
 
-    resultados = coleccion_pliegos.query(
-        query_embeddings=embedding_pregunta,
-        n_results=n_resultados,
-        where={"pliego_id": pliego_id}
+    existentes = coleccion.get(where={"pliego_id": pliego_id}, include=[])
+    nuevos = set(preparados["ids"])
+    sobrantes = [i for i in existentes["ids"] if i not in nuevos]
+    if sobrantes:
+        coleccion.delete(ids=sobrantes)
+    return len(sobrantes)
+
+
+def guardar_chunks(pliego_id: int, chunks: List[dict]):
+    """Guarda chunks de un pliego en ChromaDB con metadata de página, sección y hash."""
+    inicializar_servicios()
+    _agregar_chunks(pliego_id, chunks, set())
+
+
+def actualizar_chunks_pliego(pliego_id: int, chunks: List[dict]) -> dict:
+    """
+    Sincroniza los chunks de un pliego con una nueva versión de su texto.
+
+    Compara por hash de contenido: solo se calculan embeddings de los chunks
+    nuevos, se borran los que ya no existen y a los que se conservan solo se
+    les actualiza la metadata (página, sección, posición).
+
+    Como en reemplazar_chunks_pliego, primero se agregan los nuevos y solo
+    después se tocan los existentes: si falla el cálculo de embeddings el
+    pliego conserva sus chunks anteriores.
+
+    Returns:
+        Dict con chunks nuevos, eliminados y conservados (los dos primeros con metadata)
+    """
+    inicializar_servicios()
+
+    existentes = coleccion_pliegos.get(
+        where={"pliego_id": pliego_id},
+        include=["metadatas"]
     )
 
+    ids_por_hash = {}
+    metadata_por_id = {}
+    for id_chunk, metadata in zip(existentes["ids"], existentes["metadatas"]):
+        metadata_por_id[id_chunk] = metadata
+        # Los chunks indexados antes de existir el hash siempre se re-generan
+        if metadata.get("hash"):
+            ids_por_hash.setdefault(metadata["hash"], []).append(id_chunk)
+
+    nuevos = []
+    conservados_ids = []
+    conservados_metadata = []
+    for chunk in chunks:
+        metadata = _metadata_chunk(pliego_id, chunk)
+        candidatos = ids_por_hash.get(metadata["hash"])
+        if candidatos:
+            conservados_ids.append(candidatos.pop(0))
+            conservados_metadata.append(metadata)
+        else:
+            nuevos.append(chunk)
+
+    conservados = set(conservados_ids)
+    eliminados_ids = [i for i in existentes["ids"] if i not in conservados]
+
+    # Los IDs de los que se van a borrar siguen ocupados hasta el final
+    _agregar_chunks(pliego_id, nuevos, set(existentes["ids"]))
+    if conservados_ids:
+        coleccion_pliegos.update(ids=conservados_ids, metadatas=conservados_metadata)
+    if eliminados_ids:
+        coleccion_pliegos.delete(ids=eliminados_ids)
+
+    return {
+        "nuevos": [_metadata_chunk(pliego_id, c) for c in nuevos],
+        "eliminados": [metadata_por_id[i] for i in eliminados_ids],
+        "conservados": len(conservados_ids)
+    }
+
+
+def embedding_consulta(coleccion, pregunta: str, embedding: List[float] = None) -> List[float]:
+    """
+    Embedding de la pregunta con el modelo de la colección.
+
+    El ya calculado con EMBEDDING_MODELO se reutiliza si la colección es de ese
+    modelo; tras un reindex con otro modelo la pregunta se codifica de nuevo.
+    """
+    modelo = modelo_coleccion(coleccion)
+    if embedding is not None and modelo == settings.EMBEDDING_MODELO:
+        return embedding
+    return codificar([pregunta], modelo)[0]
+
+
+def _argumentos_consulta(pregunta: str, embedding: List[float] = None) -> dict:
+    if usa_worker_remoto():
+        # El worker conoce el modelo de la colección activa y resuelve el embedding (ver embedding_worker)
+        argumentos = {"texto_consulta": pregunta}
+        if embedding is not None:
+            argumentos["query_embeddings"] = [embedding]
+        return argumentos
+    return {"query_embeddings": [embedding_consulta(coleccion_pliegos, pregunta, embedding)]}
+
+
+def buscar_chunks_relevantes(
+    pregunta: str,
+    pliego_id: int,
+    n_resultados: int = 5,
+    tipo: str = None,
+    embedding: List[float] = None
+) -> List[dict]:
+    """Busca chunks relevantes para una pregunta, retornando texto y metadata.
+
+    Con tipo ("texto" o "tabla") se limita la búsqueda a ese tipo de chunk.
+    Si ya se calculó el embedding de la pregunta se puede pasar en embedding.
+    """
+    inicializar_servicios()
+
+    filtro = {"pliego_id": pliego_id}
+    if tipo:
+        filtro = {"$and": [{"pliego_id": pliego_id}, {"tipo": tipo}]}
+
+    with medir("chroma_query"):
+        resultados = coleccion_pliegos.query(
+            **_argumentos_consulta(pregunta, embedding),
+            n_results=n_resultados,
+            where=filtro
+        )
+
     if not resultados["documents"] or not resultados["documents"][0]:
         return []
 
@@ -78,23 +676,167 @@ def buscar_chunks_relevantes(pregunta: str, pliego_id: int, n_resultados: int =
         chunks_con_metadata.append({
             "texto": texto,
             "page": metadata.get("page", 1),
-            "section": metadata.get("section", "sin_seccion")
+            "section": metadata.get("section", "sin_seccion"),
+            "tipo": metadata.get("tipo", "texto")
         })
 
     return chunks_con_metadata
 
-def buscar_normativa(pregunta: str, n_resultados: int = 3) -> List[str]:
-    """Busca normativa relevante para una pregunta."""
+def buscar_chunks_corpus(
+    pregunta: str,
+    n_resultados: int,
+    pliego_ids: List[int] = None,
+    section: str = None,
+    tipo: str = None,
+    contiene: str = None,
+    embedding: List[float] = None
+) -> List[dict]:
+    """
+    Busca chunks en todos los pliegos, con filtros de metadata opcionales.
+
+    Args:
+        pregunta: Texto de la consulta
+        n_resultados: Chunks candidatos a recuperar
+        pliego_ids: Limita la búsqueda a estos pliegos (filtro $in)
+        section: Sección del chunk (ver detectar_seccion)
+        tipo: "texto" o "tabla"
+        contiene: Texto literal que debe aparecer en el chunk (ej. "ISO 9001", un código UNSPSC)
+        embedding: Embedding ya calculado de la pregunta
+
+    Returns:
+        Lista de dicts con pliego_id, texto, page, section, tipo y score (similitud coseno)
+    """
     inicializar_servicios()
-    
-    embedding_pregunta = modelo_embeddings.encode([pregunta]).tolist()
-    
-    resultados = coleccion_normativa.query(
-        query_embeddings=embedding_pregunta,
-        n_results=n_resultados
-    )
-    
-    return resultados["documents"][0] if resultados["documents"] else []
+
+    if pliego_ids is not None and not pliego_ids:
+        return []
+
+    condiciones = []
+    if pliego_ids is not None:
+        condiciones.append({"pliego_id": {"$in": list(pliego_ids)}})
+    if section:
+        condiciones.append({"section": section})
+    if tipo:
+        condiciones.append({"tipo": tipo})
+
+    consulta = {
+        **_argumentos_consulta(pregunta, embedding),
+        "n_results": n_resultados,
+        "include": ["documents", "metadatas", "distances"]
+    }
+    if len(condiciones) == 1:
+        consulta["where"] = condiciones[0]
+    elif condiciones:
+        consulta["where"] = {"$and": condiciones}
+    if contiene:
+        consulta["where_document"] = {"$contains": contiene}
+
+    with medir("chroma_query"):
+        resultados = coleccion_pliegos.query(**consulta)
+    if not resultados["documents"] or not resultados["documents"][0]:
+        return []
+
+    chunks = []
+    for texto, metadata, distancia in zip(
+        resultados["documents"][0], resultados["metadatas"][0], resultados["distances"][0]
+    ):
+        chunks.append({
+            "pliego_id": metadata.get("pliego_id"),
+            "texto": texto,
+            "page": metadata.get("page", 1),
+            "section": metadata.get("section", "sin_seccion"),
+            "tipo": metadata.get("tipo", "texto"),
+            # Distancia L2 entre vectores normalizados -> coseno
+            "score": round(1 - distancia / 2, 4)
+        })
+    return chunks
+
+
+def _normativa_vacia() -> bool:
+    """
+    Indica si la colección de normativa está vacía.
+
+    El conteo se cachea unos minutos: la carga se hace desde otro proceso
+    (python -m app.cli normativa) y no vale la pena consultarlo en cada pregunta.
+    """
+    global _normativa_conteo, _normativa_conteo_ts
+
+    if _normativa_conteo is None or time.time() - _normativa_conteo_ts > settings.NORMATIVA_CONTEO_TTL_S:
+        _normativa_conteo = coleccion_normativa.count()
+        _normativa_conteo_ts = time.time()
+
+    return _normativa_conteo == 0
+
+
+def buscar_normativa(pregunta: str, n_resultados: int = 3, embedding: List[float] = None) -> List[str]:
+    """Busca normativa relevante para una pregunta.
+
+    Si la colección está vacía no se calcula el embedding ni se consulta
+    ChromaDB. Las consultas recientes se sirven desde una caché en memoria
+    que expira a los NORMATIVA_CACHE_TTL_S: guardar_normativa solo puede
+    vaciar la del proceso que carga, no la de los workers de la API.
+    """
+    inicializar_servicios()
+
+    if _normativa_vacia():
+        return []
+
+    clave = (" ".join(pregunta.lower().split()), n_resultados)
+    with _cache_normativa_lock:
+        if clave in _cache_normativa:
+            guardado_ts, articulos = _cache_normativa[clave]
+            if time.time() - guardado_ts <= settings.NORMATIVA_CACHE_TTL_S:
+                _cache_normativa.move_to_end(clave)
+                return articulos
+            del _cache_normativa[clave]
+
+    embedding_pregunta = [embedding] if embedding is not None else codificar([pregunta])
+
+    with medir("chroma_query"):
+        resultados = coleccion_normativa.query(
+            query_embeddings=embedding_pregunta,
+            n_results=n_resultados
+        )
+
+    articulos = resultados["documents"][0] if resultados["documents"] else []
+
+    with _cache_normativa_lock:
+        _cache_normativa[clave] = (time.time(), articulos)
+        while len(_cache_normativa) > settings.NORMATIVA_CACHE_MAX:
+            _cache_normativa.popitem(last=False)
+
+    return articulos
+
+
+def guardar_normativa(articulos: List[dict], tamano_lote: int = 64) -> int:
+    """
+    Guarda artículos de normativa en ChromaDB calculando embeddings por lotes.
+
+    Usa upsert, así que volver a cargar la misma norma la actualiza en vez de duplicarla.
+
+    Returns:
+        Número de artículos guardados
+    """
+    global _normativa_conteo
+    inicializar_servicios()
+
+    for inicio in range(0, len(articulos), tamano_lote):
+        lote = articulos[inicio:inicio + tamano_lote]
+        textos = [a["texto"] for a in lote]
+        embeddings = codificar(textos)
+
+        coleccion_normativa.upsert(
+            ids=[a["id"] for a in lote],
+            documents=textos,
+            embeddings=embeddings,
+            metadatas=[{"norma": a["norma"], "articulo": a["articulo"]} for a in lote]
+        )
+
+    _normativa_conteo = None
+    with _cache_normativa_lock:
+        _cache_normativa.clear()
+
+    return len(articulos)
 
 def eliminar_chunks_pliego(pliego_id: int):
     """Elimina todos los chunks de un pliego."""
@@ -103,3 +845,59 @@ def eliminar_chunks_pliego(pliego_id: int):
     coleccion_pliegos.delete(
         where={"pliego_id": pliego_id}
     )
+
+def reasignar_chunks_pliego(origen_id: int, destino_id: int):
+    """Pasa los chunks de un pliego a otro sin recalcular embeddings."""
+    inicializar_servicios()
+
+    existentes = coleccion_pliegos.get(
+        where={"pliego_id": origen_id},
+        include=["metadatas"]
+    )
+    if not existentes["ids"]:
+        return
+
+    metadatas = [{**m, "pliego_id": destino_id} for m in existentes["metadatas"]]
+    coleccion_pliegos.update(ids=existentes["ids"], metadatas=metadatas)
+
+
+def copiar_chunks_pliego(origen_id: int, destino_id: int):
+    """Copia los chunks (con sus embeddings) de un pliego a otro sin recalcularlos."""
+    inicializar_servicios()
+
+    existentes = coleccion_pliegos.get(
+        where={"pliego_id": origen_id},
+        include=["documents", "embeddings", "metadatas"]
+    )
+    if not existentes["ids"]:
+        return
+
+    coleccion_pliegos.add(
+        ids=[f"pliego_{destino_id}_" + i.split("_", 2)[2] for i in existentes["ids"]],
+        documents=existentes["documents"],
+        embeddings=existentes["embeddings"],
+        metadatas=[{**m, "pliego_id": destino_id} for m in existentes["metadatas"]]
+    )
+
+
+def copiar_chunks_a_coleccion(pliego_id: int, destino) -> int:
+    """
+    Copia los chunks (con sus embeddings) de un pliego de la colección activa a otra.
+
+    Returns:
+        Número de chunks copiados
+    """
+    inicializar_servicios()
+
+    existentes = coleccion_pliegos.get(
+        where={"pliego_id": pliego_id},
+        include=["documents", "embeddings", "metadatas"]
+    )
+    if existentes["ids"]:
+        destino.upsert(
+            ids=existentes["ids"],
+            documents=existentes["documents"],
+            embeddings=existentes["embeddings"],
+            metadatas=existentes["metadatas"]
+        )
+    return len(existentes["ids"])
@@ -0,0 +1,173 @@
+from typing import List, Optional
+import json
+import re
+
+from app.services.prompts import CAMPOS_FICHA
+
+# Campos de la ficha que se extraen con patrones (el resto solo los da el LLM)
+CAMPOS_PATRON = ("numero_proceso", "entidad", "objeto", "presupuesto", "fecha_cierre")
+
+# Campos de patrón que además son columnas del pliego, con su largo máximo
+COLUMNAS_PATRON = {"numero_proceso": 100, "entidad": 255, "objeto": None}
+
+# Páginas iniciales donde suelen estar número, entidad y objeto (portada y encabezados)
+PAGINAS_PORTADA = 2
+CARACTERES_PORTADA = 5000
+
+MESES = "enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre"
+
+# "No. DJC-SA-08.02-095-2023.", "Proceso No. LP-001-2024", "Número: SAMC 012 de 2023"
+PATRON_NUMERO_PROCESO = re.compile(
+    r'(?:\bNo\.?|\bN[°º]\.?|\bN[uú]mero|\bPROCESO(?:\s+No\.?)?)\s*:?\s*'
+    r'([A-Z]{1,10}[\-\s]?[A-Z0-9][A-Z0-9\-\.\/ ]{2,40}?\d{2,4})\.?\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+PATRON_ENTIDAD_ETIQUETA = re.compile(
+    r'^\s*ENTIDAD(?:\s+(?:ESTATAL|CONTRATANTE))?\s*:\s*(.{5,200})$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Palabras con que empieza el nombre de una entidad pública en la portada
+PATRON_ENTIDAD_PORTADA = re.compile(
+    r'^\s*((?:INSTITUCI[OÓ]N|UNIVERSIDAD|ALCALD[IÍ]A|GOBERNACI[OÓ]N|MINISTERIO|SECRETAR[IÍ]A|'
+    r'INSTITUTO|HOSPITAL|EMPRESA|E\.S\.E|AGENCIA|DEPARTAMENTO|MUNICIPIO|DISTRITO|FONDO|'
+    r'SUPERINTENDENCIA|CORPORACI[OÓ]N|UNIDAD|SERVICIO NACIONAL|REGISTRADUR[IÍ]A|CONTRALOR[IÍ]A|'
+    r'PERSONER[IÍ]A|FISCAL[IÍ]A|CONCEJO|ASAMBLEA|POLIC[IÍ]A|EJ[EÉ]RCITO|ARMADA|FUERZA A[EÉ]REA)'
+    r'\b[^\n]{3,200})$',
+    re.MULTILINE
+)
+
+PATRON_OBJETO = re.compile(r'\bOBJETO\b[^:\n]{0,150}:\s*', re.IGNORECASE)
+
+PATRON_PRESUPUESTO = re.compile(
+    r'(?:PRESUPUESTO\s+OFICIAL|VALOR\s+ESTIMADO|PRESUPUESTO\s+ESTIMADO)[\s\S]{0,600}?'
+    r'(\$\s?\d{1,3}(?:[\.,]\d{3})+(?:,\d{1,2})?)',
+    re.IGNORECASE
+)
+
+PATRON_FECHA_CIERRE = re.compile(
+    r'\bCIERRE\b[\s\S]{0,150}?'
+    rf'(\d{{1,2}}\s+de\s+(?:{MESES})(?:\s+de)?\s+\d{{4}}|\d{{1,2}}/\d{{1,2}}/\d{{4}})',
+    re.IGNORECASE
+)
+
+
+def _limpiar(texto: str) -> str:
+    return " ".join(texto.split()).strip(" .;:-")
+
+
+def _numero_proceso(portada: str) -> Optional[str]:
+    for match in PATRON_NUMERO_PROCESO.finditer(portada):
+        candidato = _limpiar(match.group(1))
+        # Un código de proceso mezcla letras y dígitos (descarta "No. 15380")
+        if re.search(r'[A-Za-z]', candidato) and re.search(r'\d', candidato):
+            return candidato
+    return None
+
+
+def _entidad(portada: str, texto: str) -> Optional[str]:
+    match = PATRON_ENTIDAD_ETIQUETA.search(texto[:CARACTERES_PORTADA * 4])
+    if match:
+        return _limpiar(match.group(1))
+
+    for match in PATRON_ENTIDAD_PORTADA.finditer(portada):
+        linea = match.group(1)
+        # En mayúsculas y sin ser parte del título del proceso
+        if linea.upper() == linea and "PLIEGO" not in linea and "PROCESO" not in linea:
+            return _limpiar(linea)
+    return None
+
+
+def _objeto(texto: str) -> Optional[str]:
+    match = PATRON_OBJETO.search(texto)
+    if not match:
+        return None
+
+    resto = texto[match.end():match.end() + 1500]
+    if resto[:1] in "“\"":
+        cierre = re.search(r'[”"]', resto[1:])
+        objeto = resto[1:cierre.start() + 1] if cierre else resto
+    else:
+        # Sin comillas: hasta el primer punto seguido de salto de línea o línea vacía
+        fin = re.search(r'\.\s*\n|\n\s*\n', resto)
+        objeto = resto[:fin.start()] if fin else resto[:600]
+
+    objeto = _limpiar(objeto)
+    return objeto if len(objeto) >= 10 else None
+
+
+def _primer_grupo(patron: re.Pattern, texto: str) -> Optional[str]:
+    match = patron.search(texto)
+    return _limpiar(match.group(1)) if match else None
+
+
+def _extraer(portada: str, texto: str) -> dict:
+    campos = {
+        "numero_proceso": _numero_proceso(portada),
+        "entidad": _entidad(portada, texto),
+        "objeto": _objeto(portada) or _objeto(texto[:CARACTERES_PORTADA * 4]),
+        "presupuesto": _primer_grupo(PATRON_PRESUPUESTO, texto),
+        "fecha_cierre": _primer_grupo(PATRON_FECHA_CIERRE, texto),
+    }
+    return {campo: valor for campo, valor in campos.items() if valor}
+
+
+def extraer_campos(paginas: List[dict]) -> dict:
+    """
+    Extrae campos de la ficha con patrones fijos, sin LLM.
+
+    Número, entidad y objeto se buscan en la portada (primeras páginas);
+    presupuesto y fecha de cierre en todo el texto, junto a su rótulo.
+
+    Args:
+        paginas: Lista de dicts con numero y texto (como extraer_texto_pdf)
+
+    Returns:
+        Dict solo con los campos encontrados (numero_proceso, entidad, objeto,
+        presupuesto, fecha_cierre)
+    """
+    portada = "\n".join(p.get("texto", "") for p in paginas[:PAGINAS_PORTADA])
+    texto = "\n".join(p.get("texto", "") for p in paginas)
+    return _extraer(portada, texto)
+
+
+def extraer_campos_texto(texto: str) -> dict:
+    """Igual que extraer_campos cuando solo se tiene el texto completo del pliego."""
+    return _extraer(texto[:CARACTERES_PORTADA], texto)
+
+
+def tiene_resumen_llm(ficha) -> bool:
+    """Indica si la ficha ya pasó por el LLM (generar_resumen deja todos los campos, aunque sea en null)."""
+    if isinstance(ficha, str):
+        ficha = json.loads(ficha)
+    return bool(ficha) and all(campo in ficha for campo in CAMPOS_FICHA)
+
+
+def aplicar_campos(pliego, campos: dict, reemplazar: bool = False):
+    """
+    Copia los campos extraídos a las columnas del pliego y a su ficha.
+
+    Args:
+        pliego: Pliego a actualizar
+        campos: Campos devueltos por extraer_campos
+        reemplazar: Quitar antes de la ficha y de las columnas los campos de
+            patrón anteriores (nueva versión del documento: lo que ya no
+            aparece no debe quedar)
+    """
+    for columna, largo in COLUMNAS_PATRON.items():
+        valor = campos.get(columna)
+        if valor:
+            setattr(pliego, columna, valor[:largo] if largo else valor)
+        elif reemplazar:
+            setattr(pliego, columna, None)
+
+    ficha = pliego.datos_extraidos or {}
+    if isinstance(ficha, str):
+        ficha = json.loads(ficha)
+    ficha = dict(ficha)
+    if reemplazar:
+        for campo in CAMPOS_PATRON:
+            ficha.pop(campo, None)
+    ficha.update(campos)
+    pliego.datos_extraidos = ficha
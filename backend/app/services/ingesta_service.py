@@ -0,0 +1,363 @@
+import hashlib
+import json
+import logging
+import os
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.metricas import medir
+from app.models import Pliego
+from app.services.pdf_service import extraer_texto_pdf, texto_pagina
+from app.services.chunk_service import dividir_por_paginas
+from app.services.extraccion_service import aplicar_campos, extraer_campos, tiene_resumen_llm
+from app.services.embedding_service import (
+    guardar_chunks,
+    actualizar_chunks_pliego,
+    copiar_chunks_pliego,
+    eliminar_chunks_pliego,
+    reasignar_chunks_pliego
+)
+
+logger = logging.getLogger(__name__)
+
+# Secciones cuyo cambio puede alterar el checklist de documentos
+SECCIONES_CHECKLIST = {
+    "requisitos_habilitantes",
+    "requisitos_tecnicos",
+    "experiencia",
+    "garantias",
+}
+
+# El resumen se genera con los primeros caracteres del pliego (ver generar_resumen)
+CARACTERES_RESUMEN = 10000
+
+# Columnas que los duplicados no copian: se leen del original (ver Pliego.fuente)
+CAMPOS_COMPARTIDOS = (
+    "texto_completo",
+    "datos_extraidos",
+    "checklist_documentos",
+    "hashes_paginas",
+    "derivados_obsoletos",
+)
+
+
+def generar_chunks(resultado: dict) -> List[dict]:
+    paginas = resultado.get("paginas") or [{"numero": 1, "texto": resultado["texto_completo"]}]
+    with medir("chunking"):
+        return dividir_por_paginas(paginas)
+
+
+def calcular_hashes_paginas(paginas: List[dict]) -> dict:
+    return {
+        str(p["numero"]): hashlib.sha1(texto_pagina(p).encode("utf-8")).hexdigest()[:16]
+        for p in paginas
+    }
+
+
+def procesar_pliego(db: Session, pliego: Pliego):
+    """Extrae texto, genera chunks y actualiza el estado del pliego."""
+    with medir("pdf_extraccion"):
+        resultado = extraer_texto_pdf(pliego.ruta_archivo)
+
+    if resultado["error"]:
+        pliego.estado = "error"
+        pliego.error_mensaje = resultado["error"]
+    else:
+        pliego.texto_completo = resultado["texto_completo"]
+        pliego.num_paginas = resultado["num_paginas"]
+        pliego.hashes_paginas = calcular_hashes_paginas(resultado["paginas"])
+        aplicar_campos(pliego, extraer_campos(resultado["paginas"]))
+
+        # Generar chunks y guardar en ChromaDB
+        try:
+            chunks = generar_chunks(resultado)
+            guardar_chunks(pliego.id, chunks)
+            pliego.texto_tokens = len(resultado["texto_completo"].split())
+            pliego.estado = "listo"
+        except Exception as e:
+            pliego.estado = "error"
+            pliego.error_mensaje = f"Error al generar chunks: {str(e)}"
+            _eliminar_chunks_parciales(pliego.id)
+
+    db.commit()
+    db.refresh(pliego)
+
+
+def _eliminar_chunks_parciales(pliego_id: int):
+    """Quita lo que alcanzó a escribirse de un pliego cuya ingesta falló."""
+    try:
+        eliminar_chunks_pliego(pliego_id)
+    except Exception as e:
+        logger.warning("No se pudieron eliminar los chunks parciales del pliego %d: %s", pliego_id, e)
+
+
+def buscar_pliego_original(db: Session, hash_contenido: str) -> Optional[Pliego]:
+    """Busca un pliego ya procesado con el mismo contenido (no duplicado)."""
+    return (
+        db.query(Pliego)
+        .filter(
+            Pliego.hash_contenido == hash_contenido,
+            Pliego.pliego_origen_id.is_(None),
+            Pliego.estado == "listo"
+        )
+        .order_by(Pliego.id)
+        .first()
+    )
+
+
+def registrar_duplicado(db: Session, original: Pliego, nombre_archivo: str) -> Pliego:
+    """
+    Crea un pliego que reutiliza archivo, texto, chunks y vectores del original.
+
+    Solo se copian las columnas cortas de la fila: el PDF, los embeddings y
+    las columnas de CAMPOS_COMPARTIDOS (texto, ficha, checklist) quedan en el
+    original, que lleva la cuenta de referencias.
+    """
+    duplicado = Pliego(
+        numero_proceso=original.numero_proceso,
+        entidad=original.entidad,
+        objeto=original.objeto,
+        nombre_archivo=nombre_archivo,
+        ruta_archivo=original.ruta_archivo,
+        tamano_bytes=original.tamano_bytes,
+        hash_contenido=original.hash_contenido,
+        pliego_origen_id=original.id,
+        num_paginas=original.num_paginas,
+        texto_tokens=original.texto_tokens,
+        estado="listo"
+    )
+    original.num_referencias = (original.num_referencias or 1) + 1
+
+    db.add(duplicado)
+    db.commit()
+    db.refresh(duplicado)
+
+    return duplicado
+
+
+def _copiar_compartidos(origen: Pliego, destino: Pliego):
+    """Da al destino su propia copia de texto, ficha y derivados del origen."""
+    for campo in CAMPOS_COMPARTIDOS:
+        setattr(destino, campo, getattr(origen, campo))
+
+
+def liberar_pliego(db: Session, pliego: Pliego):
+    """
+    Elimina un pliego respetando las referencias compartidas.
+
+    - Duplicado: solo se borra la fila y se descuenta la referencia del original.
+    - Original con duplicados: el duplicado más antiguo hereda archivo, chunks,
+      texto, ficha y derivados.
+    - Original sin duplicados: se borran archivo, chunks y fila.
+    """
+    if pliego.pliego_origen_id:
+        original = pliego.origen
+        if original:
+            original.num_referencias = max((original.num_referencias or 1) - 1, 1)
+        db.delete(pliego)
+        db.commit()
+        return
+
+    duplicados = (
+        db.query(Pliego)
+        .filter(Pliego.pliego_origen_id == pliego.id)
+        .order_by(Pliego.id)
+        .all()
+    )
+
+    if duplicados:
+        heredero = duplicados[0]
+        reasignar_chunks_pliego(pliego.id, heredero.id)
+        _copiar_compartidos(pliego, heredero)
+
+        heredero.pliego_origen_id = None
+        heredero.num_referencias = len(duplicados)
+        for duplicado in duplicados[1:]:
+            duplicado.pliego_origen_id = heredero.id
+        db.flush()
+
+        db.delete(pliego)
+        db.commit()
+        return
+
+    # Eliminar archivo físico
+    if os.path.exists(pliego.ruta_archivo):
+        os.remove(pliego.ruta_archivo)
+
+    # Eliminar chunks de ChromaDB
+    try:
+        eliminar_chunks_pliego(pliego.id)
+    except Exception as e:
+        # La fila se borra igual: los vectores que queden los elimina python -m app.cli reconciliar
+        logger.warning("No se pudieron eliminar los chunks del pliego %d: %s", pliego.id, e)
+
+    # Eliminar de BD
+    db.delete(pliego)
+    db.commit()
+
+
+def independizar_pliego(db: Session, pliego: Pliego) -> bool:
+    """
+    Deja al pliego como único dueño de sus chunks antes de modificarlos.
+
+    - Duplicado: copia los chunks del original bajo su propio ID.
+    - Original con duplicados: el duplicado más antiguo recibe una copia de los
+      chunks y pasa a ser el original de los demás.
+
+    Los embeddings se copian, no se recalculan. Junto con los chunks se copian
+    texto, ficha y derivados (CAMPOS_COMPARTIDOS).
+
+    Returns:
+        True si el archivo actual sigue siendo usado por otro pliego
+    """
+    if pliego.pliego_origen_id:
+        original = pliego.origen
+        copiar_chunks_pliego(pliego.pliego_origen_id, pliego.id)
+        if original:
+            _copiar_compartidos(original, pliego)
+            original.num_referencias = max((original.num_referencias or 1) - 1, 1)
+        pliego.pliego_origen_id = None
+        pliego.num_referencias = 1
+        db.flush()
+        return True
+
+    duplicados = (
+        db.query(Pliego)
+        .filter(Pliego.pliego_origen_id == pliego.id)
+        .order_by(Pliego.id)
+        .all()
+    )
+    if not duplicados:
+        return False
+
+    heredero = duplicados[0]
+    copiar_chunks_pliego(pliego.id, heredero.id)
+    _copiar_compartidos(pliego, heredero)
+    heredero.pliego_origen_id = None
+    heredero.num_referencias = len(duplicados)
+    for duplicado in duplicados[1:]:
+        duplicado.pliego_origen_id = heredero.id
+    pliego.num_referencias = 1
+    db.flush()
+    return True
+
+
+def procesar_nueva_version(
+    db: Session,
+    pliego: Pliego,
+    ruta_archivo: str,
+    hash_contenido: str,
+    tamano_bytes: int
+) -> dict:
+    """
+    Re-ingesta incremental de una nueva versión (adenda) de un pliego.
+
+    Compara hashes de páginas y chunks con la versión anterior: solo se
+    calculan embeddings de los chunks que cambiaron, se eliminan de ChromaDB
+    los que desaparecieron y se marcan como obsoletos únicamente los
+    resultados derivados (resumen, checklist) afectados por el cambio.
+
+    Returns:
+        Dict con estadísticas del diff, páginas modificadas, derivados obsoletos y error
+    """
+    resultado = {
+        "chunks_nuevos": 0,
+        "chunks_eliminados": 0,
+        "chunks_conservados": 0,
+        "paginas_modificadas": [],
+        "derivados_obsoletos": [],
+        "error": None
+    }
+
+    with medir("pdf_extraccion"):
+        extraccion = extraer_texto_pdf(ruta_archivo)
+    if extraccion["error"]:
+        resultado["error"] = extraccion["error"]
+        return resultado
+
+    archivo_compartido = independizar_pliego(db, pliego)
+
+    try:
+        diff = actualizar_chunks_pliego(pliego.id, generar_chunks(extraccion))
+    except Exception as e:
+        db.commit()
+        resultado["error"] = f"Error al actualizar chunks: {str(e)}"
+        return resultado
+
+    # Páginas cuyo contenido no existía en la versión anterior
+    hashes_nuevos = calcular_hashes_paginas(extraccion["paginas"])
+    hashes_anteriores = set((pliego.hashes_paginas or {}).values())
+    paginas_modificadas = sorted(
+        int(numero) for numero, h in hashes_nuevos.items() if h not in hashes_anteriores
+    )
+
+    # Marcar solo los derivados afectados
+    obsoletos = set(pliego.derivados_obsoletos or [])
+    texto_anterior = pliego.texto_completo or ""
+    resumen_llm = tiene_resumen_llm(pliego.datos_extraidos)
+    if resumen_llm and (
+        texto_anterior[:CARACTERES_RESUMEN] != extraccion["texto_completo"][:CARACTERES_RESUMEN]
+    ):
+        obsoletos.add("resumen")
+
+    if pliego.checklist_documentos and _checklist_afectado(pliego.checklist_documentos, diff, paginas_modificadas):
+        obsoletos.add("checklist")
+
+    # Reemplazar archivo si ya no lo usa nadie más
+    ruta_anterior = pliego.ruta_archivo
+    if not archivo_compartido and ruta_anterior != ruta_archivo and os.path.exists(ruta_anterior):
+        os.remove(ruta_anterior)
+
+    pliego.ruta_archivo = ruta_archivo
+    pliego.hash_contenido = hash_contenido
+    pliego.tamano_bytes = tamano_bytes
+    pliego.texto_completo = extraccion["texto_completo"]
+    pliego.texto_tokens = len(extraccion["texto_completo"].split())
+    pliego.num_paginas = extraccion["num_paginas"]
+    pliego.hashes_paginas = hashes_nuevos
+    aplicar_campos(pliego, extraer_campos(extraccion["paginas"]), reemplazar=True)
+    if resumen_llm and not tiene_resumen_llm(pliego.datos_extraidos):
+        # Un campo de patrón desapareció de la ficha: el resumen hay que completarlo de nuevo
+        obsoletos.add("resumen")
+    pliego.derivados_obsoletos = sorted(obsoletos)
+    pliego.version = (pliego.version or 1) + 1
+    pliego.estado = "listo"
+    pliego.error_mensaje = None
+    db.commit()
+    db.refresh(pliego)
+
+    resultado.update({
+        "chunks_nuevos": len(diff["nuevos"]),
+        "chunks_eliminados": len(diff["eliminados"]),
+        "chunks_conservados": diff["conservados"],
+        "paginas_modificadas": paginas_modificadas,
+        "derivados_obsoletos": pliego.derivados_obsoletos
+    })
+    return resultado
+
+
+def _checklist_afectado(checklist, diff: dict, paginas_modificadas: List[int]) -> bool:
+    """El checklist cambia si se tocaron páginas que referencia o secciones de requisitos."""
+    if isinstance(checklist, str):
+        checklist = json.loads(checklist)
+
+    paginas_referenciadas = {
+        ref.get("page")
+        for grupo in ("documentos_base", "documentos_especificos")
+        for doc in checklist.get(grupo, [])
+        for ref in doc.get("referencias", [])
+    }
+    if paginas_referenciadas & set(paginas_modificadas):
+        return True
+
+    return any(
+        m.get("section") in SECCIONES_CHECKLIST
+        for m in diff["nuevos"] + diff["eliminados"]
+    )
+
+
+def marcar_derivado_vigente(pliego: Pliego, derivado: str):
+    """Quita un resultado derivado de la lista de obsoletos tras regenerarlo."""
+    if pliego.derivados_obsoletos and derivado in pliego.derivados_obsoletos:
+        pliego.derivados_obsoletos = [d for d in pliego.derivados_obsoletos if d != derivado]
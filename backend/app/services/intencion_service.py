@@ -0,0 +1,178 @@
+import json
+import logging
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_service import codificar
+
+logger = logging.getLogger(__name__)
+
+# Preguntas de ejemplo por intención. Las de extracción van por campo de la
+# ficha (datos_extraidos) para poder responderlas sin LLM.
+EJEMPLOS_EXTRACCION = {
+    "numero_proceso": [
+        "¿Cuál es el número del proceso?",
+        "número de la licitación",
+        "¿Qué referencia tiene este proceso de selección?",
+    ],
+    "entidad": [
+        "¿Cuál es la entidad contratante?",
+        "¿Quién contrata?",
+        "¿Qué entidad publicó el pliego?",
+    ],
+    "objeto": [
+        "¿Cuál es el objeto del contrato?",
+        "¿Qué se va a contratar?",
+        "objeto del proceso",
+    ],
+    "presupuesto": [
+        "¿Cuál es el presupuesto oficial?",
+        "¿Cuánto vale el contrato?",
+        "valor estimado del proceso",
+    ],
+    "fecha_cierre": [
+        "¿Cuál es la fecha de cierre?",
+        "¿Hasta cuándo se pueden presentar ofertas?",
+        "fecha límite para entregar la propuesta",
+    ],
+    "garantias": [
+        "¿Qué garantías piden?",
+        "¿Cuáles son las pólizas exigidas?",
+        "garantía de seriedad de la oferta",
+    ],
+    "experiencia_requerida": [
+        "¿Qué experiencia se requiere?",
+        "experiencia mínima del proponente",
+        "¿Cuántos contratos de experiencia piden?",
+    ],
+}
+
+EJEMPLOS_SIMPLE = [
+    "¿Qué es una licitación pública?",
+    "¿Qué significa RUP?",
+    "Explícame qué es el SECOP",
+    "definición de pliego de condiciones",
+    "¿Qué es una adenda?",
+    "concepto de capacidad residual",
+]
+
+EJEMPLOS_ANALITICA = [
+    "¿Puedo participar si mi empresa tiene dos años de constituida?",
+    "¿Qué riesgos tiene este pliego para un proponente pequeño?",
+    "Compara los requisitos financieros con los de la Ley 80",
+    "¿Es restrictivo el requisito de experiencia?",
+    "¿Qué debo preparar para cumplir los requisitos habilitantes?",
+    "Analiza los criterios de evaluación y cómo obtener el máximo puntaje",
+]
+
+ETIQUETAS_CAMPOS = {
+    "numero_proceso": "Número del proceso",
+    "entidad": "Entidad contratante",
+    "objeto": "Objeto del contrato",
+    "presupuesto": "Presupuesto oficial",
+    "fecha_cierre": "Fecha de cierre",
+    "garantias": "Garantías",
+    "experiencia_requerida": "Experiencia requerida",
+}
+
+_centroides = None
+_centroides_lock = threading.Lock()
+
+# Latencia promedio observada por modelo, para estimar el ahorro de cada ruta
+_latencia_modelos = {}
+_latencia_lock = threading.Lock()
+
+
+def _centroide(ejemplos: List[str]) -> np.ndarray:
+    vectores = np.array(codificar(ejemplos))
+    centro = vectores.mean(axis=0)
+    return centro / max(np.linalg.norm(centro), 1e-12)
+
+
+def _obtener_centroides() -> dict:
+    """Centroides por etiqueta ("extraccion:<campo>", "simple", "analitica"), calculados al primer uso."""
+    global _centroides
+    if _centroides is None:
+        with _centroides_lock:
+            if _centroides is None:
+                centroides = {
+                    f"extraccion:{campo}": _centroide(ejemplos)
+                    for campo, ejemplos in EJEMPLOS_EXTRACCION.items()
+                }
+                centroides["simple"] = _centroide(EJEMPLOS_SIMPLE)
+                centroides["analitica"] = _centroide(EJEMPLOS_ANALITICA)
+                _centroides = centroides
+    return _centroides
+
+
+def clasificar_intencion(embedding: List[float]) -> dict:
+    """
+    Clasifica una pregunta por similitud con los centroides de cada intención.
+
+    Si ninguna intención supera INTENCION_UMBRAL se trata como analítica,
+    que es la ruta más segura (modelo grande con contexto).
+
+    Args:
+        embedding: Embedding normalizado de la pregunta
+
+    Returns:
+        Dict con intencion ("extraccion", "simple" o "analitica"), campo y similitud
+    """
+    vector = np.asarray(embedding)
+    similitudes = {etiqueta: float(centro @ vector) for etiqueta, centro in _obtener_centroides().items()}
+    etiqueta, similitud = max(similitudes.items(), key=lambda par: par[1])
+
+    if similitud < settings.INTENCION_UMBRAL:
+        return {"intencion": "analitica", "campo": None, "similitud": similitud}
+
+    intencion, _, campo = etiqueta.partition(":")
+    return {"intencion": intencion, "campo": campo or None, "similitud": similitud}
+
+
+def valor_ficha(pliego, campo: str) -> Optional[str]:
+    """
+    Valor de un campo de la ficha del pliego, si está disponible y vigente.
+
+    Returns:
+        Texto del campo, o None si no hay ficha, el campo está vacío o el resumen está obsoleto
+    """
+    fuente = pliego.fuente
+    if "resumen" in (fuente.derivados_obsoletos or []):
+        return None
+
+    datos = fuente.datos_extraidos or {}
+    if isinstance(datos, str):
+        datos = json.loads(datos)
+
+    valor = datos.get(campo) or getattr(pliego, campo, None)
+    if isinstance(valor, (list, dict)):
+        valor = json.dumps(valor, ensure_ascii=False)
+    valor = str(valor).strip() if valor else ""
+    return valor or None
+
+
+def respuesta_ficha(campo: str, valor: str) -> str:
+    return f"{ETIQUETAS_CAMPOS.get(campo, campo)}: {valor}"
+
+
+def registrar_ruta(clasificacion: dict, modelo: str, tiempo_ms: int):
+    """
+    Registra la decisión de enrutamiento y la latencia ahorrada frente al modelo grande.
+
+    El ahorro se estima con la latencia promedio observada del modelo grande.
+    """
+    with _latencia_lock:
+        if modelo:
+            promedio = _latencia_modelos.get(modelo)
+            _latencia_modelos[modelo] = tiempo_ms if promedio is None else 0.9 * promedio + 0.1 * tiempo_ms
+        referencia = _latencia_modelos.get(settings.OLLAMA_MODEL)
+
+    ahorro = int(referencia - tiempo_ms) if referencia is not None and modelo != settings.OLLAMA_MODEL else 0
+    logger.info(
+        "Ruta de pregunta: intencion=%s campo=%s similitud=%.3f modelo=%s tiempo_ms=%d ahorro_estimado_ms=%d",
+        clasificacion["intencion"], clasificacion["campo"], clasificacion["similitud"],
+        modelo or "ficha", tiempo_ms, max(ahorro, 0)
+    )
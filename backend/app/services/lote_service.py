@@ -0,0 +1,399 @@
+# Procesamiento por lotes de pliegos ya cargados (python -m app.cli reindex|resumen|checklist).
+#
+# El proceso principal recorre la tabla por keyset (id > último procesado),
+# reparte el trabajo pesado (extracción, embeddings, llamadas al LLM) en un
+# pool de procesos y escribe él solo en la BD y en ChromaDB. Al cerrar cada
+# lote guarda un checkpoint con el último ID, así una corrida interrumpida
+# retoma donde quedó.
+#
+# reindex --sombra registra además la versión de cada pliego indexado: antes
+# del swap se copian de la colección activa los que cambiaron durante la
+# corrida (nuevas versiones, subidas que seguían procesando) y se quitan los
+# de pliegos borrados.
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metricas import configurar_logging
+from app.models import Pliego
+from app.services.documento_service import generar_checklist_completo
+from app.services.embedding_service import (
+    activar_coleccion_pliegos,
+    crear_coleccion_sombra,
+    eliminar_coleccion_pliegos,
+    modelo_pliegos,
+    nombre_coleccion_activa,
+    obtener_coleccion_pliegos,
+    preparar_chunks,
+    reemplazar_chunks_pliego,
+    sincronizar_coleccion_pliegos
+)
+from app.services.extraccion_service import aplicar_campos, extraer_campos, extraer_campos_texto, tiene_resumen_llm
+from app.services.ingesta_service import calcular_hashes_paginas, generar_chunks, marcar_derivado_vigente
+from app.services.ollama_service import generar_resumen
+from app.services.pdf_service import extraer_texto_pdf
+
+logger = logging.getLogger(__name__)
+
+COMANDOS_LOTE = ("reindex", "resumen", "checklist")
+
+
+class Limitador:
+    """Espacia las llamadas para no pasar de por_segundo (0 = sin límite)."""
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1 / por_segundo if por_segundo > 0 else 0
+        self._siguiente = time.monotonic()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        ahora = time.monotonic()
+        if self._siguiente > ahora:
+            time.sleep(self._siguiente - ahora)
+        self._siguiente = max(self._siguiente, ahora) + self.intervalo
+
+
+class _EjecutorLocal(Executor):
+    """Ejecuta las tareas en el mismo proceso (--procesos 0), útil para depurar."""
+
+    def submit(self, funcion, *args, **kwargs):
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*args, **kwargs))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+
+def iterar_lotes(db: Session, tamano_lote: int, desde_id: int = 0) -> Iterator[List[Pliego]]:
+    """
+    Recorre los pliegos originales listos en lotes ordenados por ID.
+
+    Paginación por keyset (id > último): cada lote cuesta lo mismo aunque la
+    tabla tenga miles de filas, y los pliegos subidos durante la corrida
+    entran en los últimos lotes.
+    """
+    ultimo_id = desde_id
+    while True:
+        lote = (
+            db.query(Pliego)
+            .filter(
+                Pliego.id > ultimo_id,
+                Pliego.estado == "listo",
+                Pliego.pliego_origen_id.is_(None)
+            )
+            .order_by(Pliego.id)
+            .limit(tamano_lote)
+            .all()
+        )
+        if not lote:
+            return
+        yield lote
+        ultimo_id = lote[-1].id
+
+
+# --- Tareas: corren en los procesos del pool, sin BD ni escrituras en ChromaDB ---
+
+def _tarea_reindex(pliego_id: int, ruta_archivo: str, modelo: str) -> dict:
+    resultado = extraer_texto_pdf(ruta_archivo)
+    if resultado["error"]:
+        return {"pliego_id": pliego_id, "error": resultado["error"]}
+
+    return {
+        "pliego_id": pliego_id,
+        "texto_completo": resultado["texto_completo"],
+        "num_paginas": resultado["num_paginas"],
+        "hashes_paginas": calcular_hashes_paginas(resultado["paginas"]),
+        "campos": extraer_campos(resultado["paginas"]),
+        "chunks": preparar_chunks(pliego_id, generar_chunks(resultado), modelo=modelo),
+        "error": None
+    }
+
+
+def _tarea_resumen(pliego_id: int, texto: str) -> dict:
+    resultado = generar_resumen(texto, extraer_campos_texto(texto))
+    return {"pliego_id": pliego_id, **resultado}
+
+
+def _tarea_checklist(pliego_id: int, pliego_indice_id: int, texto: str) -> dict:
+    resultado = generar_checklist_completo(pliego_indice_id, texto)
+    # El checklist se guarda aunque traiga advertencia; solo sin documentos es un fallo
+    error = resultado["error"] if not resultado["total_documentos"] else None
+    return {"pliego_id": pliego_id, "checklist": resultado, "error": error}
+
+
+def _argumentos_tarea(comando: str, pliego: Pliego, modelo: str) -> tuple:
+    if comando == "reindex":
+        return _tarea_reindex, (pliego.id, pliego.ruta_archivo, modelo)
+    if comando == "resumen":
+        return _tarea_resumen, (pliego.id, pliego.texto_completo or "")
+    return _tarea_checklist, (pliego.id, pliego.pliego_indice_id, pliego.texto_completo or "")
+
+
+def _pendiente(comando: str, pliego: Pliego) -> bool:
+    """Sin resultado o marcado como obsoleto por una nueva versión."""
+    obsoletos = pliego.derivados_obsoletos or []
+    if comando == "resumen":
+        # La ingesta ya llena la ficha con los campos de patrón: sin LLM sigue pendiente
+        return not tiene_resumen_llm(pliego.datos_extraidos) or "resumen" in obsoletos
+    return not pliego.checklist_documentos or "checklist" in obsoletos
+
+
+# --- Aplicación de resultados: solo en el proceso principal ---
+
+def _duplicados(db: Session, pliego: Pliego) -> List[Pliego]:
+    return db.query(Pliego).filter(Pliego.pliego_origen_id == pliego.id).all()
+
+
+def _aplicar_reindex(db: Session, pliego: Pliego, resultado: dict, coleccion):
+    reemplazar_chunks_pliego(pliego.id, resultado["chunks"], coleccion)
+    pliego.texto_completo = resultado["texto_completo"]
+    pliego.hashes_paginas = resultado["hashes_paginas"]
+    aplicar_campos(pliego, resultado["campos"])
+    # Los duplicados leen texto y ficha del original; solo llevan las columnas cortas
+    for destino in [pliego] + _duplicados(db, pliego):
+        destino.texto_tokens = len(resultado["texto_completo"].split())
+        destino.num_paginas = resultado["num_paginas"]
+        destino.numero_proceso = pliego.numero_proceso
+        destino.entidad = pliego.entidad
+        destino.objeto = pliego.objeto
+
+
+def _aplicar_resumen(db: Session, pliego: Pliego, resultado: dict, coleccion):
+    pliego.datos_extraidos = resultado["ficha"]
+    marcar_derivado_vigente(pliego, "resumen")
+
+
+def _aplicar_checklist(db: Session, pliego: Pliego, resultado: dict, coleccion):
+    pliego.checklist_documentos = json.dumps(resultado["checklist"], ensure_ascii=False)
+    marcar_derivado_vigente(pliego, "checklist")
+
+
+def _cambios_sombra(db: Session, indexados: dict) -> tuple:
+    """
+    Pliegos que deben quedar en la sombra y los que cambiaron desde que se indexaron.
+
+    Returns:
+        Tupla (vigentes, actualizados): IDs de originales no fallidos, y dict
+        ID -> versión de los que no están en indexados con esa versión (los que
+        siguen procesando van con versión None para revisarlos siempre)
+    """
+    # Terminar la transacción: con REPEATABLE READ se seguiría leyendo la foto anterior
+    db.commit()
+    filas = (
+        db.query(Pliego.id, Pliego.version, Pliego.estado)
+        .filter(Pliego.pliego_origen_id.is_(None), Pliego.estado != "error")
+        .all()
+    )
+    vigentes = [fila.id for fila in filas]
+    actualizados = {
+        fila.id: None if fila.estado == "procesando" else fila.version
+        for fila in filas
+        if fila.estado == "procesando" or indexados.get(str(fila.id)) != fila.version
+    }
+    return vigentes, actualizados
+
+
+def _activar_sombra(db: Session, estado: dict) -> str:
+    """Pone la sombra al día con la colección activa y hace el swap; retorna la colección anterior."""
+    nombre = estado["coleccion_sombra"]
+
+    # Pasada previa sin detener escrituras: los fallidos y lo que cambió durante la corrida
+    vigentes, actualizados = _cambios_sombra(db, estado["indexados"])
+    resultado = sincronizar_coleccion_pliegos(nombre, list(actualizados), vigentes)
+    logger.info("Sombra %s al día: %d pliegos copiados, %d chunks eliminados", nombre, resultado["copiados"], resultado["eliminados"])
+    estado["indexados"].update({str(i): v for i, v in actualizados.items() if v is not None})
+
+    # Lo que cambió durante la pasada previa se copia en el swap, con las escrituras detenidas
+    vigentes, actualizados = _cambios_sombra(db, estado["indexados"])
+    return activar_coleccion_pliegos(nombre, estado["modelo"], list(actualizados), vigentes)
+
+
+APLICAR = {
+    "reindex": _aplicar_reindex,
+    "resumen": _aplicar_resumen,
+    "checklist": _aplicar_checklist,
+}
+
+
+# --- Checkpoint ---
+
+def _leer_checkpoint(ruta: str) -> Optional[dict]:
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _guardar_checkpoint(ruta: str, estado: dict):
+    # Escritura atómica: un corte a mitad de escritura no deja un checkpoint ilegible
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+def _iniciar_proceso():
+    configurar_logging()
+
+
+def procesar_en_lotes(
+    comando: str,
+    tamano_lote: int = 50,
+    procesos: int = 2,
+    por_minuto: float = 0,
+    checkpoint: str = None,
+    reiniciar: bool = False,
+    sombra: bool = False,
+    eliminar_anterior: bool = False,
+    solo_pendientes: bool = False,
+    modelo: str = None
+) -> dict:
+    """
+    Re-procesa los pliegos existentes: reindex (texto, chunks y embeddings),
+    resumen o checklist.
+
+    Args:
+        comando: "reindex", "resumen" o "checklist"
+        tamano_lote: Pliegos por lote (y por commit)
+        procesos: Procesos del pool (0 = en el proceso actual)
+        por_minuto: Tope de pliegos enviados por minuto (0 = sin límite)
+        checkpoint: Archivo de progreso; si existe se retoma desde él
+        reiniciar: Ignora el checkpoint existente y empieza desde el principio
+        sombra: (reindex) Construye una colección nueva y la activa al terminar;
+            las consultas siguen usando la actual mientras tanto
+        eliminar_anterior: (reindex --sombra) Borra la colección reemplazada tras el swap
+        solo_pendientes: (resumen, checklist) Solo pliegos sin ese resultado o con él obsoleto
+        modelo: (reindex) Modelo de embeddings; por defecto el de la colección activa
+            (o EMBEDDING_MODELO para una sombra). Cambiarlo requiere sombra
+
+    Returns:
+        Dict con procesados, omitidos, fallidos (IDs), último ID, colección activa y tiempo
+    """
+    if comando not in COMANDOS_LOTE:
+        raise ValueError(f"Comando no soportado: {comando}")
+    if sombra and comando != "reindex":
+        raise ValueError("--sombra solo aplica a reindex")
+    if modelo and comando != "reindex":
+        raise ValueError("--modelo solo aplica a reindex")
+
+    checkpoint = checkpoint or f".checkpoint_{comando}.json"
+    estado = None if reiniciar else _leer_checkpoint(checkpoint)
+    if estado and (
+        estado["comando"] != comando
+        or bool(estado.get("coleccion_sombra")) != sombra
+        or (modelo and estado.get("modelo") != modelo)
+    ):
+        raise ValueError(f"El checkpoint {checkpoint} es de otra corrida; usa --reiniciar o cambia --checkpoint")
+    if estado:
+        logger.info("Retomando %s desde el pliego %d (%s)", comando, estado["ultimo_id"], checkpoint)
+        # Checkpoints anteriores a registrar modelo y versiones
+        estado.setdefault("modelo", None)
+        estado.setdefault("indexados", {})
+    else:
+        if comando != "reindex":
+            modelo = None
+        elif sombra:
+            modelo = modelo or settings.EMBEDDING_MODELO
+        else:
+            activo = modelo_pliegos()
+            if modelo and modelo != activo:
+                raise ValueError(f"La colección activa es del modelo {activo}; cambiar de modelo requiere --sombra")
+            modelo = activo
+        estado = {
+            "comando": comando,
+            "ultimo_id": 0,
+            "procesados": 0,
+            "omitidos": 0,
+            "fallidos": [],
+            "modelo": modelo,
+            "coleccion_sombra": crear_coleccion_sombra(modelo) if sombra else None,
+            # Versión de cada pliego escrito en la sombra, para ponerla al día antes del swap
+            "indexados": {},
+        }
+        _guardar_checkpoint(checkpoint, estado)
+
+    coleccion = obtener_coleccion_pliegos(estado["coleccion_sombra"]) if sombra else None
+    limitador = Limitador(por_minuto / 60)
+    aplicar = APLICAR[comando]
+    inicio = time.perf_counter()
+
+    if procesos > 0:
+        # spawn: no heredar el cliente de ChromaDB ni los hilos del proceso principal
+        ejecutor = ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_proceso
+        )
+    else:
+        ejecutor = _EjecutorLocal()
+
+    db = SessionLocal()
+    try:
+        with ejecutor:
+            for lote in iterar_lotes(db, tamano_lote, estado["ultimo_id"]):
+                inicio_lote = time.perf_counter()
+
+                futuros = {}
+                for pliego in lote:
+                    if solo_pendientes and not _pendiente(comando, pliego):
+                        estado["omitidos"] += 1
+                        continue
+                    limitador.esperar()
+                    funcion, argumentos = _argumentos_tarea(comando, pliego, estado["modelo"])
+                    futuros[ejecutor.submit(funcion, *argumentos)] = pliego
+
+                for futuro in as_completed(futuros):
+                    pliego = futuros[futuro]
+                    try:
+                        resultado = futuro.result()
+                        if resultado["error"]:
+                            raise RuntimeError(resultado["error"])
+                        aplicar(db, pliego, resultado, coleccion)
+                        estado["procesados"] += 1
+                        if coleccion is not None:
+                            estado["indexados"][str(pliego.id)] = pliego.version
+                    except Exception as e:
+                        # En la sombra, sus chunks actuales se copian antes del swap
+                        logger.warning("Pliego %d no procesado: %s", pliego.id, e)
+                        estado["fallidos"].append(pliego.id)
+
+                db.commit()
+                estado["ultimo_id"] = lote[-1].id
+                _guardar_checkpoint(checkpoint, estado)
+                logger.info(
+                    "%s: lote hasta el pliego %d en %.1f s (procesados=%d fallidos=%d)",
+                    comando, estado["ultimo_id"], time.perf_counter() - inicio_lote,
+                    estado["procesados"], len(estado["fallidos"])
+                )
+
+        if sombra:
+            anterior = _activar_sombra(db, estado)
+            logger.info("Colección activa: %s (antes %s)", estado["coleccion_sombra"], anterior)
+            if eliminar_anterior and anterior != estado["coleccion_sombra"]:
+                eliminar_coleccion_pliegos(anterior)
+            estado["coleccion_anterior"] = anterior
+    finally:
+        db.close()
+
+    os.remove(checkpoint)
+    return {
+        "comando": comando,
+        "procesados": estado["procesados"],
+        "omitidos": estado["omitidos"],
+        "fallidos": estado["fallidos"],
+        "ultimo_id": estado["ultimo_id"],
+        "modelo": estado.get("modelo"),
+        "coleccion_activa": nombre_coleccion_activa() if comando == "reindex" else None,
+        "coleccion_anterior": estado.get("coleccion_anterior"),
+        "tiempo_s": round(time.perf_counter() - inicio, 1)
+    }
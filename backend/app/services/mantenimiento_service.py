@@ -0,0 +1,429 @@
+# Reconciliación entre filas, archivos y vectores, y compactación de ChromaDB
+# (python -m app.cli reconciliar|compactar).
+#
+# Con el tiempo quedan PDFs sin fila (subidas cortadas, archivos .part),
+# vectores de pliegos borrados o fallidos y filas sin archivo o sin chunks.
+# Los vectores huérfanos inflan el índice y hacen más lenta cada consulta con filtro.
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+import numpy as np
+from sqlalchemy import null
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Pliego
+from app.services import embedding_service
+from app.services.embedding_cliente import compactar_remoto
+from app.services.embedding_service import (
+    activar_coleccion_pliegos,
+    crear_coleccion_sombra,
+    eliminar_chunks_pliego,
+    eliminar_coleccion_pliegos,
+    inicializar_servicios,
+    modelo_coleccion,
+    obtener_coleccion_pliegos,
+    ruta_chroma,
+    usa_worker_remoto
+)
+from app.services.ingesta_service import CAMPOS_COMPARTIDOS, liberar_pliego
+from app.services.lote_service import Limitador
+
+logger = logging.getLogger(__name__)
+
+# Ejemplos de cada tipo de diferencia incluidos en el reporte
+MAX_MUESTRAS = 20
+
+# Historial de compactaciones (una línea JSON por corrida) en el directorio de ChromaDB
+ARCHIVO_COMPACTACIONES = "compactaciones.jsonl"
+
+
+def _paginas_coleccion(coleccion, tamano_lote: int, include: List[str]) -> Iterator[dict]:
+    desde = 0
+    while True:
+        pagina = coleccion.get(include=include, limit=tamano_lote, offset=desde)
+        if not pagina["ids"]:
+            return
+        yield pagina
+        desde += len(pagina["ids"])
+
+
+def _metadatas_coleccion(coleccion, tamano_lote: int) -> Dict[str, dict]:
+    return {
+        i: metadata
+        for pagina in _paginas_coleccion(coleccion, tamano_lote, ["metadatas"])
+        for i, metadata in zip(pagina["ids"], pagina["metadatas"])
+    }
+
+
+def reconciliar(
+    aplicar: bool = False,
+    tamano_lote: int = 500,
+    por_segundo: float = 10,
+    antiguedad_min: int = 60,
+    purgar_errores: bool = False
+) -> dict:
+    """
+    Cruza las filas de pliegos, los archivos de UPLOAD_DIR y los chunks de ChromaDB.
+
+    Diferencias que se corrigen (solo con aplicar):
+    - archivos_huerfanos: PDFs (y .part) que ninguna fila referencia
+    - vectores_huerfanos: chunks de pliegos que no existen, son duplicados o quedaron en error
+    - duplicados_con_copia: duplicados que aún guardan su copia de texto y ficha
+      (registrados antes de leerlos del original); se vacían CAMPOS_COMPARTIDOS
+
+    Diferencias que solo se reportan:
+    - filas_sin_archivo, filas_sin_vectores (se arreglan con reindex)
+    - filas_procesando: pliegos que llevan más de antiguedad_min en "procesando"
+    - filas_error: ingestas fallidas; con purgar_errores se eliminan (archivo, chunks y fila)
+
+    Args:
+        aplicar: Sin él solo se reporta (dry-run)
+        tamano_lote: Filas y chunks leídos por consulta
+        por_segundo: Tope de eliminaciones por segundo (0 = sin límite)
+        antiguedad_min: Minutos que debe tener un archivo o fila para tocarlo;
+            protege las subidas en curso
+        purgar_errores: Eliminar las filas en error más antiguas que antiguedad_min
+
+    Returns:
+        Dict con el conteo y ejemplos de cada diferencia y lo eliminado
+    """
+    inicio = time.perf_counter()
+    limite = datetime.now() - timedelta(minutes=antiguedad_min)
+    limitador = Limitador(por_segundo)
+
+    rutas_referenciadas = set()
+    con_vectores = set()  # originales listos o en proceso: sus chunks son válidos
+    listos = set()
+    filas_sin_archivo, filas_procesando, filas_error = [], [], []
+    max_id = 0
+    total_filas = 0
+
+    db = SessionLocal()
+    try:
+        # 1. Filas, por keyset y sin cargar el texto completo
+        ultimo_id = 0
+        while True:
+            lote = (
+                db.query(Pliego.id, Pliego.ruta_archivo, Pliego.estado, Pliego.pliego_origen_id, Pliego.updated_at)
+                .filter(Pliego.id > ultimo_id)
+                .order_by(Pliego.id)
+                .limit(tamano_lote)
+                .all()
+            )
+            if not lote:
+                break
+            total_filas += len(lote)
+            for fila in lote:
+                rutas_referenciadas.add(os.path.abspath(fila.ruta_archivo))
+                if fila.estado == "error":
+                    filas_error.append(fila.id)
+                elif fila.estado == "procesando" and fila.updated_at and fila.updated_at < limite:
+                    filas_procesando.append(fila.id)
+                if fila.pliego_origen_id is None and fila.estado in ("listo", "procesando"):
+                    con_vectores.add(fila.id)
+                    if fila.estado == "listo":
+                        listos.add(fila.id)
+                        if not os.path.exists(fila.ruta_archivo):
+                            filas_sin_archivo.append(fila.id)
+            ultimo_id = max_id = lote[-1].id
+
+        duplicados_con_copia = [
+            fila.id for fila in
+            db.query(Pliego.id)
+            .filter(Pliego.pliego_origen_id.isnot(None), Pliego.texto_completo.isnot(None))
+            .order_by(Pliego.id)
+        ]
+
+        # 2. Archivos en disco que ninguna fila referencia
+        archivos_huerfanos = []
+        if os.path.isdir(settings.UPLOAD_DIR):
+            for entrada in os.scandir(settings.UPLOAD_DIR):
+                if not entrada.is_file() or os.path.abspath(entrada.path) in rutas_referenciadas:
+                    continue
+                if datetime.fromtimestamp(entrada.stat().st_mtime) < limite:
+                    archivos_huerfanos.append(entrada.path)
+
+        # 3. Chunks de ChromaDB por pliego (solo metadata, por páginas)
+        inicializar_servicios()
+        chunks_por_pliego = {}
+        sin_pliego = []
+        for pagina in _paginas_coleccion(embedding_service.coleccion_pliegos, tamano_lote, ["metadatas"]):
+            for id_chunk, metadata in zip(pagina["ids"], pagina["metadatas"]):
+                pliego_id = (metadata or {}).get("pliego_id")
+                if pliego_id is None:
+                    sin_pliego.append(id_chunk)
+                else:
+                    chunks_por_pliego[pliego_id] = chunks_por_pliego.get(pliego_id, 0) + 1
+
+        # Los pliegos creados después de leer las filas no cuentan como huérfanos
+        vectores_huerfanos = {
+            pliego_id: n for pliego_id, n in chunks_por_pliego.items()
+            if pliego_id not in con_vectores and pliego_id <= max_id
+        }
+        filas_sin_vectores = sorted(listos - set(chunks_por_pliego))
+
+        reporte = {
+            "aplicado": aplicar,
+            "filas": total_filas,
+            "chunks": sum(chunks_por_pliego.values()) + len(sin_pliego),
+            "archivos_huerfanos": {"total": len(archivos_huerfanos), "muestras": archivos_huerfanos[:MAX_MUESTRAS]},
+            "vectores_huerfanos": {
+                "pliegos": len(vectores_huerfanos),
+                "chunks": sum(vectores_huerfanos.values()),
+                "muestras": sorted(vectores_huerfanos)[:MAX_MUESTRAS]
+            },
+            "chunks_sin_pliego": len(sin_pliego),
+            "duplicados_con_copia": {"total": len(duplicados_con_copia), "muestras": duplicados_con_copia[:MAX_MUESTRAS]},
+            "filas_sin_archivo": {"total": len(filas_sin_archivo), "muestras": filas_sin_archivo[:MAX_MUESTRAS]},
+            "filas_sin_vectores": {"total": len(filas_sin_vectores), "muestras": filas_sin_vectores[:MAX_MUESTRAS]},
+            "filas_procesando": {"total": len(filas_procesando), "muestras": filas_procesando[:MAX_MUESTRAS]},
+            "filas_error": {"total": len(filas_error), "muestras": filas_error[:MAX_MUESTRAS]},
+            "eliminados": {
+                "archivos": 0, "pliegos_vectores": 0, "chunks_sin_pliego": 0, "filas_error": 0, "copias_duplicados": 0
+            },
+        }
+
+        if aplicar:
+            _eliminar_huerfanos(db, reporte, archivos_huerfanos, vectores_huerfanos, sin_pliego, limitador)
+            _vaciar_copias_duplicados(db, reporte, duplicados_con_copia, tamano_lote, limitador)
+            if purgar_errores:
+                _purgar_errores(db, reporte, filas_error, limite, limitador)
+    finally:
+        db.close()
+
+    reporte["tiempo_s"] = round(time.perf_counter() - inicio, 1)
+    logger.info(
+        "Reconciliación (%s): archivos_huerfanos=%d vectores_huerfanos=%d filas_sin_archivo=%d filas_sin_vectores=%d",
+        "aplicada" if aplicar else "dry-run", len(archivos_huerfanos), reporte["vectores_huerfanos"]["chunks"],
+        len(filas_sin_archivo), len(filas_sin_vectores)
+    )
+    return reporte
+
+
+def _eliminar_huerfanos(
+    db, reporte: dict, archivos: List[str], vectores: dict, sin_pliego: List[str], limitador: Limitador
+):
+    # Volver a mirar las filas justo antes de borrar: pudieron cambiar durante el recorrido
+    vigentes = {
+        fila.id for fila in
+        db.query(Pliego.id)
+        .filter(
+            Pliego.id.in_(list(vectores)),
+            Pliego.pliego_origen_id.is_(None),
+            Pliego.estado.in_(("listo", "procesando"))
+        )
+    } if vectores else set()
+
+    for pliego_id in vectores:
+        if pliego_id in vigentes:
+            continue
+        limitador.esperar()
+        eliminar_chunks_pliego(pliego_id)
+        reporte["eliminados"]["pliegos_vectores"] += 1
+
+    if sin_pliego:
+        limitador.esperar()
+        embedding_service.coleccion_pliegos.delete(ids=sin_pliego)
+        reporte["eliminados"]["chunks_sin_pliego"] = len(sin_pliego)
+
+    for ruta in archivos:
+        limitador.esperar()
+        try:
+            os.remove(ruta)
+            reporte["eliminados"]["archivos"] += 1
+        except FileNotFoundError:
+            pass
+
+
+def _vaciar_copias_duplicados(db, reporte: dict, ids: List[int], tamano_lote: int, limitador: Limitador):
+    # SQL NULL y no JSON null: así la fila queda igual que un duplicado nuevo
+    vacios = {campo: null() for campo in CAMPOS_COMPARTIDOS}
+    for desde in range(0, len(ids), tamano_lote):
+        limitador.esperar()
+        reporte["eliminados"]["copias_duplicados"] += (
+            db.query(Pliego)
+            .filter(Pliego.id.in_(ids[desde:desde + tamano_lote]), Pliego.pliego_origen_id.isnot(None))
+            .update(vacios, synchronize_session=False)
+        )
+        db.commit()
+
+
+def _purgar_errores(db, reporte: dict, filas_error: List[int], limite: datetime, limitador: Limitador):
+    for pliego_id in filas_error:
+        pliego = db.query(Pliego).filter(Pliego.id == pliego_id, Pliego.estado == "error").first()
+        if not pliego or (pliego.updated_at and pliego.updated_at >= limite):
+            continue
+        limitador.esperar()
+        liberar_pliego(db, pliego)
+        reporte["eliminados"]["filas_error"] += 1
+
+
+# --- Compactación ---
+
+def _tamano_directorio(ruta: str) -> int:
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, archivo))
+            except OSError:
+                pass
+    return total
+
+
+def _medir_consultas(coleccion, muestras: dict, n_resultados: int = 10) -> dict:
+    """p50/p95 de consultas sin filtro y filtradas por pliego, con embeddings de la propia colección."""
+    if not muestras["ids"]:
+        return {}
+
+    tiempos = {"sin_filtro": [], "por_pliego": []}
+    for embedding, metadata in zip(muestras["embeddings"], muestras["metadatas"]):
+        vector = [list(map(float, embedding))]
+        inicio = time.perf_counter()
+        coleccion.query(query_embeddings=vector, n_results=n_resultados)
+        tiempos["sin_filtro"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        coleccion.query(query_embeddings=vector, n_results=n_resultados, where={"pliego_id": metadata["pliego_id"]})
+        tiempos["por_pliego"].append(time.perf_counter() - inicio)
+
+    return {
+        nombre: {
+            "p50_ms": round(float(np.percentile(valores, 50)) * 1000, 2),
+            "p95_ms": round(float(np.percentile(valores, 95)) * 1000, 2)
+        }
+        for nombre, valores in tiempos.items()
+    }
+
+
+def _estado_indice(coleccion, muestras: dict) -> dict:
+    return {
+        "coleccion": coleccion.name,
+        "chunks": coleccion.count(),
+        "tamano_mb": round(_tamano_directorio(ruta_chroma()) / 1024 / 1024, 2),
+        "latencia": _medir_consultas(coleccion, muestras)
+    }
+
+
+def _copiar(origen, destino, ids: List[str] = None, tamano_lote: int = 500) -> int:
+    """Copia chunks con sus embeddings (todos o los IDs dados) sin recalcularlos."""
+    copiados = 0
+    if ids is not None:
+        for desde in range(0, len(ids), tamano_lote):
+            pagina = origen.get(ids=ids[desde:desde + tamano_lote], include=["documents", "embeddings", "metadatas"])
+            destino.upsert(**{k: pagina[k] for k in ("ids", "documents", "embeddings", "metadatas")})
+            copiados += len(pagina["ids"])
+        return copiados
+
+    for pagina in _paginas_coleccion(origen, tamano_lote, ["documents", "embeddings", "metadatas"]):
+        destino.upsert(**{k: pagina[k] for k in ("ids", "documents", "embeddings", "metadatas")})
+        copiados += len(pagina["ids"])
+    return copiados
+
+
+def _sincronizar(origen, destino, tamano_lote: int) -> int:
+    """
+    Deja destino igual a origen sin volver a copiar todo.
+
+    Se copian los chunks que faltan o cuya metadata cambió (reasignar_chunks_pliego
+    y actualizar_chunks_pliego solo actualizan metadata) y se borran los que sobran.
+    Los IDs dependen del texto, así que un mismo ID no puede traer otro documento.
+
+    Returns:
+        Chunks copiados
+    """
+    en_origen = _metadatas_coleccion(origen, tamano_lote)
+    en_destino = _metadatas_coleccion(destino, tamano_lote)
+
+    distintos = sorted(i for i, metadata in en_origen.items() if en_destino.get(i) != metadata)
+    sobrantes = sorted(set(en_destino) - set(en_origen))
+    for desde in range(0, len(sobrantes), tamano_lote):
+        destino.delete(ids=sobrantes[desde:desde + tamano_lote])
+    return _copiar(origen, destino, ids=distintos, tamano_lote=tamano_lote)
+
+
+def _vacuum(ruta_sqlite: str) -> str:
+    try:
+        conexion = sqlite3.connect(ruta_sqlite, timeout=30)
+        try:
+            conexion.execute("VACUUM")
+        finally:
+            conexion.close()
+    except sqlite3.Error as e:
+        logger.warning("No se pudo hacer VACUUM de %s: %s", ruta_sqlite, e)
+        return str(e)
+    return None
+
+
+def compactar_vectores(consultas: int = 20, tamano_lote: int = 500, bloqueo=None) -> dict:
+    """
+    Reconstruye la colección de pliegos para descartar los vectores borrados.
+
+    ChromaDB no libera los elementos borrados del índice HNSW: se copia todo
+    a una colección nueva, se activa (mismo swap que reindex --sombra), se
+    borra la anterior y se hace VACUUM del SQLite. Antes y después se miden
+    tamaño en disco, chunks y latencia de consultas, y queda el registro en
+    compactaciones.jsonl.
+
+    Solo corre en el worker de embeddings: sin su lock otros procesos podrían
+    escribir en la colección entre la última sincronización y el swap.
+
+    Args:
+        consultas: Consultas de muestra para medir la latencia
+        tamano_lote: Chunks copiados por operación
+        bloqueo: Lock de escritura del worker de embeddings; mientras se tiene
+            se sincroniza lo escrito durante la copia, se hace el swap y el VACUUM
+
+    Returns:
+        Dict con antes, despues, chunks copiados y error de VACUUM si lo hubo
+        (o solo error si no hay worker)
+    """
+    if usa_worker_remoto():
+        # El worker es el único proceso con acceso al directorio de ChromaDB
+        return compactar_remoto(consultas, tamano_lote)
+    if bloqueo is None:
+        return {"error": "La compactación requiere el worker de embeddings (EMBEDDING_WORKER_URL)"}
+
+    inicio = time.perf_counter()
+    inicializar_servicios()
+    activa = embedding_service.coleccion_pliegos
+    muestras = activa.get(include=["embeddings", "metadatas"], limit=consultas)
+    antes = _estado_indice(activa, muestras)
+
+    # Mismo modelo que la activa: los vectores se copian tal cual
+    nueva = obtener_coleccion_pliegos(crear_coleccion_sombra(modelo_coleccion(activa)))
+    copiados = _copiar(activa, nueva, tamano_lote=tamano_lote)
+    # Pasada previa sin bloquear: con el lock solo queda lo escrito durante ella
+    copiados += _sincronizar(activa, nueva, tamano_lote)
+
+    with bloqueo:
+        copiados += _sincronizar(activa, nueva, tamano_lote)
+        anterior = activar_coleccion_pliegos(nueva.name)
+        eliminar_coleccion_pliegos(anterior)
+        # VACUUM necesita la base sin escrituras en curso
+        error_vacuum = _vacuum(os.path.join(ruta_chroma(), "chroma.sqlite3"))
+    despues = _estado_indice(embedding_service.coleccion_pliegos, muestras)
+
+    registro = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "antes": antes,
+        "despues": despues,
+        "chunks_copiados": copiados,
+        "error_vacuum": error_vacuum,
+        "tiempo_s": round(time.perf_counter() - inicio, 1)
+    }
+    with open(os.path.join(ruta_chroma(), ARCHIVO_COMPACTACIONES), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    logger.info(
+        "Compactación: %s -> %s, %.2f MB -> %.2f MB, chunks %d -> %d",
+        antes["coleccion"], despues["coleccion"], antes["tamano_mb"], despues["tamano_mb"],
+        antes["chunks"], despues["chunks"]
+    )
+    return registro
@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import List
+import re
+
+from app.services.pdf_service import extraer_texto_pdf
+from app.services.chunk_service import ESTRATEGIAS_CHUNKING
+from app.services.embedding_service import contar_tokens, guardar_normativa, max_tokens_embedding
+
+EXTENSIONES_NORMATIVA = {".txt", ".md", ".pdf"}
+
+# Encabezado de artículo: "ARTÍCULO 5o.", "Artículo 2.2.1.1.1.3.1.", "ARTICULO 24-"
+PATRON_ARTICULO = re.compile(
+    r'^\s*ART[IÍ]CULO\s+(\d+(?:\.\d+)*)\s*[oº°]?\s*[\.\-:]',
+    re.IGNORECASE | re.MULTILINE
+)
+
+PATRON_NOMBRE_NORMA = re.compile(
+    r'(ley|decreto|resoluci[oó]n)[\s_\-]*(\d+)[\s_\-]*(?:de[\s_\-]*)?(\d{4})?',
+    re.IGNORECASE
+)
+
+
+def nombre_norma(ruta: Path) -> str:
+    """Deriva el nombre de la norma del archivo: ley_80_1993.txt -> Ley 80 de 1993."""
+    match = PATRON_NOMBRE_NORMA.search(ruta.stem)
+    if not match:
+        return ruta.stem.replace("_", " ")
+
+    tipo, numero, anio = match.groups()
+    nombre = f"{tipo.capitalize()} {numero}"
+    return f"{nombre} de {anio}" if anio else nombre
+
+
+def _ajustar_fragmentos(fragmentos: List[str], titulo: str, max_tokens: int) -> List[str]:
+    """Parte por la mitad los fragmentos que con el título aún pasan de max_tokens (el conteo por oraciones es aproximado)."""
+    ajustados = []
+    pendientes = list(reversed(fragmentos))
+    while pendientes:
+        fragmento = pendientes.pop()
+        palabras = fragmento.split()
+        if len(palabras) < 2 or contar_tokens([titulo + fragmento])[0] <= max_tokens:
+            ajustados.append(fragmento)
+            continue
+        mitad = len(palabras) // 2
+        pendientes += [" ".join(palabras[mitad:]), " ".join(palabras[:mitad])]
+    return ajustados
+
+
+def dividir_en_articulos(texto: str, norma: str, max_tokens: int = None) -> List[dict]:
+    """
+    Divide el texto de una norma en artículos.
+
+    Los artículos largos se parten con el chunking por estructura (oraciones,
+    numerales, parágrafos) en fragmentos que, con el título, caben en
+    max_tokens del modelo de embeddings: lo que pase del límite del modelo
+    se truncaría sin aviso al calcular el embedding. Cada fragmento lleva la
+    norma y el artículo al inicio para que el LLM pueda citarlo.
+
+    Args:
+        texto: Texto completo de la norma
+        norma: Nombre de la norma (ej. "Ley 80 de 1993")
+        max_tokens: Tokens máximos por fragmento, título incluido (por defecto
+            los que admite el modelo de embeddings)
+
+    Returns:
+        Lista de dicts con id, norma, articulo y texto
+    """
+    slug = re.sub(r'[^a-z0-9]+', '_', norma.lower()).strip("_")
+    encabezados = list(PATRON_ARTICULO.finditer(texto))
+    articulos = []
+    ids_usados = set()
+    max_tokens = min(max_tokens or max_tokens_embedding(), max_tokens_embedding())
+    dividir = ESTRATEGIAS_CHUNKING["estructura"]
+
+    for i, encabezado in enumerate(encabezados):
+        fin = encabezados[i + 1].start() if i + 1 < len(encabezados) else len(texto)
+        numero = encabezado.group(1).rstrip(".")
+        cuerpo = texto[encabezado.end():fin].strip()
+        if not cuerpo:
+            continue
+
+        # Presupuesto del cuerpo: lo que deja el título más largo posible (con "parte N")
+        titulo_maximo = f"{norma} - Artículo {numero} (parte 99)\n"
+        tokens_cuerpo = max_tokens - contar_tokens([titulo_maximo])[0]
+        fragmentos = [c["texto"] for c in dividir(cuerpo, max_tokens=tokens_cuerpo, solapamiento_tokens=0)]
+        fragmentos = _ajustar_fragmentos(fragmentos, titulo_maximo, max_tokens)
+        for parte, fragmento in enumerate(fragmentos, start=1):
+            id_base = f"normativa_{slug}_art_{numero}"
+            if len(fragmentos) > 1:
+                id_base = f"{id_base}_p{parte}"
+
+            # Algunos textos repiten numeración (artículos modificados, parágrafos transitorios)
+            id_articulo = id_base
+            repeticion = 1
+            while id_articulo in ids_usados:
+                repeticion += 1
+                id_articulo = f"{id_base}_{repeticion}"
+            ids_usados.add(id_articulo)
+
+            titulo = f"{norma} - Artículo {numero}"
+            if len(fragmentos) > 1:
+                titulo = f"{titulo} (parte {parte})"
+
+            articulos.append({
+                "id": id_articulo,
+                "norma": norma,
+                "articulo": numero,
+                "texto": f"{titulo}\n{fragmento}"
+            })
+
+    return articulos
+
+
+def leer_texto_norma(ruta: Path) -> str:
+    """Lee el texto de una norma desde .txt/.md o .pdf."""
+    if ruta.suffix.lower() == ".pdf":
+        resultado = extraer_texto_pdf(str(ruta))
+        if resultado["error"]:
+            raise ValueError(resultado["error"])
+        return resultado["texto_completo"]
+
+    return ruta.read_text(encoding="utf-8")
+
+
+def cargar_normativa(rutas: List[str], tamano_lote: int = 64) -> dict:
+    """
+    Carga normativa desde archivos o directorios locales a ChromaDB.
+
+    Args:
+        rutas: Archivos o directorios con las normas (.txt, .md, .pdf)
+        tamano_lote: Artículos por lote de embeddings
+
+    Returns:
+        Dict con artículos por norma, total y errores por archivo
+    """
+    resultado = {
+        "normas": {},
+        "total_articulos": 0,
+        "errores": {}
+    }
+
+    archivos = []
+    for ruta in map(Path, rutas):
+        if ruta.is_dir():
+            archivos += sorted(p for p in ruta.rglob("*") if p.suffix.lower() in EXTENSIONES_NORMATIVA)
+        else:
+            archivos.append(ruta)
+
+    articulos = []
+    for archivo in archivos:
+        norma = nombre_norma(archivo)
+        try:
+            articulos_norma = dividir_en_articulos(leer_texto_norma(archivo), norma)
+        except Exception as e:
+            resultado["errores"][str(archivo)] = str(e)
+            continue
+
+        if not articulos_norma:
+            resultado["errores"][str(archivo)] = "No se encontraron artículos"
+            continue
+
+        resultado["normas"][norma] = len(articulos_norma)
+        articulos += articulos_norma
+
+    resultado["total_articulos"] = guardar_normativa(articulos, tamano_lote=tamano_lote)
+
+    return resultado
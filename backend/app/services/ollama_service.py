@@ -1,139 +1,359 @@
 import httpx
+import json
+import logging
 import time
+from typing import List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
 from app.config import settings
-from app.services.embedding_service import buscar_chunks_relevantes, buscar_normativa
-
-MODELO_SIMPLE = "llama3.2:latest"
-MODELO_COMPLEJO = "llama3.1:latest"
-
-def es_pregunta_simple(pregunta: str) -> bool:
-    """Detecta si es pregunta simple o necesita análisis."""
-    palabras_simples = [
-        "qué es", "que es", "definición", "definicion",
-        "significa", "concepto", "explica", "explicame"
-    ]
-    pregunta_lower = pregunta.lower()
-    return any(p in pregunta_lower for p in palabras_simples)
-
-def preguntar_ollama(pliego_id: int, pregunta: str, texto_completo: str = None) -> dict:
-    """Envía pregunta a Ollama usando chunks relevantes."""
-    resultado = {
-        "respuesta": "",
-        "tokens_prompt": 0,
-        "tokens_respuesta": 0,
-        "tiempo_ms": 0,
-        "modelo_usado": "",
-        "fuentes": [],
-        "error": None
+from app.metricas import CABECERA_ID_PETICION, LLM_REINTENTOS_TOTAL, LLM_TOKENS_TOTAL, id_peticion, observar
+from app.schemas import FichaResumen
+from app.services.prompts import (
+    CAMPOS_FICHA,
+    PREFIJO_SISTEMA,
+    opciones_llamada,
+    prompt_resumen,
+    prompt_resumen_faltantes
+)
+
+logger = logging.getLogger(__name__)
+
+MODELO_SIMPLE = settings.OLLAMA_MODEL_SIMPLE
+MODELO_COMPLEJO = settings.OLLAMA_MODEL
+
+
+def _post_ollama(ruta: str, datos: dict, timeout: float) -> dict:
+    """
+    Llama a Ollama en modo stream y arma la respuesta completa.
+
+    El stream permite medir el tiempo hasta el primer token, que incluye la
+    espera en la cola de Ollama cuando el modelo está ocupado.
+
+    Returns:
+        Último mensaje del stream (con las estadísticas), con el texto
+        completo en "texto" y el tiempo al primer token en "primer_token_s"
+    """
+    partes = []
+    primer_token_s = None
+    final = {}
+    inicio = time.perf_counter()
+
+    with httpx.Client(timeout=timeout) as client:
+        with client.stream(
+            "POST",
+            f"{settings.OLLAMA_HOST}{ruta}",
+            json={**datos, "stream": True},
+            headers={CABECERA_ID_PETICION: id_peticion.get()}
+        ) as response:
+            response.raise_for_status()
+            for linea in response.iter_lines():
+                if not linea:
+                    continue
+                mensaje = json.loads(linea)
+                if mensaje.get("error"):
+                    raise httpx.HTTPError(f"Ollama: {mensaje['error']}")
+
+                texto = mensaje.get("response") or mensaje.get("message", {}).get("content", "")
+                if texto:
+                    if primer_token_s is None:
+                        primer_token_s = time.perf_counter() - inicio
+                    partes.append(texto)
+                if mensaje.get("done"):
+                    final = mensaje
+
+    final["texto"] = "".join(partes)
+    final["primer_token_s"] = primer_token_s if primer_token_s is not None else time.perf_counter() - inicio
+    return final
+
+
+def _resultado_llamada(data: dict, inicio: float, tipo: str) -> dict:
+    # Ollama reporta duraciones en nanosegundos
+    total_s = time.time() - inicio
+    carga_s = data.get("load_duration", 0) / 1e9
+    prompt_s = data.get("prompt_eval_duration", 0) / 1e9
+    primer_token_s = data["primer_token_s"]
+
+    # Lo que tardó el primer token y no explican la carga ni el prompt es espera en la cola de Ollama
+    observar("llm_cola", max(primer_token_s - carga_s - prompt_s, 0))
+    observar("llm_primer_token", primer_token_s)
+    observar("llm_generacion", max(total_s - primer_token_s, 0))
+    LLM_TOKENS_TOTAL.labels(tipo, "prompt").inc(data.get("prompt_eval_count", 0))
+    LLM_TOKENS_TOTAL.labels(tipo, "respuesta").inc(data.get("eval_count", 0))
+
+    return {
+        "respuesta": data["texto"],
+        "tokens_prompt": data.get("prompt_eval_count", 0),
+        "tokens_respuesta": data.get("eval_count", 0),
+        "tiempo_ms": int(total_s * 1000),
+        "tiempo_carga_ms": int(carga_s * 1000),
+        "tiempo_prompt_ms": int(prompt_s * 1000),
+        "tiempo_primer_token_ms": int(primer_token_s * 1000),
+        "tiempo_generacion_ms": int(data.get("eval_duration", 0) / 1_000_000),
+        # Cortada por num_predict: el JSON puede venir incompleto
+        "truncada": data.get("done_reason") == "length"
     }
 
-    try:
-        if es_pregunta_simple(pregunta):
-            modelo = MODELO_SIMPLE
-            contexto = ""
-        else:
-            modelo = MODELO_COMPLEJO
-            chunks = buscar_chunks_relevantes(pregunta, pliego_id, n_resultados=3)
-            normativa = buscar_normativa(pregunta, n_resultados=2)
-
-            # Extraer fuentes de los chunks
-            fuentes = []
-            if chunks:
-                for chunk in chunks:
-                    fuente = {
-                        "page": chunk.get("page", 1),
-                        "section": chunk.get("section", "sin_seccion")
-                    }
-                    if fuente not in fuentes:
-                        fuentes.append(fuente)
-                resultado["fuentes"] = fuentes
-
-            contexto_pliego = "\n\n".join([c["texto"][:1000] for c in chunks]) if chunks else texto_completo[:3000] if texto_completo else ""
-            contexto_legal = "\n\n".join(normativa) if normativa else ""
-
-            if contexto_legal:
-                contexto = f"EXTRACTOS DEL PLIEGO:\n{contexto_pliego}\n\nNORMATIVA APLICABLE:\n{contexto_legal}"
+
+def llamar_ollama(modelo: str, prompt: str, tipo: str, timeout: float = 300.0, formato: dict = None) -> dict:
+    """
+    Llama a /api/generate con keep_alive y las opciones del tipo de llamada.
+
+    Separa el tiempo de carga del modelo (load_duration) del tiempo de
+    evaluación del prompt y de generación, para distinguir una recarga
+    del modelo de una respuesta lenta.
+
+    Args:
+        modelo: Modelo de Ollama
+        prompt: Prompt completo (empieza con PREFIJO_SISTEMA)
+        tipo: Tipo de llamada para num_ctx/num_predict ("pregunta", "resumen", "documentos")
+        timeout: Timeout de la petición en segundos
+        formato: JSON schema de la respuesta (salida restringida de Ollama)
+
+    Returns:
+        Dict con respuesta, tokens, tiempos en ms (total, carga, prompt, primer token,
+        generación) y truncada
+
+    Raises:
+        httpx.HTTPError: Si Ollama no responde o devuelve error
+    """
+    datos = {
+        "model": modelo,
+        "prompt": prompt,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        "options": opciones_llamada(tipo)
+    }
+    if formato:
+        datos["format"] = formato
+
+    inicio = time.time()
+    data = _post_ollama("/api/generate", datos, timeout)
+
+    return _resultado_llamada(data, inicio, tipo)
+
+
+def llamar_ollama_chat(modelo: str, mensajes: List[dict], tipo: str, timeout: float = 300.0) -> dict:
+    """
+    Llama a /api/chat con una lista de mensajes (system/user/assistant).
+
+    Si los mensajes iniciales son idénticos a los de la llamada anterior,
+    Ollama reutiliza su caché KV y tokens_prompt solo cuenta los mensajes nuevos.
+
+    Returns:
+        Mismo formato que llamar_ollama
+    """
+    inicio = time.time()
+    data = _post_ollama("/api/chat", {
+        "model": modelo,
+        "messages": mensajes,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        "options": opciones_llamada(tipo)
+    }, timeout)
+
+    return _resultado_llamada(data, inicio, tipo)
+
+
+def esquema_formato(modelo: Type[BaseModel], campos: List[str] = None) -> dict:
+    """
+    JSON schema de un modelo de Pydantic para el campo "format" de Ollama.
+
+    Todas las propiedades quedan requeridas para que la salida restringida
+    no las omita; con campos el schema se limita a esos.
+    """
+    esquema = modelo.model_json_schema()
+    for definicion in [esquema, *esquema.get("$defs", {}).values()]:
+        if campos is not None and definicion is esquema:
+            definicion["properties"] = {c: definicion["properties"][c] for c in campos}
+        definicion["required"] = list(definicion.get("properties", {}))
+    return esquema
+
+
+_decodificador = json.JSONDecoder()
+
+
+def _saltar(texto: str, pos: int, caracteres: str = " \t\r\n") -> int:
+    while pos < len(texto) and texto[pos] in caracteres:
+        pos += 1
+    return pos
+
+
+def _rescatar(texto: str, pos: int) -> tuple:
+    """
+    Decodifica un valor JSON desde pos aunque esté cortado.
+
+    De un objeto o lista incompletos se conservan solo los elementos que
+    llegaron completos; una lista cortada se conserva con esos elementos.
+    Un escalar sin separador ni cierre después no se da por completo.
+    Retorna (valor, posición final, completo).
+    """
+    pos = _saltar(texto, pos)
+    if pos >= len(texto):
+        raise ValueError("JSON vacío")
+
+    if texto[pos] in "{[":
+        es_objeto = texto[pos] == "{"
+        cierre = "}" if es_objeto else "]"
+        valor = {} if es_objeto else []
+        pos += 1
+        while True:
+            pos = _saltar(texto, pos, " \t\r\n,")
+            if pos >= len(texto):
+                return valor, pos, False
+            if texto[pos] == cierre:
+                return valor, pos + 1, True
+            try:
+                if es_objeto:
+                    clave, pos = _decodificador.raw_decode(texto, pos)
+                    pos = _saltar(texto, pos)
+                    if texto[pos] != ":":
+                        return valor, len(texto), False
+                    pos += 1
+                elemento, pos, completo = _rescatar(texto, pos)
+            except (ValueError, IndexError):
+                return valor, len(texto), False
+            if not completo and not isinstance(elemento, list):
+                return valor, pos, False
+            if es_objeto:
+                valor[clave] = elemento
             else:
-                contexto = f"EXTRACTOS DEL PLIEGO:\n{contexto_pliego}"
+                valor.append(elemento)
+            if not completo:
+                return valor, pos, False
+
+    valor, pos = _decodificador.raw_decode(texto, pos)
+    # Un escalar pegado al final puede estar cortado ("presupuesto": 12 de 1200000):
+    # solo cuenta como completo si lo sigue un separador o un cierre
+    siguiente = _saltar(texto, pos)
+    return valor, pos, siguiente < len(texto) and texto[siguiente] in ",}]"
 
-        resultado["modelo_usado"] = modelo
 
-        prompt = f"""Eres un experto en contratación estatal colombiana.
-Analiza la información y responde la pregunta del usuario.
+def extraer_json(texto: str) -> Optional[dict]:
+    """
+    Objeto JSON de una respuesta del LLM.
 
-{contexto}
+    Tolera texto antes o después del JSON y respuestas cortadas por
+    num_predict (se conservan los pares y elementos completos).
 
-PREGUNTA: {pregunta}
+    Returns:
+        Dict, o None si la respuesta no contiene un objeto JSON
+    """
+    inicio = texto.find("{")
+    if inicio == -1:
+        return None
+    try:
+        valor, _, _ = _rescatar(texto, inicio)
+    except (ValueError, IndexError):
+        return None
+    return valor if isinstance(valor, dict) else None
 
-Responde de forma clara y concisa."""
 
-        inicio = time.time()
+def fuentes_de_chunks(chunks: List[dict]) -> List[dict]:
+    """Páginas y secciones únicas de los chunks usados como contexto."""
+    fuentes = []
+    for chunk in chunks:
+        fuente = {
+            "page": chunk.get("page", 1),
+            "section": chunk.get("section", "sin_seccion")
+        }
+        if fuente not in fuentes:
+            fuentes.append(fuente)
+    return fuentes
 
-        with httpx.Client(timeout=300.0) as client:
-            response = client.post(
-                f"{settings.OLLAMA_HOST}/api/generate",
-                json={"model": modelo, "prompt": prompt, "stream": False}
-            )
-            response.raise_for_status()
-            data = response.json()
 
-        fin = time.time()
+def precalentar_modelos():
+    """
+    Carga ambos modelos en Ollama y deja en caché el prefijo común de los prompts.
 
-        resultado["respuesta"] = data.get("response", "")
-        resultado["tokens_prompt"] = data.get("prompt_eval_count", 0)
-        resultado["tokens_respuesta"] = data.get("eval_count", 0)
-        resultado["tiempo_ms"] = int((fin - inicio) * 1000)
+    Se llama al arrancar la API para que la primera pregunta no pague la carga.
+    Usa el num_ctx de las preguntas: si cambia entre llamadas, Ollama recarga el modelo.
+    """
+    for modelo in dict.fromkeys([MODELO_COMPLEJO, MODELO_SIMPLE]):
+        try:
+            data = _post_ollama("/api/generate", {
+                "model": modelo,
+                "prompt": PREFIJO_SISTEMA,
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                "options": {**opciones_llamada("pregunta"), "num_predict": 1}
+            }, 300.0)
+            logger.info(
+                "Modelo %s precargado en %d ms",
+                modelo, int(data.get("load_duration", 0) / 1_000_000)
+            )
+        except httpx.HTTPError as e:
+            logger.warning("No se pudo precargar el modelo %s: %s", modelo, e)
 
-    except httpx.TimeoutException:
-        resultado["error"] = "Timeout: Ollama tardó demasiado en responder"
-    except httpx.HTTPError as e:
-        resultado["error"] = f"Error HTTP: {str(e)}"
-    except Exception as e:
-        resultado["error"] = f"Error: {str(e)}"
 
-    return resultado
+def generar_resumen(texto_pliego: str, ficha_base: dict = None) -> dict:
+    """
+    Genera ficha resumen estructurada del pliego.
 
+    La salida se restringe con el JSON schema de FichaResumen. Los campos que
+    no llegan (respuesta cortada o inválida) se piden de nuevo con un prompt
+    corto que comparte el prefijo del primero, hasta LLM_REINTENTOS_JSON veces.
 
-def generar_resumen(texto_pliego: str) -> dict:
-    """Genera ficha resumen estructurada del pliego."""
-    resultado = {"ficha": {}, "error": None}
+    Args:
+        texto_pliego: Texto completo del pliego
+        ficha_base: Campos ya extraídos sin LLM; al modelo solo se le piden los que faltan
 
-    prompt = f"""Eres un experto en contratación estatal colombiana.
-Analiza el siguiente pliego y extrae la información clave.
+    Returns:
+        Dict con ficha, campos_llm (pedidos al modelo), tokens_prompt,
+        tokens_respuesta, reintentos y error
+    """
+    ficha = {campo: valor for campo, valor in (ficha_base or {}).items() if valor}
+    faltantes = [campo for campo in CAMPOS_FICHA if campo not in ficha]
+    resultado = {
+        "ficha": ficha,
+        "campos_llm": faltantes,
+        "tokens_prompt": 0,
+        "tokens_respuesta": 0,
+        "reintentos": 0,
+        "error": None
+    }
 
-PLIEGO:
-{texto_pliego[:10000]}
+    if not faltantes:
+        return resultado
 
-Responde ÚNICAMENTE con un JSON válido:
-{{
-    "numero_proceso": "número del proceso",
-    "entidad": "nombre de la entidad",
-    "objeto": "objeto del contrato",
-    "presupuesto": "presupuesto oficial",
-    "fecha_cierre": "fecha límite",
-    "experiencia_requerida": "requisitos de experiencia",
-    "garantias": "garantías solicitadas",
-    "criterios_evaluacion": "criterios y ponderación",
-    "observaciones": "puntos importantes"
-}}"""
+    texto = texto_pliego[:10000]
+    prompt = prompt_resumen(texto, faltantes)
 
     try:
-        with httpx.Client(timeout=300.0) as client:
-            response = client.post(
-                f"{settings.OLLAMA_HOST}/api/generate",
-                json={"model": MODELO_COMPLEJO, "prompt": prompt, "stream": False}
+        while True:
+            llamada = llamar_ollama(
+                MODELO_COMPLEJO, prompt, "resumen", formato=esquema_formato(FichaResumen, faltantes)
             )
-            response.raise_for_status()
-            data = response.json()
+            resultado["tokens_prompt"] += llamada["tokens_prompt"]
+            resultado["tokens_respuesta"] += llamada["tokens_respuesta"]
+
+            respuesta = extraer_json(llamada["respuesta"]) or {}
+            validos = {}
+            for campo in faltantes:
+                if campo not in respuesta:
+                    continue
+                try:
+                    validos[campo] = getattr(FichaResumen.model_validate({campo: respuesta[campo]}), campo)
+                except ValidationError:
+                    pass
+            ficha.update(validos)
+
+            # null es una respuesta válida ("no aparece"); falta lo que no llegó
+            faltantes = [campo for campo in faltantes if campo not in validos]
+            if not faltantes or resultado["reintentos"] >= settings.LLM_REINTENTOS_JSON:
+                break
+
+            resultado["reintentos"] += 1
+            LLM_REINTENTOS_TOTAL.labels("resumen").inc()
+            prompt = prompt_resumen_faltantes(texto, faltantes)
 
-        import json
-        respuesta_texto = data.get("response", "{}")
-        resultado["ficha"] = json.loads(respuesta_texto)
+        if faltantes:
+            logger.warning("Ficha resumen sin los campos %s tras %d reintentos", faltantes, resultado["reintentos"])
+            ficha.update({campo: None for campo in faltantes})
 
-    except json.JSONDecodeError:
-        resultado["error"] = "Ollama no devolvió JSON válido"
-        resultado["ficha"] = {"respuesta_cruda": data.get("response", "")}
     except Exception as e:
         resultado["error"] = str(e)
 
+    logger.info(
+        "Resumen: campos_llm=%d tokens_prompt=%d tokens_respuesta=%d reintentos=%d",
+        len(resultado["campos_llm"]), resultado["tokens_prompt"],
+        resultado["tokens_respuesta"], resultado["reintentos"]
+    )
     return resultado
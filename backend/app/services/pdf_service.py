@@ -1,16 +1,187 @@
-import pdfplumber
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from typing import List
+
+import pdfplumber
+
+from app.config import settings
+from app.metricas import observar
+from app.ocr import ocr_disponible, ocr_pagina
+
+logger = logging.getLogger(__name__)
+
+# Pool propio para OCR: es lento y CPU-bound, así no compite con la extracción normal
+_pool_ocr = None
+_pool_ocr_lock = threading.Lock()
+
+
+def _obtener_pool_ocr() -> ProcessPoolExecutor:
+    global _pool_ocr
+    with _pool_ocr_lock:
+        if _pool_ocr is None:
+            _pool_ocr = ProcessPoolExecutor(
+                max_workers=settings.OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool_ocr
+
+
+def _descartar_pool_ocr(pool: ProcessPoolExecutor):
+    """Quita un pool roto (un proceso murió, por ejemplo por un fallo de Tesseract); el siguiente uso crea otro."""
+    global _pool_ocr
+    with _pool_ocr_lock:
+        if _pool_ocr is not pool:
+            return
+        _pool_ocr = None
+    logger.warning("Pool de OCR roto: se crea uno nuevo")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar_ocr(ruta_archivo: str, numero: int) -> tuple:
+    """
+    Encola el OCR de una página; si el pool está roto lo reemplaza y reintenta.
+
+    Returns:
+        Tupla (pool, futuro)
+    """
+    argumentos = (ruta_archivo, numero, settings.OCR_RESOLUCION, settings.OCR_IDIOMA, settings.OCR_CACHE_DIR)
+    pool = _obtener_pool_ocr()
+    try:
+        return pool, pool.submit(ocr_pagina, *argumentos)
+    except BrokenProcessPool:
+        _descartar_pool_ocr(pool)
+        pool = _obtener_pool_ocr()
+        return pool, pool.submit(ocr_pagina, *argumentos)
+
+
+def _esperar_ocr(numero: int, pool: ProcessPoolExecutor, futuro: Future):
+    """
+    Resultado del OCR de una página.
+
+    Returns:
+        Dict de la página (metodo "ocr_error" si falló), o None si el pool se
+        rompió antes de terminarla
+    """
+    try:
+        return futuro.result(timeout=settings.OCR_TIMEOUT_S)
+    except BrokenProcessPool:
+        _descartar_pool_ocr(pool)
+        return None
+    except Exception:
+        futuro.cancel()
+        return {"numero": numero, "texto": "", "metodo": "ocr_error", "tiempo_ms": 0}
+
+
+def limpiar_tabla(filas: List[list]) -> List[List[str]]:
+    """
+    Normaliza celdas y compacta la tabla.
+
+    Quita filas vacías y une columnas que nunca tienen valor en la misma fila,
+    que es como pdfplumber deja las celdas combinadas.
+    """
+    filas = [[" ".join(str(c).replace("|", "/").split()) if c else "" for c in fila] for fila in filas]
+    filas = [fila for fila in filas if any(fila)]
+    if not filas:
+        return []
+
+    ancho = max(len(fila) for fila in filas)
+    filas = [fila + [""] * (ancho - len(fila)) for fila in filas]
+
+    grupos = [[0]]
+    for i in range(1, ancho):
+        grupo = grupos[-1]
+        if any(fila[i] and any(fila[c] for c in grupo) for fila in filas):
+            grupos.append([i])
+        else:
+            grupo.append(i)
+
+    return [
+        [" ".join(fila[c] for c in grupo if fila[c]) for grupo in grupos]
+        for fila in filas
+    ]
+
+
+def tabla_a_markdown(filas: List[List[str]], encabezado: List[str] = None) -> str:
+    """Convierte filas limpias en una tabla markdown compacta."""
+    if not filas:
+        return ""
+
+    encabezado = encabezado or filas[0]
+    cuerpo = filas[1:] if encabezado is filas[0] else filas
+
+    lineas = [
+        "| " + " | ".join(encabezado) + " |",
+        "|" + "---|" * len(encabezado)
+    ]
+    lineas += ["| " + " | ".join(fila) + " |" for fila in cuerpo]
+    return "\n".join(lineas)
+
+
+def _extraer_tablas(pagina) -> tuple:
+    """
+    Separa las tablas de la página del resto del texto.
+
+    Returns:
+        Tupla (texto fuera de tablas, lista de tablas con filas y markdown)
+    """
+    tablas = []
+    bboxes = []
+
+    for tabla in pagina.find_tables():
+        filas = limpiar_tabla(tabla.extract())
+        # Una tabla de una sola columna o fila suele ser un recuadro de texto
+        if len(filas) < 2 or len(filas[0]) < 2:
+            continue
+        bboxes.append(tabla.bbox)
+        tablas.append({
+            "indice": len(tablas),
+            "filas": filas,
+            "markdown": tabla_a_markdown(filas)
+        })
+
+    if not bboxes:
+        return pagina.extract_text(), []
+
+    def fuera_de_tablas(obj) -> bool:
+        if "x0" not in obj or "top" not in obj:
+            return True
+        x = (obj["x0"] + obj["x1"]) / 2
+        y = (obj["top"] + obj["bottom"]) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in bboxes)
+
+    return pagina.filter(fuera_de_tablas).extract_text(), tablas
+
+
+def texto_pagina(pagina: dict) -> str:
+    """Texto de una página con sus tablas en markdown al final."""
+    partes = [pagina["texto"]] if pagina["texto"] else []
+    partes += [t["markdown"] for t in pagina.get("tablas", [])]
+    return "\n\n".join(partes)
 
 
 def extraer_texto_pdf(ruta_archivo: str) -> dict:
     """
     Extrae texto de un archivo PDF.
-    Retorna dict con texto_completo, paginas (lista), num_paginas, y error si hay.
+
+    Las páginas sin capa de texto (escaneadas) se envían al pool de OCR
+    mientras se sigue extrayendo el resto. Cada página registra su método de
+    extracción (texto, ocr o sin_texto) y el tiempo que tomó.
+
+    Las tablas detectadas se sacan del texto de la página y se entregan
+    aparte como filas limpias y markdown, para indexarlas como chunks propios.
+
+    Retorna dict con texto_completo, paginas (lista), num_paginas, paginas_ocr y error si hay.
     """
     resultado = {
         "texto_completo": "",
         "paginas": [],
         "num_paginas": 0,
+        "paginas_ocr": 0,
         "error": None
     }
 
@@ -20,22 +191,68 @@ def extraer_texto_pdf(ruta_archivo: str) -> dict:
             resultado["error"] = f"Archivo no encontrado: {ruta_archivo}"
             return resultado
 
+        usar_ocr = settings.OCR_HABILITADO and ocr_disponible()
+        paginas = []
+        pendientes_ocr = {}
+
         with pdfplumber.open(ruta) as pdf:
             resultado["num_paginas"] = len(pdf.pages)
-            textos = []
 
             for idx, pagina in enumerate(pdf.pages, start=1):
-                texto = pagina.extract_text()
-                if texto:
-                    textos.append(texto)
-                    resultado["paginas"].append({
+                inicio = time.time()
+                if settings.EXTRAER_TABLAS:
+                    texto, tablas = _extraer_tablas(pagina)
+                else:
+                    texto, tablas = pagina.extract_text(), []
+                tiempo_ms = int((time.time() - inicio) * 1000)
+                observar("pdf_pagina", tiempo_ms / 1000)
+
+                if (texto and texto.strip()) or tablas:
+                    paginas.append({
+                        "numero": idx,
+                        "texto": texto or "",
+                        "tablas": tablas,
+                        "metodo": "texto",
+                        "tiempo_ms": tiempo_ms
+                    })
+                elif usar_ocr:
+                    pendientes_ocr[idx] = _enviar_ocr(str(ruta), idx)
+                else:
+                    paginas.append({
                         "numero": idx,
-                        "texto": texto
+                        "texto": "",
+                        "metodo": "sin_texto",
+                        "tiempo_ms": tiempo_ms
                     })
 
-            resultado["texto_completo"] = "\n\n".join(textos)
+        # Si un proceso del pool muere se pierden todas sus páginas en curso:
+        # se reintentan una vez en un pool nuevo y, si vuelve a fallar, quedan como ocr_error
+        caidas = []
+        for idx, (pool, futuro) in pendientes_ocr.items():
+            pagina_ocr = _esperar_ocr(idx, pool, futuro)
+            if pagina_ocr is None:
+                caidas.append(idx)
+            else:
+                paginas.append(pagina_ocr)
+        for idx in caidas:
+            try:
+                pagina_ocr = _esperar_ocr(idx, *_enviar_ocr(str(ruta), idx))
+            except BrokenProcessPool:
+                pagina_ocr = None
+            paginas.append(pagina_ocr or {"numero": idx, "texto": "", "metodo": "ocr_error", "tiempo_ms": 0})
+
+        for pagina_ocr in paginas:
+            if pagina_ocr["metodo"] == "ocr":
+                resultado["paginas_ocr"] += 1
+                observar("pdf_pagina_ocr", pagina_ocr["tiempo_ms"] / 1000)
+
+        paginas.sort(key=lambda p: p["numero"])
+        resultado["paginas"] = paginas
+        resultado["texto_completo"] = "\n\n".join(
+            texto for texto in (texto_pagina(p) for p in paginas) if texto
+        )
 
     except Exception as e:
         resultado["error"] = str(e)
 
-    return resultado
\ No newline at end of file
+    return resultado
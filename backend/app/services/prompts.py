@@ -0,0 +1,197 @@
+from typing import List
+
+from app.config import settings
+
+# Prefijo común a todos los prompts. Debe ir siempre al inicio y sin cambios:
+# Ollama reutiliza la caché KV del prefijo idéntico entre llamadas al mismo modelo.
+PREFIJO_SISTEMA = """Eres un experto en contratación estatal colombiana (Ley 80 de 1993, Ley 1150 de 2007, Decreto 1082 de 2015).
+Trabajas con pliegos de condiciones de procesos de selección públicos.
+Respondes en español, con precisión y sin inventar información que no esté en el texto.
+"""
+
+# Campos de la ficha resumen y la descripción que recibe el LLM
+CAMPOS_FICHA = {
+    "numero_proceso": "número del proceso",
+    "entidad": "nombre de la entidad",
+    "objeto": "objeto del contrato",
+    "presupuesto": "presupuesto oficial",
+    "fecha_cierre": "fecha límite",
+    "experiencia_requerida": "requisitos de experiencia",
+    "garantias": "garantías solicitadas",
+    "criterios_evaluacion": "criterios y ponderación",
+    "observaciones": "puntos importantes",
+}
+
+DOCUMENTOS_BASE_PROMPT = [
+    "Certificado de Cámara de Comercio",
+    "RUT",
+    "Antecedentes fiscales, disciplinarios y judiciales",
+    "Certificado de aportes a seguridad social",
+    "Garantía de seriedad de la oferta",
+    "Carta de presentación",
+]
+
+
+def opciones_llamada(tipo: str) -> dict:
+    """
+    Opciones de Ollama por tipo de llamada.
+
+    Args:
+        tipo: "pregunta", "resumen", "documentos" o "memoria"
+
+    Returns:
+        Dict con num_ctx y num_predict para el campo "options"
+    """
+    opciones = {
+        "pregunta": (settings.OLLAMA_CTX_PREGUNTA, settings.OLLAMA_PREDICT_PREGUNTA),
+        "resumen": (settings.OLLAMA_CTX_RESUMEN, settings.OLLAMA_PREDICT_RESUMEN),
+        "documentos": (settings.OLLAMA_CTX_DOCUMENTOS, settings.OLLAMA_PREDICT_DOCUMENTOS),
+        "memoria": (settings.OLLAMA_CTX_PREGUNTA, settings.SESION_PREDICT_MEMORIA),
+    }
+    num_ctx, num_predict = opciones[tipo]
+    return {"num_ctx": num_ctx, "num_predict": num_predict}
+
+
+def _formato_campos(campos: List[str] = None) -> str:
+    return ",\n".join(
+        f'    "{campo}": "{descripcion}"'
+        for campo, descripcion in CAMPOS_FICHA.items()
+        if campos is None or campo in campos
+    )
+
+
+def _base_resumen(texto_pliego: str) -> str:
+    return f"""{PREFIJO_SISTEMA}
+Extrae la información clave del pliego. Si un dato no aparece, usa null.
+
+PLIEGO:
+{texto_pliego}
+"""
+
+
+def prompt_resumen(texto_pliego: str, campos: List[str] = None) -> str:
+    """
+    Prompt de ficha resumen: el pliego va antes de la lista de campos.
+
+    Con campos se piden solo esos (los que la extracción por patrones no
+    encontró). El reintento por campos faltantes (prompt_resumen_faltantes)
+    comparte todo el prefijo hasta el pliego, así Ollama solo evalúa la cola.
+    """
+    return f"""{_base_resumen(texto_pliego)}
+Responde ÚNICAMENTE con un JSON válido:
+{{
+{_formato_campos(campos)}
+}}"""
+
+
+def prompt_resumen_faltantes(texto_pliego: str, campos: List[str]) -> str:
+    """Reintento corto: solo los campos que faltaron o llegaron inválidos en la respuesta anterior."""
+    return f"""{_base_resumen(texto_pliego)}
+Responde ÚNICAMENTE con un JSON válido y breve con estos campos:
+{{
+{_formato_campos(campos)}
+}}"""
+
+
+def prompt_documentos(contexto: str, ya_detectados: List[str] = None) -> str:
+    """
+    Prompt de detección de documentos específicos a partir de extractos del pliego.
+
+    Con ya_detectados (respuesta anterior cortada) se agrega al final una cola
+    corta que pide solo los que faltan; el resto del prompt no cambia y Ollama
+    reutiliza el prefijo ya evaluado.
+    """
+    documentos_base = "\n".join(f"- {d}" for d in DOCUMENTOS_BASE_PROMPT)
+    prompt = f"""{PREFIJO_SISTEMA}
+Analiza el extracto del pliego que aparece al final y extrae ÚNICAMENTE los documentos ESPECÍFICOS requeridos que NO estén en esta lista base:
+{documentos_base}
+
+Identifica documentos ADICIONALES como:
+- Certificaciones de experiencia específicas
+- Licencias o permisos especiales
+- Certificados técnicos o de calidad
+- Documentos financieros específicos
+- Certificaciones de personal
+- Autorizaciones especiales
+
+Responde ÚNICAMENTE con un JSON válido en este formato:
+{{
+  "documentos": [
+    {{
+      "nombre": "nombre del documento",
+      "descripcion": "descripción breve",
+      "categoria": "experiencia|tecnico|financiero|legal|otros",
+      "mencionado_en": "texto exacto donde se menciona (máximo 200 caracteres)"
+    }}
+  ]
+}}
+
+Si no hay documentos adicionales específicos, retorna: {{"documentos": []}}
+
+EXTRACTO DEL PLIEGO:
+{contexto}"""
+    if ya_detectados:
+        prompt += (
+            "\n\nYa identificaste: " + "; ".join(ya_detectados) + ". "
+            "Responde solo con los documentos que falten, con descripciones breves."
+        )
+    return prompt
+
+
+def contexto_pregunta(contexto_pliego: str, normativa: List[str]) -> str:
+    """Bloque de contexto del chat con extractos del pliego y normativa aplicable."""
+    contexto = f"EXTRACTOS DEL PLIEGO:\n{contexto_pliego}"
+    if normativa:
+        contexto += "\n\nNORMATIVA APLICABLE:\n" + "\n\n".join(normativa)
+    return contexto
+
+
+def mensajes_sesion(pregunta: str, contexto: str, memoria: str, turnos: List[dict]) -> List[dict]:
+    """
+    Mensajes para /api/chat en una sesión.
+
+    El orden va de lo más estable a lo más variable (prefijo, contexto
+    recuperado, memoria resumida, turnos recientes, pregunta) para que
+    los seguimientos sobre el mismo tema compartan el prefijo ya evaluado.
+
+    Args:
+        pregunta: Pregunta actual
+        contexto: Extractos del pliego y normativa ("" si no aplica)
+        memoria: Resumen de los turnos anteriores de la sesión
+        turnos: Turnos recientes con pregunta y respuesta
+
+    Returns:
+        Lista de mensajes con role y content
+    """
+    mensajes = [{
+        "role": "system",
+        "content": f"{PREFIJO_SISTEMA}\nResponde las preguntas del usuario de forma clara y concisa."
+    }]
+    if contexto:
+        mensajes.append({"role": "system", "content": contexto})
+    if memoria:
+        mensajes.append({"role": "system", "content": f"RESUMEN DE LA CONVERSACIÓN HASTA AHORA:\n{memoria}"})
+
+    for turno in turnos:
+        mensajes.append({"role": "user", "content": turno["pregunta"]})
+        mensajes.append({"role": "assistant", "content": turno["respuesta"] or ""})
+
+    mensajes.append({"role": "user", "content": pregunta})
+    return mensajes
+
+
+def prompt_memoria(memoria: str, turnos: List[dict]) -> str:
+    """Prompt para condensar turnos antiguos de una sesión en la memoria resumida."""
+    conversacion = "\n\n".join(
+        f"USUARIO: {t['pregunta']}\nASISTENTE: {t['respuesta'] or ''}" for t in turnos
+    )
+    return f"""{PREFIJO_SISTEMA}
+Actualiza el resumen de una conversación sobre un pliego. Conserva datos concretos
+(cifras, fechas, requisitos, páginas) y las conclusiones; omite saludos y repeticiones.
+Responde solo con el resumen actualizado, en máximo 150 palabras.
+
+RESUMEN ANTERIOR:
+{memoria or "(vacío)"}
+
+TURNOS NUEVOS:
+{conversacion}"""
@@ -0,0 +1,136 @@
+# Latencia de la búsqueda en todo el corpus (/api/busqueda) a escala.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.busqueda [pdf] [--pliegos 50 200] [--consultas 30] [--k 90]
+#
+# Arma en un CHROMA_PATH temporal un corpus sintético de N pliegos replicando
+# los chunks del PDF (embeddings calculados una sola vez, con algo de ruido por
+# pliego) y mide p50/p95 de buscar_chunks_corpus sin filtros, con $in sobre el
+# 10% de los pliegos, filtrando por sección y con filtro literal (contiene).
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services import embedding_service
+from app.services.pdf_service import extraer_texto_pdf
+from app.services.chunk_service import dividir_por_paginas
+from app.services.embedding_service import buscar_chunks_corpus, codificar, hash_chunk
+from benchmarks.chunking import consultas_sinteticas
+
+PDF_POR_DEFECTO = Path(__file__).resolve().parents[2] / "pliego_prueba.pdf"
+LOTE_CHROMA = 5000
+
+
+def poblar_corpus(chunks: list, embeddings: np.ndarray, pliego_ids: range, ruido: float = 0.02):
+    rng = np.random.default_rng(0)
+    documentos, vectores, ids, metadatas = [], [], [], []
+
+    def volcar():
+        if ids:
+            embedding_service.coleccion_pliegos.add(
+                documents=documentos, embeddings=vectores, ids=ids, metadatas=metadatas
+            )
+            for lista in (documentos, vectores, ids, metadatas):
+                lista.clear()
+
+    for pliego_id in pliego_ids:
+        variados = embeddings + rng.normal(0, ruido, embeddings.shape)
+        variados /= np.linalg.norm(variados, axis=1, keepdims=True)
+        for i, (chunk, vector) in enumerate(zip(chunks, variados)):
+            documentos.append(chunk["texto"])
+            vectores.append(vector.tolist())
+            ids.append(f"pliego_{pliego_id}_{i}")
+            metadatas.append({
+                "pliego_id": pliego_id,
+                "chunk_id": chunk["id"],
+                "page": chunk.get("page", 1),
+                "section": chunk.get("section", "sin_seccion"),
+                "tipo": chunk.get("tipo", "texto"),
+                "extraccion": chunk.get("extraccion", "texto"),
+                "hash": hash_chunk(chunk["texto"])
+            })
+            if len(ids) >= LOTE_CHROMA:
+                volcar()
+    volcar()
+
+
+def percentiles(tiempos: list) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(tiempos, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(tiempos, 95)) * 1000, 2),
+    }
+
+
+def medir(consultas: list, embeddings: np.ndarray, k: int, **filtros) -> dict:
+    tiempos, resultados = [], 0
+    for consulta, embedding in zip(consultas, embeddings):
+        inicio = time.perf_counter()
+        chunks = buscar_chunks_corpus(consulta["texto"], n_resultados=k, embedding=embedding.tolist(), **filtros)
+        tiempos.append(time.perf_counter() - inicio)
+        resultados += len(chunks)
+    return {**percentiles(tiempos), "resultados_promedio": round(resultados / len(consultas), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda en todo el corpus")
+    parser.add_argument("pdf", nargs="?", default=str(PDF_POR_DEFECTO))
+    parser.add_argument("--pliegos", type=int, nargs="+", default=[50, 200], help="Tamaños de corpus")
+    parser.add_argument("--consultas", type=int, default=30)
+    parser.add_argument("--k", type=int, default=90, help="Candidatos por consulta")
+    args = parser.parse_args()
+
+    resultado = extraer_texto_pdf(args.pdf)
+    if resultado["error"]:
+        raise SystemExit(f"{args.pdf}: {resultado['error']}")
+
+    chunks = dividir_por_paginas(resultado["paginas"])
+    embeddings = np.array(codificar([c["texto"] for c in chunks]))
+    consultas = consultas_sinteticas(resultado["paginas"])[:args.consultas]
+    embeddings_consultas = np.array(codificar([c["texto"] for c in consultas]))
+
+    secciones = [c.get("section") for c in chunks if c.get("section")]
+    section = max(set(secciones), key=secciones.count) if secciones else None
+    palabras = [p for p in chunks[0]["texto"].split() if len(p) >= 6]
+    contiene = palabras[0] if palabras else None
+
+    reportes = []
+    with tempfile.TemporaryDirectory() as ruta:
+        os.environ["CHROMA_PATH"] = ruta
+        embedding_service.inicializar_servicios()
+
+        # El corpus crece de un tamaño al siguiente: solo se agregan los pliegos nuevos
+        cargados = 0
+        for n_pliegos in sorted(args.pliegos):
+            inicio = time.perf_counter()
+            poblar_corpus(chunks, embeddings, range(cargados + 1, n_pliegos + 1))
+            tiempo_carga = time.perf_counter() - inicio
+            cargados = n_pliegos
+
+            subconjunto = list(range(1, n_pliegos + 1, 10))
+            reportes.append({
+                "pliegos": n_pliegos,
+                "chunks": n_pliegos * len(chunks),
+                "tiempo_carga_s": round(tiempo_carga, 2),
+                "sin_filtros": medir(consultas, embeddings_consultas, args.k),
+                "in_10pct": medir(consultas, embeddings_consultas, args.k, pliego_ids=subconjunto),
+                "section": medir(consultas, embeddings_consultas, args.k, section=section),
+                "contiene": medir(consultas, embeddings_consultas, args.k, contiene=contiene),
+            })
+
+    print(json.dumps({
+        "chunks_por_pliego": len(chunks),
+        "consultas": len(consultas),
+        "k": args.k,
+        "section": section,
+        "contiene": contiene,
+        "resultados": reportes
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# Suite de carga offline: ingesta, recuperación y chat contra la API real.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.carga [--escenarios ingesta recuperacion chat]
+#                                [--sinteticos 2] [--paginas 300]
+#                                [--concurrencia 8] [--peticiones 80]
+#                                [--primer-token-ms 150] [--tokens-por-s 40] [--paralelo 1]
+#                                [--baseline benchmarks/baseline_carga.json] [--guardar-baseline]
+#                                [--tolerancia 0.2]
+#
+# No necesita MariaDB, Ollama ni el worker de embeddings: la API corre en un
+# hilo con SQLite (DATABASE_URL) y ChromaDB en un directorio temporal, y las
+# llamadas al LLM van a benchmarks.ollama_falso. El modelo de embeddings sí
+# se carga: es parte de lo que se mide.
+#
+# - ingesta: sube pliego_prueba.pdf y N PDFs sintéticos por /api/pliegos/upload.
+# - recuperacion: buscar_chunks_relevantes concurrente con consultas sintéticas.
+# - chat: /api/chat/preguntar concurrente; cada hilo mantiene su sesión y
+#   alterna preguntas de ficha, conceptuales y de análisis.
+#
+# Reporta throughput, p50/p95/p99, errores, RSS pico del proceso (y cuánto
+# creció en cada escenario) y el tiempo promedio por etapa (métricas de
+# app.metricas). Termina con código 1 si hubo peticiones con error y, con
+# --baseline, si alguna métrica empeora más que la tolerancia o falta en una
+# de las dos corridas. Una baseline con otra configuración no se compara, y
+# una de otro entorno (máquina, CPUs, modelo de embeddings) solo se reporta:
+# los tiempos de otra máquina no sirven de referencia.
+#
+# benchmarks/baseline_carga.json es la baseline de referencia del repo; su
+# campo nota dice dónde se generó. make bench-baseline la reemplaza por una
+# de la máquina local.
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+PDF_POR_DEFECTO = Path(__file__).resolve().parents[2] / "pliego_prueba.pdf"
+ESCENARIOS = ["ingesta", "recuperacion", "chat"]
+
+PREGUNTAS_CHAT = [
+    "¿Cuál es el número del proceso?",
+    "¿Qué es una adenda?",
+    "¿Qué riesgos tiene este pliego para un proponente pequeño?",
+    "¿Cuál es el presupuesto oficial?",
+    "¿Qué experiencia se requiere y es restrictiva?",
+    "¿Qué significa RUP?",
+]
+
+# Métricas de cada escenario comparadas contra la baseline y si un valor mayor es peor
+METRICAS_BASELINE = {
+    "p95_ms": True,
+    "p99_ms": True,
+    "por_s": False,
+}
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def preparar_entorno(directorio: str, puerto_ollama: int):
+    """Variables de entorno de la API; deben quedar fijadas antes de importar app."""
+    os.environ.update({
+        # SQLite bloquea toda la base al escribir: con el chat concurrente los 5 s por defecto no alcanzan
+        "DATABASE_URL": f"sqlite:///{directorio}/bench.db?timeout=120",
+        "CHROMA_PATH": f"{directorio}/chroma",
+        "UPLOAD_DIR": f"{directorio}/uploads",
+        "OCR_CACHE_DIR": f"{directorio}/ocr_cache",
+        "OLLAMA_HOST": f"http://127.0.0.1:{puerto_ollama}",
+        "OLLAMA_PRECALENTAR": "false",
+        "EMBEDDING_WORKER_URL": "",
+    })
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+def iniciar_api(puerto: int):
+    import uvicorn
+    from app.main import app
+
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    threading.Thread(target=servidor.run, name="api-bench", daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+
+def rss_pico_mb() -> float:
+    # ru_maxrss está en KB en Linux y es el pico de toda la vida del proceso
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def entorno() -> dict:
+    """Máquina y modelo de embeddings de la corrida: los tiempos solo son comparables en el mismo entorno."""
+    from app.config import settings
+    from app.services.embedding_service import dimension_modelo
+
+    return {
+        "plataforma": f"{platform.system()} {platform.machine()}",
+        "cpus": os.cpu_count(),
+        "python": ".".join(platform.python_version_tuple()[:2]),
+        "embedding_modelo": settings.EMBEDDING_MODELO,
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "embedding_dimension": dimension_modelo(settings.EMBEDDING_MODELO),
+    }
+
+
+def _con_rss(funcion, *args) -> dict:
+    """Ejecuta un escenario y agrega cuánto subió el pico de RSS durante él."""
+    antes = rss_pico_mb()
+    resultado = funcion(*args)
+    return {**resultado, "rss_delta_mb": round(rss_pico_mb() - antes, 1)}
+
+
+def resumen_latencias(tiempos: list, duracion_s: float) -> dict:
+    if not tiempos:
+        return {"peticiones": 0}
+    ms = np.array(tiempos) * 1000
+    return {
+        "peticiones": len(tiempos),
+        "por_s": round(len(tiempos) / duracion_s, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+    }
+
+
+def tiempos_por_etapa() -> dict:
+    """Promedio (ms) y cantidad por etapa acumulados en el histograma de app.metricas."""
+    from app.metricas import ETAPA_SEGUNDOS
+
+    sumas, conteos = {}, {}
+    for metrica in ETAPA_SEGUNDOS.collect():
+        for muestra in metrica.samples:
+            etapa = muestra.labels.get("etapa")
+            if muestra.name.endswith("_sum"):
+                sumas[etapa] = muestra.value
+            elif muestra.name.endswith("_count"):
+                conteos[etapa] = muestra.value
+    return {
+        etapa: {"promedio_ms": round(sumas[etapa] / conteos[etapa] * 1000, 2), "n": int(conteos[etapa])}
+        for etapa in sorted(conteos) if conteos[etapa]
+    }
+
+
+def escenario_ingesta(url: str, directorio: str, sinteticos: int, paginas: int) -> dict:
+    from benchmarks.pdf_sintetico import generar_pliego
+
+    pdfs = [str(PDF_POR_DEFECTO)]
+    for i in range(sinteticos):
+        ruta = f"{directorio}/sintetico_{i}.pdf"
+        generar_pliego(ruta, paginas, f"BENCH-{i:03d}-2024")
+        pdfs.append(ruta)
+
+    tiempos, total_paginas, ids = [], 0, []
+    inicio = time.perf_counter()
+    with httpx.Client(base_url=url, timeout=None) as cliente:
+        for ruta in pdfs:
+            t0 = time.perf_counter()
+            with open(ruta, "rb") as f:
+                respuesta = cliente.post("/api/pliegos/upload", files={"archivo": (Path(ruta).name, f, "application/pdf")})
+            tiempos.append(time.perf_counter() - t0)
+            respuesta.raise_for_status()
+            pliego = respuesta.json()
+            if pliego["estado"] != "listo":
+                raise SystemExit(f"Ingesta de {ruta} terminó en estado {pliego['estado']}: {pliego.get('error_mensaje')}")
+            total_paginas += pliego["num_paginas"] or 0
+            ids.append(pliego["id"])
+    duracion = time.perf_counter() - inicio
+
+    return {
+        **resumen_latencias(tiempos, duracion),
+        "errores": 0,
+        "paginas": total_paginas,
+        "paginas_por_s": round(total_paginas / duracion, 2),
+        "pliego_ids": ids,
+    }
+
+
+def _concurrente(funcion, argumentos: list, concurrencia: int) -> tuple:
+    """Ejecuta funcion sobre cada argumento con N hilos; retorna (tiempos, errores, duración)."""
+    tiempos, errores = [], []
+    lock = threading.Lock()
+
+    def medir_una(argumento):
+        t0 = time.perf_counter()
+        try:
+            funcion(argumento)
+        except Exception as e:
+            with lock:
+                errores.append(str(e))
+            return
+        with lock:
+            tiempos.append(time.perf_counter() - t0)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(medir_una, argumentos))
+    return tiempos, errores, time.perf_counter() - inicio
+
+
+def escenario_recuperacion(pliego_id: int, peticiones: int, concurrencia: int) -> dict:
+    from app.services.embedding_service import buscar_chunks_relevantes
+    from app.services.pdf_service import extraer_texto_pdf
+    from benchmarks.chunking import consultas_sinteticas
+
+    consultas = [c["texto"] for c in consultas_sinteticas(extraer_texto_pdf(str(PDF_POR_DEFECTO))["paginas"])]
+    argumentos = [consultas[i % len(consultas)] for i in range(peticiones)]
+
+    tiempos, errores, duracion = _concurrente(
+        lambda consulta: buscar_chunks_relevantes(consulta, pliego_id, n_resultados=5),
+        argumentos,
+        concurrencia
+    )
+    return {**resumen_latencias(tiempos, duracion), "errores": len(errores), "concurrencia": concurrencia}
+
+
+def escenario_chat(url: str, pliego_id: int, peticiones: int, concurrencia: int) -> dict:
+    sesiones = threading.local()
+    modelos = {}
+    lock = threading.Lock()
+
+    def preguntar(i: int):
+        if not hasattr(sesiones, "cliente"):
+            sesiones.cliente = httpx.Client(base_url=url, timeout=300)
+            sesiones.sesion_id = None
+        respuesta = sesiones.cliente.post("/api/chat/preguntar", json={
+            "pliego_id": pliego_id,
+            "pregunta": PREGUNTAS_CHAT[i % len(PREGUNTAS_CHAT)],
+            "sesion_id": sesiones.sesion_id,
+        })
+        respuesta.raise_for_status()
+        datos = respuesta.json()
+        sesiones.sesion_id = datos["sesion_id"]
+        with lock:
+            modelos[datos["modelo_usado"]] = modelos.get(datos["modelo_usado"], 0) + 1
+
+    tiempos, errores, duracion = _concurrente(preguntar, list(range(peticiones)), concurrencia)
+    return {
+        **resumen_latencias(tiempos, duracion),
+        "errores": len(errores),
+        "concurrencia": concurrencia,
+        "respuestas_por_modelo": modelos,
+    }
+
+
+def con_errores(actual: dict) -> list:
+    """Escenarios con peticiones fallidas: sus latencias no son comparables."""
+    return [
+        {"escenario": escenario, "metrica": "errores", "actual": valores.get("errores")}
+        for escenario, valores in actual["escenarios"].items()
+        if valores.get("errores", 0) > 0
+    ]
+
+
+def comparar(actual: dict, baseline: dict, tolerancia: float) -> list:
+    """
+    Fallas de la corrida frente a la baseline: errores, métricas faltantes y
+    métricas que empeoraron más que la tolerancia.
+
+    Una baseline con otra configuración (escenarios, tamaños, Ollama falso)
+    no se compara: termina el programa. Si es de otro entorno solo se
+    revisan los errores de la corrida actual.
+    """
+    diferencias = sorted(
+        clave for clave in set(actual["configuracion"]) | set(baseline.get("configuracion", {}))
+        if actual["configuracion"].get(clave) != baseline.get("configuracion", {}).get(clave)
+    )
+    if diferencias:
+        raise SystemExit(f"La baseline se generó con otra configuración ({', '.join(diferencias)}); no se compara")
+
+    regresiones = con_errores(actual)
+    otro_entorno = sorted(
+        clave for clave in set(actual["entorno"]) | set(baseline.get("entorno", {}))
+        if actual["entorno"].get(clave) != baseline.get("entorno", {}).get(clave)
+    )
+    if otro_entorno:
+        print(
+            f"La baseline es de otro entorno ({', '.join(otro_entorno)}): solo se revisan errores. "
+            "Genera una local con make bench-baseline",
+            file=sys.stderr
+        )
+        return regresiones
+
+    comparables = [
+        (escenario, metrica, mayor_es_peor, baseline.get("escenarios", {}).get(escenario, {}), valores)
+        for escenario, valores in actual["escenarios"].items()
+        for metrica, mayor_es_peor in METRICAS_BASELINE.items()
+    ]
+    # El pico de RSS es de todo el proceso: se compara una vez, no por escenario
+    comparables.append(("proceso", "rss_pico_mb", True, baseline, actual))
+
+    for escenario, metrica, mayor_es_peor, referencia, valores in comparables:
+        antes, ahora = referencia.get(metrica), valores.get(metrica)
+        if antes is None or ahora is None:
+            regresiones.append({"escenario": escenario, "metrica": metrica, "baseline": antes, "actual": ahora})
+            continue
+        cambio = (ahora - antes) / antes if antes else (0.0 if ahora == antes else float("inf"))
+        if (cambio if mayor_es_peor else -cambio) > tolerancia:
+            regresiones.append({
+                "escenario": escenario,
+                "metrica": metrica,
+                "baseline": antes,
+                "actual": ahora,
+                "cambio_pct": round(cambio * 100, 1),
+            })
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga offline de PliegoRAG")
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=ESCENARIOS)
+    parser.add_argument("--sinteticos", type=int, default=2, help="PDFs sintéticos a ingerir")
+    parser.add_argument("--paginas", type=int, default=300, help="Páginas de cada PDF sintético")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--peticiones", type=int, default=80, help="Peticiones por escenario de recuperación y chat")
+    parser.add_argument("--primer-token-ms", type=float, default=150)
+    parser.add_argument("--tokens-por-s", type=float, default=40)
+    parser.add_argument("--paralelo", type=int, default=1, help="Peticiones que el Ollama falso atiende a la vez")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior")
+    parser.add_argument("--guardar-baseline", action="store_true", help="Escribir el resultado en --baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento relativo permitido")
+    args = parser.parse_args()
+    if args.guardar_baseline and not args.baseline:
+        parser.error("--guardar-baseline requiere --baseline")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        puerto_ollama = _puerto_libre()
+        preparar_entorno(directorio, puerto_ollama)
+
+        from benchmarks.ollama_falso import iniciar_en_hilo
+
+        iniciar_en_hilo(
+            puerto_ollama,
+            primer_token_ms=args.primer_token_ms,
+            tokens_por_s=args.tokens_por_s,
+            tokens=60,
+            paralelo=args.paralelo
+        )
+        puerto_api = _puerto_libre()
+        iniciar_api(puerto_api)
+        url = f"http://127.0.0.1:{puerto_api}"
+
+        escenarios = {}
+        # Recuperación y chat necesitan pliegos indexados: sin ingesta se sube solo pliego_prueba.pdf
+        ingesta = _con_rss(
+            escenario_ingesta, url, directorio,
+            args.sinteticos if "ingesta" in args.escenarios else 0,
+            args.paginas
+        )
+        pliego_id = ingesta.pop("pliego_ids")[0]
+        if "ingesta" in args.escenarios:
+            escenarios["ingesta"] = ingesta
+
+        if "recuperacion" in args.escenarios:
+            escenarios["recuperacion"] = _con_rss(escenario_recuperacion, pliego_id, args.peticiones, args.concurrencia)
+        if "chat" in args.escenarios:
+            escenarios["chat"] = _con_rss(escenario_chat, url, pliego_id, args.peticiones, args.concurrencia)
+
+        resultado = {
+            "configuracion": {
+                k: v for k, v in vars(args).items()
+                if k not in ("baseline", "guardar_baseline", "tolerancia")
+            },
+            "entorno": entorno(),
+            "escenarios": escenarios,
+            "rss_pico_mb": rss_pico_mb(),
+            "etapas": tiempos_por_etapa(),
+        }
+
+    if args.guardar_baseline:
+        if con_errores(resultado):
+            print(json.dumps(resultado, indent=2, ensure_ascii=False))
+            raise SystemExit("La corrida tuvo peticiones con error; no se guarda como baseline")
+        Path(args.baseline).write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    elif args.baseline and Path(args.baseline).exists():
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        resultado["regresiones"] = comparar(resultado, baseline, args.tolerancia)
+    else:
+        resultado["regresiones"] = con_errores(resultado)
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if resultado.get("regresiones"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
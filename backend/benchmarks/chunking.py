@@ -0,0 +1,97 @@
+# Compara estrategias de chunking: tamaño del índice, tiempo de embeddings y
+# tasa de acierto en recuperación.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.chunking [pdf ...] [--k 3]
+#
+# La tasa de acierto se mide con consultas sintéticas: de cada página se toma
+# una oración (recortada) y se verifica si alguno de los k chunks más cercanos
+# pertenece a esa página.
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.pdf_service import extraer_texto_pdf
+from app.services.chunk_service import ESTRATEGIAS_CHUNKING, dividir_por_paginas
+from app.services.embedding_service import codificar, contar_tokens, max_tokens_embedding
+
+PDF_POR_DEFECTO = Path(__file__).resolve().parents[2] / "pliego_prueba.pdf"
+
+
+def consultas_sinteticas(paginas: list) -> list:
+    """Una consulta por página: los primeros 2/3 de su oración más larga."""
+    consultas = []
+    for pagina in paginas:
+        oraciones = [o for o in re.split(r'(?<=[\.\?\!;:])\s+', pagina["texto"]) if len(o.split()) >= 8]
+        if not oraciones:
+            continue
+        palabras = max(oraciones, key=len).split()
+        consultas.append({
+            "page": pagina["numero"],
+            "texto": " ".join(palabras[:max(6, len(palabras) * 2 // 3)])
+        })
+    return consultas
+
+
+def evaluar_estrategia(estrategia: str, paginas: list, consultas: list, k: int) -> dict:
+    inicio = time.perf_counter()
+    chunks = dividir_por_paginas(paginas, estrategia)
+    tiempo_chunking = time.perf_counter() - inicio
+
+    textos = [c["texto"] for c in chunks]
+    tokens = contar_tokens(textos)
+    limite = max_tokens_embedding()
+
+    inicio = time.perf_counter()
+    embeddings = np.array(codificar(textos))
+    tiempo_embeddings = time.perf_counter() - inicio
+
+    embeddings_consultas = np.array(codificar([c["texto"] for c in consultas]))
+    similitudes = embeddings_consultas @ embeddings.T
+    top_k = np.argsort(-similitudes, axis=1)[:, :k]
+    aciertos = sum(
+        any(chunks[i]["page"] == consulta["page"] for i in fila)
+        for consulta, fila in zip(consultas, top_k)
+    )
+
+    return {
+        "estrategia": estrategia,
+        "chunks": len(chunks),
+        "chunks_tabla": sum(1 for c in chunks if c.get("tipo") == "tabla"),
+        "tokens_totales": int(sum(tokens)),
+        "tokens_promedio": round(float(np.mean(tokens)), 1) if tokens else 0,
+        "chunks_truncados_pct": round(100 * sum(t > limite for t in tokens) / max(len(tokens), 1), 1),
+        "tiempo_chunking_s": round(tiempo_chunking, 3),
+        "tiempo_embeddings_s": round(tiempo_embeddings, 3),
+        "chunks_por_s": round(len(chunks) / tiempo_embeddings, 1) if tiempo_embeddings else None,
+        f"acierto_top{k}_pct": round(100 * aciertos / max(len(consultas), 1), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de estrategias de chunking")
+    parser.add_argument("pdfs", nargs="*", default=[str(PDF_POR_DEFECTO)])
+    parser.add_argument("--k", type=int, default=3, help="Chunks recuperados por consulta")
+    args = parser.parse_args()
+
+    paginas = []
+    for ruta in args.pdfs:
+        resultado = extraer_texto_pdf(ruta)
+        if resultado["error"]:
+            raise SystemExit(f"{ruta}: {resultado['error']}")
+        # Numeración global para que las páginas de distintos PDFs no choquen
+        for pagina in resultado["paginas"]:
+            paginas.append({**pagina, "numero": len(paginas) + 1})
+
+    consultas = consultas_sinteticas(paginas)
+    resultados = [evaluar_estrategia(e, paginas, consultas, args.k) for e in ESTRATEGIAS_CHUNKING]
+
+    print(json.dumps({"paginas": len(paginas), "consultas": len(consultas), "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
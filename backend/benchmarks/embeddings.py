@@ -0,0 +1,109 @@
+# Compara los backends de embeddings: equivalencia de scores y rendimiento.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.embeddings [pdf ...] [--backends sentence_transformers int8 onnx]
+#                                     [--batch-sizes 8 16 32 64] [--umbral 0.99]
+#
+# La referencia es sentence_transformers fp32. Para cada backend se reporta la
+# similitud coseno entre sus vectores y los de referencia, la diferencia en los
+# scores consulta-chunk y el solapamiento del top-k; termina con código 1 si
+# algún backend queda por debajo del umbral de coseno mínimo.
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.pdf_service import extraer_texto_pdf
+from app.services.chunk_service import dividir_por_paginas
+from app.services.embedding_backend import crear_backend
+from benchmarks.chunking import consultas_sinteticas
+
+PDF_POR_DEFECTO = Path(__file__).resolve().parents[2] / "pliego_prueba.pdf"
+
+
+def medir_throughput(backend, textos: list, batch_size: int, repeticiones: int = 3) -> float:
+    backend.encode(textos[:batch_size], batch_size)  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        backend.encode(textos, batch_size)
+        tiempos.append(time.perf_counter() - inicio)
+    return len(textos) / min(tiempos)
+
+
+def comparar(referencia: dict, candidato: dict, k: int) -> dict:
+    cosenos = np.sum(referencia["chunks"] * candidato["chunks"], axis=1)
+    scores_ref = referencia["consultas"] @ referencia["chunks"].T
+    scores_cand = candidato["consultas"] @ candidato["chunks"].T
+
+    top_ref = np.argsort(-scores_ref, axis=1)[:, :k]
+    top_cand = np.argsort(-scores_cand, axis=1)[:, :k]
+    solapamiento = np.mean([len(set(a) & set(b)) / k for a, b in zip(top_ref, top_cand)])
+
+    return {
+        "coseno_min": round(float(cosenos.min()), 5),
+        "coseno_promedio": round(float(cosenos.mean()), 5),
+        "diferencia_score_max": round(float(np.abs(scores_ref - scores_cand).max()), 5),
+        f"solapamiento_top{k}": round(float(solapamiento), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de embeddings")
+    parser.add_argument("pdfs", nargs="*", default=[str(PDF_POR_DEFECTO)])
+    parser.add_argument("--backends", nargs="+", default=["sentence_transformers", "int8", "onnx"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[8, 16, 32, 64])
+    parser.add_argument("--umbral", type=float, default=0.99, help="Coseno mínimo aceptado frente a fp32")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    paginas = []
+    for ruta in args.pdfs:
+        resultado = extraer_texto_pdf(ruta)
+        if resultado["error"]:
+            raise SystemExit(f"{ruta}: {resultado['error']}")
+        paginas += resultado["paginas"]
+
+    textos = [c["texto"] for c in dividir_por_paginas(paginas)]
+    consultas = [c["texto"] for c in consultas_sinteticas(paginas)]
+
+    nombres = ["sentence_transformers"] + [b for b in args.backends if b != "sentence_transformers"]
+    vectores = {}
+    reporte = {"chunks": len(textos), "consultas": len(consultas), "backends": {}}
+
+    for nombre in nombres:
+        backend = crear_backend(nombre)
+        if backend.nombre != nombre:
+            reporte["backends"][nombre] = {"error": "no disponible (se cargó sentence_transformers)"}
+            continue
+
+        vectores[nombre] = {
+            "chunks": backend.encode(textos, 32),
+            "consultas": backend.encode(consultas, 32),
+        }
+        reporte["backends"][nombre] = {
+            "chunks_por_s": {
+                str(b): round(medir_throughput(backend, textos, b), 1) for b in args.batch_sizes
+            }
+        }
+        if nombre != "sentence_transformers":
+            reporte["backends"][nombre].update(
+                comparar(vectores["sentence_transformers"], vectores[nombre], args.k)
+            )
+
+    print(json.dumps(reporte, indent=2))
+
+    fallidos = [
+        n for n, r in reporte["backends"].items()
+        if "coseno_min" in r and r["coseno_min"] < args.umbral
+    ]
+    if fallidos:
+        print(f"Backends por debajo del umbral {args.umbral}: {', '.join(fallidos)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
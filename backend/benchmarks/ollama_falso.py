@@ -0,0 +1,149 @@
+# Servidor que imita la API de Ollama (/api/generate, /api/chat, /api/tags)
+# para correr los benchmarks sin GPU ni modelos descargados.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.ollama_falso [--puerto 11435] [--primer-token-ms 150]
+#                                       [--tokens-por-s 40] [--tokens 60] [--paralelo 1]
+#
+# Simula la latencia al primer token, la velocidad de generación y la cola
+# de Ollama: con --paralelo 1 las peticiones se atienden de a una, como
+# OLLAMA_NUM_PARALLEL=1. Las respuestas de resumen y documentos son JSON válido.
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+RESPUESTA_RESUMEN = {
+    "numero_proceso": "BENCH-001-2024",
+    "entidad": "ENTIDAD DE PRUEBA",
+    "objeto": "Objeto sintético del proceso",
+    "presupuesto": "$100.000.000",
+    "fecha_cierre": "1 de enero de 2025",
+    "experiencia_requerida": "Dos contratos similares",
+    "garantias": "Seriedad de la oferta",
+    "criterios_evaluacion": "Precio 60, calidad 40",
+    "observaciones": "Ninguna",
+}
+
+RESPUESTA_DOCUMENTOS = {
+    "documentos": [{
+        "nombre": "Certificación ISO 9001",
+        "descripcion": "Certificado de gestión de calidad vigente",
+        "categoria": "tecnico",
+        "mencionado_en": "El proponente deberá acreditar certificación ISO 9001"
+    }]
+}
+
+
+def crear_app(primer_token_ms: float, tokens_por_s: float, tokens: int, paralelo: int) -> FastAPI:
+    app = FastAPI(title="Ollama falso")
+    cupos = asyncio.Semaphore(paralelo)
+
+    def texto_respuesta(prompt: str) -> str:
+        if "JSON" in prompt and "documentos" in prompt:
+            return json.dumps(RESPUESTA_DOCUMENTOS, ensure_ascii=False)
+        if "JSON" in prompt:
+            return json.dumps(RESPUESTA_RESUMEN, ensure_ascii=False)
+        return " ".join(["respuesta"] * tokens)
+
+    async def generar(prompt: str, armar):
+        texto = texto_respuesta(prompt)
+        # Trozos de ~4 caracteres, como los tokens de un modelo real
+        trozos = [texto[i:i + 4] for i in range(0, len(texto), 4)]
+        llegada = time.perf_counter()
+
+        async with cupos:
+            inicio = time.perf_counter()
+            await asyncio.sleep(primer_token_ms / 1000)
+            prompt_eval_ns = int((time.perf_counter() - inicio) * 1e9)
+            for trozo in trozos:
+                yield json.dumps(armar(trozo, False)) + "\n"
+                await asyncio.sleep(1 / tokens_por_s)
+
+        total_ns = int((time.perf_counter() - llegada) * 1e9)
+        yield json.dumps({
+            **armar("", True),
+            "total_duration": total_ns,
+            "load_duration": 0,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": prompt_eval_ns,
+            "eval_count": len(trozos),
+            "eval_duration": int(len(trozos) / tokens_por_s * 1e9),
+        }) + "\n"
+
+    async def responder(datos: dict, prompt: str, armar):
+        if datos.get("stream", True):
+            return StreamingResponse(generar(prompt, armar), media_type="application/x-ndjson")
+
+        partes, final = [], {}
+        async for linea in generar(prompt, armar):
+            mensaje = json.loads(linea)
+            partes.append(mensaje.get("response") or mensaje.get("message", {}).get("content", ""))
+            final = mensaje
+        if "message" in final:
+            final["message"]["content"] = "".join(partes)
+        else:
+            final["response"] = "".join(partes)
+        return final
+
+    @app.post("/api/generate")
+    async def api_generate(request: Request):
+        datos = await request.json()
+        modelo = datos.get("model", "")
+
+        def armar(trozo: str, fin: bool) -> dict:
+            return {"model": modelo, "response": trozo, "done": fin}
+
+        return await responder(datos, datos.get("prompt", ""), armar)
+
+    @app.post("/api/chat")
+    async def api_chat(request: Request):
+        datos = await request.json()
+        modelo = datos.get("model", "")
+        prompt = "\n".join(m.get("content", "") for m in datos.get("messages", []))
+
+        def armar(trozo: str, fin: bool) -> dict:
+            return {"model": modelo, "message": {"role": "assistant", "content": trozo}, "done": fin}
+
+        return await responder(datos, prompt, armar)
+
+    @app.get("/api/tags")
+    def api_tags():
+        return {"models": []}
+
+    return app
+
+
+def iniciar_en_hilo(puerto: int, **configuracion) -> uvicorn.Server:
+    """Levanta el servidor en un hilo de fondo y espera a que acepte conexiones."""
+    servidor = uvicorn.Server(uvicorn.Config(
+        crear_app(**configuracion), host="127.0.0.1", port=puerto, log_level="warning"
+    ))
+    threading.Thread(target=servidor.run, name="ollama-falso", daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso de Ollama para benchmarks")
+    parser.add_argument("--puerto", type=int, default=11435)
+    parser.add_argument("--primer-token-ms", type=float, default=150)
+    parser.add_argument("--tokens-por-s", type=float, default=40)
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens de las respuestas de chat")
+    parser.add_argument("--paralelo", type=int, default=1, help="Peticiones atendidas a la vez")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        crear_app(args.primer_token_ms, args.tokens_por_s, args.tokens, args.paralelo),
+        host="127.0.0.1", port=args.puerto, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Genera PDFs sintéticos de cientos de páginas para los benchmarks de ingesta.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.pdf_sintetico salida.pdf [--paginas 300] [--base pliego_prueba.pdf]
+#
+# Las páginas repiten el texto de un pliego real (por defecto pliego_prueba.pdf)
+# con el número de página y un identificador propio, así cada PDF generado
+# tiene contenido distinto (no lo descarta la deduplicación por hash) y la
+# extracción y el chunking trabajan sobre texto realista.
+import argparse
+import textwrap
+import zlib
+from pathlib import Path
+from typing import List
+
+from app.services.pdf_service import extraer_texto_pdf
+
+PDF_POR_DEFECTO = Path(__file__).resolve().parents[2] / "pliego_prueba.pdf"
+
+LINEAS_POR_PAGINA = 58
+CARACTERES_POR_LINEA = 95
+
+
+def _escapar(linea: str) -> bytes:
+    # Helvetica con WinAnsiEncoding (cp1252): cubre tildes, eñes y comillas tipográficas
+    texto = linea.encode("cp1252", errors="replace")
+    return texto.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _contenido_pagina(lineas: List[str]) -> bytes:
+    partes = [b"BT /F1 9 Tf 11 TL 50 800 Td"]
+    for linea in lineas:
+        partes.append(b"(" + _escapar(linea) + b") Tj T*")
+    partes.append(b"ET")
+    return zlib.compress(b"\n".join(partes))
+
+
+def escribir_pdf(ruta: str, paginas: List[List[str]]):
+    """Escribe un PDF mínimo (una fuente estándar, texto plano) con una lista de líneas por página."""
+    objetos = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    siguiente = 4
+    for lineas in paginas:
+        contenido = _contenido_pagina(lineas)
+        objetos[siguiente] = (
+            b"<< /Length " + str(len(contenido)).encode() + b" /Filter /FlateDecode >>\nstream\n"
+            + contenido + b"\nendstream"
+        )
+        objetos[siguiente + 1] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents " + str(siguiente).encode() + b" 0 R >>"
+        )
+        kids.append(f"{siguiente + 1} 0 R")
+        siguiente += 2
+    objetos[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = {}
+    for numero in sorted(objetos):
+        posiciones[numero] = len(salida)
+        salida += f"{numero} 0 obj\n".encode() + objetos[numero] + b"\nendobj\n"
+
+    inicio_xref = len(salida)
+    salida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for numero in sorted(objetos):
+        salida += f"{posiciones[numero]:010d} 00000 n \n".encode()
+    salida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode()
+
+    Path(ruta).write_bytes(bytes(salida))
+
+
+def generar_pliego(ruta: str, num_paginas: int, identificador: str, base: str = str(PDF_POR_DEFECTO)):
+    """
+    Genera un pliego sintético replicando las páginas del PDF base.
+
+    Args:
+        ruta: Ruta del PDF a escribir
+        num_paginas: Páginas del PDF generado
+        identificador: Texto único por PDF (número de proceso sintético)
+        base: PDF real del que se toma el texto
+    """
+    resultado = extraer_texto_pdf(base)
+    if resultado["error"]:
+        raise ValueError(f"{base}: {resultado['error']}")
+    textos = [p["texto"] for p in resultado["paginas"] if p["texto"].strip()]
+
+    paginas = []
+    for numero in range(1, num_paginas + 1):
+        lineas = [f"PROCESO No. {identificador} - Página {numero} de {num_paginas}", ""]
+        for parrafo in textos[(numero - 1) % len(textos)].split("\n"):
+            lineas.extend(textwrap.wrap(parrafo, CARACTERES_POR_LINEA) or [""])
+        paginas.append(lineas[:LINEAS_POR_PAGINA])
+
+    escribir_pdf(ruta, paginas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un pliego sintético en PDF")
+    parser.add_argument("salida")
+    parser.add_argument("--paginas", type=int, default=300)
+    parser.add_argument("--base", default=str(PDF_POR_DEFECTO))
+    parser.add_argument("--id", default="SINT-001-2024", help="Número de proceso sintético")
+    args = parser.parse_args()
+
+    generar_pliego(args.salida, args.paginas, args.id, args.base)
+
+
+if __name__ == "__main__":
+    main()
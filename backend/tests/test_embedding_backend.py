@@ -0,0 +1,64 @@
+"""Equivalencia de los backends cuantizado (int8) y ONNX frente a sentence-transformers fp32.
+
+Necesita el modelo de embeddings en la caché local de Hugging Face (o en un
+directorio local); si no está, las pruebas se omiten en vez de descargarlo.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.embedding_backend import crear_backend
+
+# Mismo umbral por defecto que python -m benchmarks.embeddings
+COSENO_MINIMO = 0.99
+
+FRASES = [
+    "El proponente deberá acreditar experiencia en contratos de obra civil.",
+    "La garantía de seriedad de la oferta será del diez por ciento del presupuesto oficial.",
+    "Plazo de ejecución: seis (6) meses contados a partir del acta de inicio.",
+    "Los documentos habilitantes incluyen el RUP vigente y el certificado de existencia.",
+    "Se evaluará la capacidad financiera con el índice de liquidez y de endeudamiento.",
+    "ADENDA No. 2: se modifica el cronograma del proceso de selección.",
+    "| Ítem | Descripción | Cantidad |\n|---|---|---|\n| 1 | Cemento gris | 300 |",
+    "Objeto: suministro de equipos de cómputo para las sedes de la entidad.",
+]
+
+
+def _repo() -> str:
+    modelo = settings.EMBEDDING_MODELO
+    return modelo if "/" in modelo else f"sentence-transformers/{modelo}"
+
+
+def _en_cache(archivo: str) -> bool:
+    if os.path.isdir(settings.EMBEDDING_MODELO):
+        return os.path.exists(os.path.join(settings.EMBEDDING_MODELO, archivo))
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(_repo(), archivo), str)
+
+
+def _requerir(archivos):
+    faltantes = [a for a in archivos if not _en_cache(a)]
+    if faltantes:
+        pytest.skip(f"{settings.EMBEDDING_MODELO} no está en la caché local ({', '.join(faltantes)})")
+
+
+@pytest.fixture(scope="module")
+def referencia():
+    _requerir(["modules.json"])
+    return crear_backend("sentence_transformers").encode(FRASES, batch_size=8)
+
+
+@pytest.mark.parametrize("nombre", ["int8", "onnx"])
+def test_backend_equivalente_a_fp32(nombre, referencia):
+    if nombre == "onnx" and not settings.EMBEDDING_ONNX_PATH:
+        _requerir([settings.EMBEDDING_ONNX_ARCHIVO])
+
+    backend = crear_backend(nombre)
+    # crear_backend cae a fp32 si no puede cargar el pedido: eso no prueba nada
+    assert backend.nombre == nombre
+
+    vectores = backend.encode(FRASES, batch_size=8)
+    cosenos = np.sum(referencia * vectores, axis=1)
+    assert cosenos.min() >= COSENO_MINIMO, f"{nombre}: coseno mínimo {cosenos.min():.5f} frente a fp32"
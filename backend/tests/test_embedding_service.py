@@ -0,0 +1,56 @@
+"""Pruebas de la sincronización de chunks contra una colección ChromaDB local temporal."""
+import hashlib
+
+import pytest
+
+from app.services import embedding_service
+
+
+def _codificar_falso(textos, modelo=None):
+    # Vectores deterministas por texto: no hace falta cargar el modelo
+    return [[b / 255 for b in hashlib.sha1(t.encode("utf-8")).digest()[:8]] for t in textos]
+
+
+@pytest.fixture
+def coleccion(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHROMA_PATH", str(tmp_path))
+    monkeypatch.setattr(embedding_service.settings, "EMBEDDING_WORKER_URL", "")
+    monkeypatch.setattr(embedding_service, "codificar", _codificar_falso)
+    monkeypatch.setattr(embedding_service, "_dimensiones", {})
+    for nombre in ("cliente_chroma", "coleccion_pliegos", "coleccion_normativa", "_alias_mtime"):
+        monkeypatch.setattr(embedding_service, nombre, None)
+    embedding_service.inicializar_servicios()
+    return embedding_service.coleccion_pliegos
+
+
+def _chunks(*textos):
+    return [{"id": i, "texto": t, "page": 1, "section": "general"} for i, t in enumerate(textos)]
+
+
+def test_actualizar_chunks_conserva_y_agrega(coleccion):
+    embedding_service.guardar_chunks(1, _chunks("objeto del contrato", "plazo de ejecución"))
+
+    diff = embedding_service.actualizar_chunks_pliego(1, _chunks("plazo de ejecución", "garantía única"))
+
+    assert diff["conservados"] == 1
+    assert [c["chunk_id"] for c in diff["nuevos"]] == [1]
+    assert len(diff["eliminados"]) == 1
+    documentos = coleccion.get(where={"pliego_id": 1})["documents"]
+    assert sorted(documentos) == ["garantía única", "plazo de ejecución"]
+
+
+def test_actualizar_chunks_conserva_los_viejos_si_falla_el_embedding(coleccion, monkeypatch):
+    embedding_service.guardar_chunks(1, _chunks("objeto del contrato", "plazo de ejecución"))
+    antes = coleccion.get(where={"pliego_id": 1}, include=["metadatas", "documents"])
+
+    def _agregar_falla(*args, **kwargs):
+        raise RuntimeError("worker de embeddings caído")
+
+    monkeypatch.setattr(embedding_service, "_agregar_chunks", _agregar_falla)
+    with pytest.raises(RuntimeError):
+        embedding_service.actualizar_chunks_pliego(1, _chunks("garantía única", "objeto del contrato"))
+
+    despues = coleccion.get(where={"pliego_id": 1}, include=["metadatas", "documents"])
+    assert sorted(despues["ids"]) == sorted(antes["ids"])
+    assert sorted(despues["documents"]) == sorted(antes["documents"])
+    assert {m["chunk_id"] for m in despues["metadatas"]} == {0, 1}
@@ -0,0 +1,7 @@
+-- Deduplicación de pliegos por contenido
+ALTER TABLE pliegos ADD COLUMN hash_contenido VARCHAR(64) AFTER tamano_bytes;
+ALTER TABLE pliegos ADD COLUMN pliego_origen_id INT AFTER hash_contenido;
+ALTER TABLE pliegos ADD COLUMN num_referencias INT DEFAULT 1 AFTER pliego_origen_id;
+ALTER TABLE pliegos ADD INDEX idx_hash_contenido (hash_contenido);
+ALTER TABLE pliegos ADD CONSTRAINT fk_pliego_origen
+    FOREIGN KEY (pliego_origen_id) REFERENCES pliegos(id) ON DELETE SET NULL;
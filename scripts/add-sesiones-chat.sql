@@ -0,0 +1,18 @@
+-- Sesiones de chat con memoria resumida
+CREATE TABLE IF NOT EXISTS sesiones_chat (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    pliego_id INT NOT NULL,
+    memoria TEXT,
+    turnos_resumidos INT DEFAULT 0,
+    contexto JSON,
+    embedding_tema JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (pliego_id) REFERENCES pliegos(id) ON DELETE CASCADE,
+    INDEX idx_pliego (pliego_id)
+);
+
+ALTER TABLE conversaciones ADD COLUMN sesion_id INT AFTER tiempo_carga_ms;
+ALTER TABLE conversaciones ADD INDEX idx_sesion (sesion_id);
+ALTER TABLE conversaciones ADD CONSTRAINT fk_conversacion_sesion
+    FOREIGN KEY (sesion_id) REFERENCES sesiones_chat(id) ON DELETE CASCADE;
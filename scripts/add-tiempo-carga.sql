@@ -0,0 +1,2 @@
+-- Tiempo de carga del modelo en Ollama, separado del tiempo de respuesta
+ALTER TABLE conversaciones ADD COLUMN tiempo_carga_ms INT AFTER tiempo_respuesta_ms;
@@ -0,0 +1,4 @@
+-- Versiones (adendas) y re-ingesta incremental
+ALTER TABLE pliegos ADD COLUMN version INT DEFAULT 1 AFTER checklist_documentos;
+ALTER TABLE pliegos ADD COLUMN hashes_paginas JSON AFTER version;
+ALTER TABLE pliegos ADD COLUMN derivados_obsoletos JSON AFTER hashes_paginas;
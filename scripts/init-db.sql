@@ -12,17 +12,39 @@ CREATE TABLE IF NOT EXISTS pliegos (
     nombre_archivo VARCHAR(255) NOT NULL,
     ruta_archivo VARCHAR(500) NOT NULL,
     tamano_bytes BIGINT,
+    hash_contenido VARCHAR(64),
+    pliego_origen_id INT,
+    num_referencias INT DEFAULT 1,
     num_paginas INT,
     texto_completo LONGTEXT,
     texto_tokens INT,
     datos_extraidos JSON,
+    version INT DEFAULT 1,
+    hashes_paginas JSON,
+    derivados_obsoletos JSON,
     estado ENUM('procesando', 'listo', 'error') DEFAULT 'procesando',
     error_mensaje TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_numero_proceso (numero_proceso),
     INDEX idx_estado (estado),
-    INDEX idx_created (created_at)
+    INDEX idx_created (created_at),
+    INDEX idx_hash_contenido (hash_contenido),
+    FOREIGN KEY (pliego_origen_id) REFERENCES pliegos(id) ON DELETE SET NULL
+);
+
+-- Sesiones de chat (memoria resumida y contexto reutilizable)
+CREATE TABLE IF NOT EXISTS sesiones_chat (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    pliego_id INT NOT NULL,
+    memoria TEXT,
+    turnos_resumidos INT DEFAULT 0,
+    contexto JSON,
+    embedding_tema JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (pliego_id) REFERENCES pliegos(id) ON DELETE CASCADE,
+    INDEX idx_pliego (pliego_id)
 );
 
 -- Tabla de conversaciones
@@ -35,9 +57,13 @@ CREATE TABLE IF NOT EXISTS conversaciones (
     tokens_prompt INT,
     tokens_respuesta INT,
     tiempo_respuesta_ms INT,
+    tiempo_carga_ms INT,
+    sesion_id INT,
     fue_util TINYINT(1),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (pliego_id) REFERENCES pliegos(id) ON DELETE CASCADE,
+    FOREIGN KEY (sesion_id) REFERENCES sesiones_chat(id) ON DELETE CASCADE,
     INDEX idx_pliego (pliego_id),
+    INDEX idx_sesion (sesion_id),
     INDEX idx_created (created_at)
 );
\ No newline at end of file